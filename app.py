@@ -2,60 +2,103 @@
 import os
 
 import aws_cdk as cdk
-from cdks.alb_stack import CdkALBStack
-from cdks.msk_stack import CdkMSKStack
-from cdks.redshift_stack import CdkRedshiftStack
-from cdks.eventbridge_stack import CdkEventBridgeStack
+from cdks.stack_registry import ENVIRONMENTS, STACK_REGISTRY, build_stacks, parse_selection, resolve
+from tools.profiling import SynthProfiler
+from tools.synth_cache import SynthCache, app_context
+from tools.template_budget import TemplateBudget
 
-from configs.general_config import GeneralConfig
-
-general_conf = GeneralConfig()
-
-def tagging_func(stack, name, env):    
-    cdk.Tags.of(stack).add('Name', name)
-    cdk.Tags.of(stack).add('Cost', 'cost')
-    cdk.Tags.of(stack).add('Environment', env)
+from configs.model import load_config
 
 """
     ls command line: cdk ls --context environment=staging
     synth command line: cdk synth --context environment=staging cdk-sqs-staging
     deploy command line: cdk deploy --context environment=staging cdk-sqs-staging
+
+    only build the selected stacks (and their dependencies), by registry key or stack id:
+    synth command line: cdk synth --context environment=staging --context stacks=msk,redshift
+
+    profile construct creation, jsii round trips and app.synth() (.cdk.profile):
+    synth command line: cdk synth --context environment=staging --context profile=true
+
+    reuse unchanged stacks from the synth cache (.cdk.cache):
+    synth command line: cdk synth --context environment=staging --context synth_cache=true
+
+    check template sizes and resource counts against budgets (fails the synth, see tools/template_budget.py):
+    synth command line: cdk synth --context environment=staging --context template_budget_max_resources=300
+
+    synth every environment in parallel (see tools/synth_environments.py):
+    python -m tools.synth_environments --environments develop,staging,production
 """
 
-app = cdk.App()
-env = app.node.try_get_context("environment")
-
-if env not in ['develop', 'staging', 'production']:
-    raise RuntimeError('The environment value does not match allowed values.')
-
-cdk_msk_stack = CdkMSKStack(
-    app, 
-    f'cdk-msk-{env}', 
-    environment=env,
-    synthesizer=cdk.DefaultStackSynthesizer(
-        file_assets_bucket_name=general_conf.bootstrap_bucket
-    )
-)
-tagging_func(cdk_msk_stack, name=f'cdk-msk-{env}', env=env)
-
-cdk_redshift_stack = CdkRedshiftStack(
-    app, 
-    f'cdk-etl-redshift-{env}',
-    environment=env,
-    synthesizer=cdk.DefaultStackSynthesizer(
-        file_assets_bucket_name=general_conf.bootstrap_bucket
-    )
-)
-tagging_func(cdk_redshift_stack, name=f'cdk-redshift-{env}', env=env)
-
-cdk_eventbridge_stack = CdkEventBridgeStack(
-    app,
-    f'cdk-etl-eventbridge-{env}',
-    environment=env,
-    synthesizer=cdk.DefaultStackSynthesizer(
-        file_assets_bucket_name=general_conf.bootstrap_bucket
-    )
-)
-tagging_func(cdk_eventbridge_stack, name=f'cdk-eventbridge-{env}', env=env)
-
-app.synth()
+def synth_app(app):
+    env = app.node.try_get_context("environment")
+
+    if env not in ENVIRONMENTS:
+        raise RuntimeError('The environment value does not match allowed values.')
+
+    # resolve and validate every config before any construct is created
+    load_config(env)
+
+    selected_stacks = resolve(parse_selection(app.node.try_get_context("stacks"), env), env)
+
+    synth_cache = SynthCache.from_context(app)
+    stack_digests = {}
+    cached_stacks = set()
+
+    if synth_cache:
+        context = app_context()
+        for stack_key in selected_stacks:
+            stack_spec = STACK_REGISTRY[stack_key]
+            stack_digests[stack_key] = synth_cache.stack_digest(
+                stack_spec,
+                env,
+                context,
+                dependency_digests=[stack_digests[dependency] for dependency in stack_spec.depends_on_for(env)],
+                referenced_by=[key for key in selected_stacks if stack_key in STACK_REGISTRY[key].references_for(env)]
+            )
+            if synth_cache.has(stack_digests[stack_key]):
+                cached_stacks.add(stack_key)
+
+        # stacks that have to be built still need their dependencies as constructs
+        for stack_key in reversed(selected_stacks):
+            if stack_key not in cached_stacks:
+                cached_stacks.difference_update(STACK_REGISTRY[stack_key].depends_on_for(env))
+
+    profiler = SynthProfiler.from_context(app)
+    profiler.install()
+
+    # the jsii kernel stays patched only while the app is built, also when a stack fails
+    try:
+        build_stacks(
+            app,
+            env,
+            [stack_key for stack_key in selected_stacks if stack_key not in cached_stacks],
+            profiler=profiler
+        )
+
+        # aspects (tags) are applied and assets are published to cdk.out in here
+        with profiler.phase('synth'):
+            assembly = app.synth()
+    finally:
+        profiler.uninstall()
+
+    profiler.write(env)
+
+    if synth_cache:
+        for stack_key in selected_stacks:
+            if stack_key in cached_stacks:
+                synth_cache.restore(stack_digests[stack_key], app.outdir)
+            else:
+                synth_cache.store(stack_digests[stack_key], app.outdir, STACK_REGISTRY[stack_key].stack_id_for(env))
+        synth_cache.evict()
+
+    # template size / resource count budgets, over the restored templates too
+    template_budget = TemplateBudget.from_context(app)
+    if template_budget:
+        template_budget.check(app.outdir)
+
+    return assembly
+
+
+if __name__ == '__main__':
+    synth_app(cdk.App())
@@ -1,3 +1,5 @@
+import hashlib
+
 from aws_cdk import (
     Stack,
 )
@@ -5,25 +7,52 @@ from aws_cdk import CfnTag
 from aws_cdk import aws_elasticloadbalancingv2 as elbv2
 from constructs import Construct
 
+from configs.model import load_config
+
+'''
+Internal etl ALB shared by the service stacks. The stacks receive this stack through
+the registry `references` and use its listeners, DNS name and hosted zone directly,
+CDK turns them into cross-stack exports / imports.
+'''
+
+# ALB listener rule priorities go from 1 to 50000
+MAX_LISTENER_RULE_PRIORITY = 50000
+
 class CdkALBStack(Stack):
 
-    def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, environment:str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
         
         """
             alb
         """
         
-        etl_alb = elbv2.CfnLoadBalancer(self, "ETLLoadBalancer",
+        general_conf = load_config(environment).general
+        alb_conf = general_conf.alb
+        alb_access_logs = general_conf.alb_access_logs
+        
+        load_balancer_attributes = {
+            'idle_timeout.timeout_seconds': str(alb_conf['idle_timeout_seconds']),
+            'routing.http2.enabled': str(alb_conf['http2_enabled']).lower(),
+            'routing.http.desync_mitigation_mode': alb_conf['desync_mitigation_mode'],
+            'routing.http.drop_invalid_header_fields.enabled': str(alb_conf['drop_invalid_header_fields']).lower(),
+            'access_logs.s3.enabled': 'true' if alb_access_logs else 'false'
+        }
+        if alb_access_logs:
+            load_balancer_attributes['access_logs.s3.bucket'] = alb_access_logs['bucket']
+            load_balancer_attributes['access_logs.s3.prefix'] = alb_access_logs['prefix']
+        
+        self.load_balancer = elbv2.CfnLoadBalancer(self, "ETLLoadBalancer",
             name='etl',
             type='application',
             ip_address_type='ipv4',
             scheme='internal',
-            security_groups = [
-                'sg-xxxxx'
-            ],
-            subnets = [
-                'subnet-xxxxx',
+            security_groups = general_conf.security_group,
+            # one subnet per availability zone, targets are served from every zone
+            subnets = general_conf.subnet_ids,
+            load_balancer_attributes = [
+                elbv2.CfnLoadBalancer.LoadBalancerAttributeProperty(key=key, value=value)
+                for key, value in load_balancer_attributes.items()
             ],
             tags=[
                 CfnTag(key='Name',value='alb_name'),
@@ -41,7 +70,7 @@ class CdkALBStack(Stack):
                     ),
                 )
             ],
-            load_balancer_arn = etl_alb,
+            load_balancer_arn = self.load_balancer.ref,
             port = 80,
             protocol = 'HTTP'
         )
@@ -56,8 +85,28 @@ class CdkALBStack(Stack):
                     ),
                 )
             ],
-            load_balancer_arn = etl_alb,
+            load_balancer_arn = self.load_balancer.ref,
             port = 8080,
             protocol = 'HTTP'
         )
         
+        self.dns_name = self.load_balancer.attr_dns_name
+        self.canonical_hosted_zone_id = self.load_balancer.attr_canonical_hosted_zone_id
+        self.load_balancer_full_name = self.load_balancer.attr_load_balancer_full_name
+        self.listeners = {
+            'default': default_listener,
+            'schema-registry': schema_registry_listener
+        }
+        self._listener_rule_priorities = {}
+    
+    def listener_rule_priority(self, listener: str, service_name: str) -> int:
+        """
+        Priority of a service's listener rule, derived from the service name so it does not
+        depend on which stacks are synthesized or in which order.
+        """
+        priority = int(hashlib.sha256(service_name.encode()).hexdigest(), 16) % MAX_LISTENER_RULE_PRIORITY + 1
+        taken_by = self._listener_rule_priorities.setdefault((listener, priority), service_name)
+        if taken_by != service_name:
+            raise RuntimeError(f'The {service_name} and {taken_by} listener rules have the same priority {priority} on the {listener} listener.')
+        return priority
+        
@@ -0,0 +1,283 @@
+from typing import Optional, Sequence
+
+from aws_cdk import (
+    CfnTag,
+    CfnUpdatePolicy,
+    CfnAutoScalingRollingUpdate,
+    Fn,
+    aws_autoscaling as autoscaling,
+    aws_ec2 as ec2,
+    aws_iam as iam,
+    aws_elasticloadbalancingv2 as elbv2,
+    aws_route53 as route53
+)
+from constructs import Construct
+
+from cdks.alb_stack import CdkALBStack
+from cdks.user_data import ServiceUserData
+from configs.model import ServiceSettings, load_config
+
+'''
+EC2 service behind the etl ALB: IAM role and instance profile, a single instance or an
+Auto Scaling group (see ServiceSettings.deployment_mode), a target group, a Route53 alias record
+<service_name>-<env>.com to the ALB and a host-header rule on the ALB listener.
+
+Every performance setting (instance type, gp3 root volume, health checks, deregistration delay,
+slow start, load balancing algorithm, stickiness) comes from the ServiceSettings of the
+service, its Ec2ServiceConfig subclass resolved for the environment by configs.model.
+'''
+
+class Ec2Service(Construct):
+
+    def __init__(self, scope: Construct, construct_id: str, service_name: str, environment: str, conf: ServiceSettings, alb: CdkALBStack,
+                 user_data: ServiceUserData, managed_policy_arns: Sequence[str], policies: Optional[Sequence[iam.CfnRole.PolicyProperty]] = None) -> None:
+        super().__init__(scope, construct_id)
+        
+        self.service_name = service_name
+        self.environment = environment
+        self.conf = conf
+        self.general_conf = load_config(environment).general
+        self.dns_name = f'{service_name}-{environment}.com'
+        
+        self.deployment_mode = conf.deployment_mode
+        
+        if conf.listener not in alb.listeners:
+            raise RuntimeError(f'The {service_name} listener value does not match allowed values.')
+        
+        self.role = iam.CfnRole(self, 'Role',
+            path='/',
+            managed_policy_arns = list(managed_policy_arns),
+            policies=policies,
+            assume_role_policy_document={
+                'Version': '2012-10-17',
+                'Statement': [
+                    {
+                        'Sid': '',
+                        'Effect': 'Allow',
+                        'Principal': {
+                            'Service': [
+                                'ec2.amazonaws.com'
+                            ]
+                        },
+                        'Action': [
+                            'sts:AssumeRole'
+                        ]
+                    }
+                ]
+            },
+        )
+        
+        self.instance_profile = iam.CfnInstanceProfile(self, 'InstanceProfile',
+            instance_profile_name=self._name('instance-profile'),
+            roles = [self.role.ref]
+        )
+        
+        """
+          target group
+        """
+        
+        target_group_attributes = {
+            'load_balancing.algorithm.type': conf.target_group_lb,
+            'deregistration_delay.timeout_seconds': str(conf.deregistration_delay_seconds),
+            'slow_start.duration_seconds': str(conf.slow_start_seconds),
+            'stickiness.enabled': 'true' if conf.stickiness else 'false'
+        }
+        if conf.stickiness:
+            target_group_attributes['stickiness.type'] = conf.stickiness['type']
+            target_group_attributes['stickiness.lb_cookie.duration_seconds'] = str(conf.stickiness['duration_seconds'])
+        
+        self.target_group = elbv2.CfnTargetGroup(self, 'TargetGroup',
+            name=self._name('tg'),
+            port=conf.service_port,
+            protocol='HTTP',
+            protocol_version='HTTP1',
+            target_type='instance',
+            vpc_id=self.general_conf.vpc_id,
+            health_check_enabled=True,
+            health_check_protocol='HTTP',
+            health_check_port=str(conf.service_port),
+            health_check_path=conf.health_check['path'],
+            health_check_interval_seconds=conf.health_check['interval_seconds'],
+            health_check_timeout_seconds=conf.health_check['timeout_seconds'],
+            healthy_threshold_count=conf.health_check['healthy_threshold_count'],
+            unhealthy_threshold_count=conf.health_check['unhealthy_threshold_count'],
+            matcher=elbv2.CfnTargetGroup.MatcherProperty(http_code=conf.health_check['matcher']),
+            target_group_attributes=[
+                elbv2.CfnTargetGroup.TargetGroupAttributeProperty(key=key, value=value)
+                for key, value in target_group_attributes.items()
+            ],
+            tags=self._tags()
+        )
+        
+        """
+          compute
+        """
+        
+        self.instance = None
+        self.auto_scaling_group = None
+        
+        if self.deployment_mode == 'instance':
+            launch_template = self._launch_template('', conf.instance_type, user_data)
+            
+            self.instance = ec2.CfnInstance(self, 'Instance',
+                subnet_id=self.general_conf.subnet_ids[0],
+                launch_template=ec2.CfnInstance.LaunchTemplateSpecificationProperty(
+                    launch_template_id=launch_template.ref,
+                    version=launch_template.attr_latest_version_number
+                ),
+                tags=self._tags()
+            )
+            
+            self.target_group.targets = [
+                elbv2.CfnTargetGroup.TargetDescriptionProperty(
+                    id=self.instance.ref,
+                    port=conf.service_port
+                )
+            ]
+        else:
+            self.auto_scaling_group = self.add_auto_scaling_group('',
+                instance_type=conf.instance_type,
+                capacity=conf.autoscaling,
+                user_data=user_data,
+                register_with_target_group=True
+            )
+            
+            if conf.scaling_metric == 'cpu':
+                predefined_metric_specification = autoscaling.CfnScalingPolicy.PredefinedMetricSpecificationProperty(
+                    predefined_metric_type='ASGAverageCPUUtilization'
+                )
+            elif conf.scaling_metric == 'request_count':
+                predefined_metric_specification = autoscaling.CfnScalingPolicy.PredefinedMetricSpecificationProperty(
+                    predefined_metric_type='ALBRequestCountPerTarget',
+                    resource_label=Fn.join('/', [
+                        alb.load_balancer_full_name,
+                        self.target_group.attr_target_group_full_name
+                    ])
+                )
+            else:
+                raise RuntimeError(f'The {service_name} scaling_metric value does not match allowed values.')
+            
+            autoscaling.CfnScalingPolicy(self, 'ScalingPolicy',
+                auto_scaling_group_name=self.auto_scaling_group.ref,
+                policy_type='TargetTrackingScaling',
+                estimated_instance_warmup=conf.health_check_grace_period,
+                target_tracking_configuration=autoscaling.CfnScalingPolicy.TargetTrackingConfigurationProperty(
+                    predefined_metric_specification=predefined_metric_specification,
+                    target_value=conf.scaling_target[conf.scaling_metric]
+                )
+            )
+        
+        """
+          dns and routing
+        """
+        
+        self.dns_record = route53.CfnRecordSet(self, 'RecordSet',
+            hosted_zone_id=conf.private_zone_id,
+            name=self.dns_name,
+            type='A',
+            alias_target=route53.CfnRecordSet.AliasTargetProperty(
+                dns_name=alb.dns_name,
+                hosted_zone_id=alb.canonical_hosted_zone_id,
+                evaluate_target_health=False
+            ),
+        )
+        
+        self.listener_rule = elbv2.CfnListenerRule(self, 'ListenerRule',
+            priority=alb.listener_rule_priority(conf.listener, service_name),
+            listener_arn=alb.listeners[conf.listener].ref,
+            actions = [
+                elbv2.CfnListenerRule.ActionProperty(
+                    type='forward',
+                    target_group_arn=self.target_group.ref
+                )
+            ],
+            conditions = [
+                elbv2.CfnListenerRule.RuleConditionProperty(
+                    field='host-header',
+                    host_header_config = elbv2.CfnListenerRule.HostHeaderConfigProperty(
+                        values=[self.dns_record.ref]
+                    ),
+                )
+            ]
+        )
+
+    def _name(self, kind: str = '', tier: str = '') -> str:
+        # e.g. redash-worker-asg-production, target group names are limited to 32 characters
+        return '-'.join(part for part in [self.service_name, tier, kind, self.environment] if part)
+
+    def _tags(self, tier: str = '') -> list:
+        return [
+            CfnTag(key='Name',value=self._name(tier=tier)),
+            CfnTag(key='Cost',value='infra'),
+            CfnTag(key='Environment',value=self.environment)
+        ]
+
+    def _launch_template(self, tier: str, instance_type: str, user_data: ServiceUserData) -> ec2.CfnLaunchTemplate:
+        return ec2.CfnLaunchTemplate(self, f'{tier.capitalize()}LaunchTemplate',
+            launch_template_name=self._name('launch-template', tier),
+            launch_template_data=ec2.CfnLaunchTemplate.LaunchTemplateDataProperty(
+                instance_type=instance_type,
+                key_name=self.general_conf.ec2_key_name,
+                security_group_ids=self.general_conf.security_group,
+                image_id=self.conf.ami,
+                iam_instance_profile=ec2.CfnLaunchTemplate.IamInstanceProfileProperty(
+                    arn=self.instance_profile.attr_arn
+                ),
+                block_device_mappings=[ec2.CfnLaunchTemplate.BlockDeviceMappingProperty(
+                    device_name=self.conf.root_volume['device_name'],
+                    ebs=ec2.CfnLaunchTemplate.EbsProperty(
+                        delete_on_termination=True,
+                        volume_size=self.conf.root_volume['size'],
+                        volume_type='gp3',
+                        iops=self.conf.root_volume['iops'],
+                        throughput=self.conf.root_volume['throughput']
+                    )
+                )],
+                tag_specifications=[
+                    ec2.CfnLaunchTemplate.TagSpecificationProperty(
+                        resource_type='instance',
+                        tags=self._tags(tier)
+                    )
+                ],
+                user_data=user_data.render(self, f'{tier.capitalize()}UserData', self.conf.user_data_delivery, self.role)
+            )
+        )
+
+    def add_auto_scaling_group(self, tier: str, instance_type: str, capacity: dict, user_data: ServiceUserData,
+                               register_with_target_group: bool = False) -> autoscaling.CfnAutoScalingGroup:
+        """
+        Launch template and Auto Scaling group across every subnet, sharing the service AMI,
+        instance profile and root volume. tier names extra groups, e.g. 'worker'.
+        Only groups registered with the target group receive traffic from the listener rule.
+        """
+        launch_template = self._launch_template(tier, instance_type, user_data)
+        
+        auto_scaling_group = autoscaling.CfnAutoScalingGroup(self, f'{tier.capitalize()}AutoScalingGroup',
+            auto_scaling_group_name=self._name('asg', tier),
+            min_size=str(capacity['min_capacity']),
+            max_size=str(capacity['max_capacity']),
+            desired_capacity=str(capacity['desired_capacity']),
+            vpc_zone_identifier=self.general_conf.subnet_ids,
+            launch_template=autoscaling.CfnAutoScalingGroup.LaunchTemplateSpecificationProperty(
+                launch_template_id=launch_template.ref,
+                version=launch_template.attr_latest_version_number
+            ),
+            target_group_arns=[self.target_group.ref] if register_with_target_group else None,
+            health_check_type='ELB' if register_with_target_group else 'EC2',
+            health_check_grace_period=self.conf.health_check_grace_period,
+            tags=[
+                autoscaling.CfnAutoScalingGroup.TagPropertyProperty(key=tag.key,value=tag.value,propagate_at_launch=True)
+                for tag in self._tags(tier)
+            ]
+        )
+        # replace instances one at a time when the launch template changes
+        auto_scaling_group.cfn_options.update_policy = CfnUpdatePolicy(
+            auto_scaling_rolling_update=CfnAutoScalingRollingUpdate(
+                min_instances_in_service=min(capacity['min_capacity'], capacity['max_capacity'] - 1),
+                max_batch_size=1,
+                pause_time='PT5M'
+            )
+        )
+        
+        return auto_scaling_group
+        
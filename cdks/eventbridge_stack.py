@@ -1,22 +1,33 @@
-from aws_cdk import Stack
+from aws_cdk import Duration, Stack
 from aws_cdk import aws_events as events
 from aws_cdk import aws_events_targets as targets
+from aws_cdk import aws_iam as iam
 from aws_cdk.aws_lambda import Function
 from aws_cdk import aws_lambda as lambda_
+from aws_cdk import aws_sqs as sqs
 from constructs import Construct
 
+from configs.model import load_config
+
 '''
 EventBridge stack for monitoring Redshift data change status whether is failure or aborted.
 The Lambda function (etl_data_monitoring_alert_<env>) target need to be built before deploy this stack
+
+In buffered mode the rule targets an SQS queue (with a dead-letter queue) and the Lambda reads it
+through an event source mapping, so a failing batch ETL gives a few batched invocations instead of
+one per statement. The Lambda then receives SQS records, each body being one EventBridge event,
+and should send one aggregated alert per batch.
 '''
 
 class CdkEventBridgeStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, environment: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
         
+        eventbridge_conf = load_config(environment).eventbridge
+        
         rule_name = f"redshift_slack_alert_{environment}"
         lambda_fn_name = f'lambda_redshift_slack_alert_{environment}'
-                        
+        
         rule = events.Rule(self, rule_name,
             event_pattern=events.EventPattern(
                 source=["aws.redshift-data"],
@@ -28,20 +39,74 @@ class CdkEventBridgeStack(Stack):
             )
         )
         
-        rule.add_target(targets.LambdaFunction(
-            Function.from_function_name(
-                self, 
-                id=f'{lambda_fn_name}_eb_target', 
-                function_name=lambda_fn_name),
+        alert_function = Function.from_function_name(
+            self, 
+            id=f'{lambda_fn_name}_eb_target',
+            function_name=lambda_fn_name)
+        
+        if not eventbridge_conf.buffered:
+            rule.add_target(targets.LambdaFunction(
+                alert_function,
+                retry_attempts=2
+                )
+            )
+            
+            lambda_.CfnPermission(
+                self, "eventbridge_lambda_invoke_permission",
+                action="lambda:InvokeFunction",
+                function_name=lambda_fn_name,
+                principal="events.amazonaws.com",
+                source_arn=rule.rule_arn
+            )
+            return
+        
+        """
+          buffered mode: rule -> sqs -> event source mapping -> lambda
+        """
+        
+        alert_dead_letter_queue = sqs.Queue(self, f'{rule_name}_dlq',
+            queue_name=f'{rule_name}_dlq',
+            retention_period=Duration.days(eventbridge_conf.dead_letter_retention_days)
+        )
+        
+        alert_queue = sqs.Queue(self, f'{rule_name}_queue',
+            queue_name=f'{rule_name}_queue',
+            visibility_timeout=Duration.seconds(eventbridge_conf.visibility_timeout_seconds),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                queue=alert_dead_letter_queue,
+                max_receive_count=eventbridge_conf.max_receive_count
+            )
+        )
+        
+        rule.add_target(targets.SqsQueue(
+            alert_queue,
+            dead_letter_queue=alert_dead_letter_queue,
             retry_attempts=2
             )
         )
         
-        lambda_.CfnPermission(
-            self, "eventbridge_lambda_invoke_permission",
-            action="lambda:InvokeFunction",
+        consume_grant = alert_queue.grant_consume_messages(
+            iam.Role.from_role_name(
+                self,
+                id=f'{lambda_fn_name}_role',
+                role_name=eventbridge_conf.lambda_role_name
+            )
+        )
+        
+        event_source_mapping = lambda_.CfnEventSourceMapping(
+            self, "sqs_lambda_event_source_mapping",
             function_name=lambda_fn_name,
-            principal="events.amazonaws.com",
-            source_arn=rule.rule_arn
+            event_source_arn=alert_queue.queue_arn,
+            batch_size=eventbridge_conf.batch_size,
+            maximum_batching_window_in_seconds=eventbridge_conf.batching_window_seconds,
+            enabled=True
         )
+        # the mapping is validated against the role permissions when it is created
+        consume_grant.apply_before(event_source_mapping)
+        
+        if eventbridge_conf.maximum_concurrency:
+            # CfnEventSourceMapping of this aws-cdk-lib has no scaling_config yet
+            event_source_mapping.add_property_override(
+                'ScalingConfig.MaximumConcurrency', eventbridge_conf.maximum_concurrency
+            )
     
@@ -0,0 +1,297 @@
+from typing import List
+
+from aws_cdk import (
+    CfnTag,
+    Stack,
+    aws_cloudwatch as cloudwatch,
+    aws_sns as sns
+)
+from constructs import Construct
+
+from cdks.msk_stack import CdkMSKStack
+from configs.model import MSK_METRICS_LEVELS, load_config
+from tools.msk_sizing import broker_ingress_limit_mb_per_second
+
+'''
+CloudWatch dashboard and alarms of the MSK cluster, generated from the cluster definition
+of CdkMSKStack: one set of broker alarms / widgets per broker, one widget per planned topic
+and consumer lag per consumer group of MSKMonitoringConfig.consumer_groups. Widgets needing
+a higher enhanced monitoring level than MSKConfig.metrics_level are left out.
+
+The broker BytesInPerSec alarm fires at the ingress the brokers were sized for
+(MSKConfig.broker_utilization_target of the instance limits), before the brokers saturate
+and consumers start to lag. Every alarm notifies the msk-alarms-<env> SNS topic.
+'''
+
+NAMESPACE = 'AWS/Kafka'
+
+MB = 1000 * 1000
+
+
+def _widget_metric(metric_name: str, dimensions: dict, **options) -> list:
+    metric = [NAMESPACE, metric_name]
+    for name, value in dimensions.items():
+        metric += [name, value]
+    return metric + [options] if options else metric
+
+
+class CdkMSKMonitoringStack(Stack):
+
+    def __init__(self, scope: Construct, construct_id: str, environment: str, msk: CdkMSKStack, **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+        
+        conf = load_config(environment)
+        msk_conf = conf.msk
+        monitoring_conf = conf.msk_monitoring
+        thresholds = monitoring_conf.thresholds
+        
+        self.environment_name = environment
+        self.monitoring_conf = monitoring_conf
+        
+        cluster_name = msk.cluster_name
+        cluster = {'Cluster Name': cluster_name}
+        broker_ids = [str(broker_id) for broker_id in range(1, msk_conf.number_of_broker + 1)]
+        metrics_level = MSK_METRICS_LEVELS.index(msk_conf.metrics_level)
+        
+        topic_names = [topic_plan.name for topic_plan in msk.topic_plans]
+        unknown_topics = [topic for topic in monitoring_conf.consumer_groups if topic not in topic_names]
+        if unknown_topics:
+            raise RuntimeError(f'The msk_monitoring consumer_groups topics {", ".join(unknown_topics)} are not in the msk topics.')
+        
+        if msk_conf.storage_autoscaling and thresholds['disk_used_percent'] <= msk_conf.storage_autoscaling['target_utilization']:
+            raise RuntimeError('The msk_monitoring disk_used_percent threshold must be above the storage autoscaling target_utilization.')
+        
+        replication_factor = max(topic_plan.replication_factor for topic_plan in msk.topic_plans)
+        ingress_limit_mb_per_second = broker_ingress_limit_mb_per_second(
+            msk_conf.instance_type,
+            msk_conf.provisioned_throughput,
+            replication_factor,
+            msk_conf.broker_utilization_target
+        )
+        
+        """
+          alarm notifications
+        """
+        
+        self.alarm_topic = sns.CfnTopic(self, f'MskAlarmTopic-{environment}',
+            topic_name=f'msk-alarms-{environment}',
+            subscription=[
+                sns.CfnTopic.SubscriptionProperty(endpoint=email, protocol='email')
+                for email in monitoring_conf.alarm_emails
+            ],
+            tags=[
+                CfnTag(key='Name', value=f'msk-alarms-{environment}'),
+                CfnTag(key='Cost', value='cost'),
+                CfnTag(key='Environment', value=environment)
+            ]
+        )
+        
+        """
+          cluster alarms
+        """
+        
+        self._alarm('ActiveController', f'{cluster_name}-active-controller',
+            'No broker of the cluster is the active controller.',
+            'ActiveControllerCount', cluster, 'Sum', 1,
+            comparison_operator='LessThanThreshold',
+            treat_missing_data='breaching'
+        )
+        
+        self._alarm('OfflinePartitions', f'{cluster_name}-offline-partitions',
+            'Partitions without a leader, producers and consumers of them are failing.',
+            'OfflinePartitionsCount', cluster, 'Maximum', 0
+        )
+        
+        """
+          broker alarms
+        """
+        
+        for broker_id in broker_ids:
+            broker = dict(cluster, **{'Broker ID': broker_id})
+        
+            self._alarm(f'Broker{broker_id}BytesIn', f'{cluster_name}-broker-{broker_id}-bytes-in',
+                f'Broker {broker_id} takes more than the {ingress_limit_mb_per_second:.1f} MB/s of producer traffic it was sized for.',
+                'BytesInPerSec', broker, 'Average', round(ingress_limit_mb_per_second * MB)
+            )
+        
+            self._cpu_alarm(broker_id, broker, f'{cluster_name}-broker-{broker_id}-cpu', thresholds['cpu_percent'])
+        
+            self._alarm(f'Broker{broker_id}DiskUsed', f'{cluster_name}-broker-{broker_id}-disk-used',
+                f'Broker {broker_id} data log volume is more than {thresholds["disk_used_percent"]}% used.',
+                'KafkaDataLogsDiskUsed', broker, 'Maximum', thresholds['disk_used_percent']
+            )
+        
+            self._alarm(f'Broker{broker_id}UnderReplicated', f'{cluster_name}-broker-{broker_id}-under-replicated',
+                f'Broker {broker_id} leads partitions whose followers are behind.',
+                'UnderReplicatedPartitions', broker, 'Maximum', 0
+            )
+        
+            self._alarm(f'Broker{broker_id}ProduceLatency', f'{cluster_name}-broker-{broker_id}-produce-latency',
+                f'Broker {broker_id} produce requests take more than {thresholds["produce_latency_ms"]} ms.',
+                'ProduceTotalTimeMsMean', broker, 'Average', thresholds['produce_latency_ms']
+            )
+        
+            self._alarm(f'Broker{broker_id}FetchLatency', f'{cluster_name}-broker-{broker_id}-fetch-latency',
+                f'Broker {broker_id} consumer fetch requests take more than {thresholds["fetch_consumer_latency_ms"]} ms.',
+                'FetchConsumerTotalTimeMsMean', broker, 'Average', thresholds['fetch_consumer_latency_ms']
+            )
+        
+        """
+          consumer lag alarms
+        """
+        
+        for topic, consumer_groups in monitoring_conf.consumer_groups.items():
+            for consumer_group in consumer_groups:
+                # no lag data while a group is not consuming, e.g. in develop
+                self._alarm(f'{consumer_group}-{topic}-TimeLag', f'{cluster_name}-{consumer_group}-{topic}-time-lag',
+                    f'{consumer_group} is more than {thresholds["max_time_lag_seconds"]} seconds behind on {topic}.',
+                    'EstimatedMaxTimeLag', dict(cluster, **{'Consumer Group': consumer_group, 'Topic': topic}),
+                    'Maximum', thresholds['max_time_lag_seconds'],
+                    treat_missing_data='notBreaching'
+                )
+        
+        """
+          dashboard
+        """
+        
+        period = monitoring_conf.period_seconds
+        
+        widgets = [
+            {
+                'type': 'text',
+                'width': 24,
+                'height': 2,
+                'properties': {
+                    'markdown': f'# {cluster_name}\n'
+                                f'{msk_conf.number_of_broker} x {msk_conf.instance_type}, metrics level {msk_conf.metrics_level}. '
+                                f'Brokers are sized for {ingress_limit_mb_per_second:.1f} MB/s of producer traffic each '
+                                f'({msk_conf.broker_utilization_target:.0%} of the instance limits).'
+                }
+            },
+            self._widget('Active controller / offline partitions', [
+                _widget_metric('ActiveControllerCount', cluster, stat='Sum'),
+                _widget_metric('OfflinePartitionsCount', cluster, stat='Maximum')
+            ], period, width=8),
+            self._widget('Under replicated partitions', [
+                _widget_metric('UnderReplicatedPartitions', dict(cluster, **{'Broker ID': broker_id}), label=f'broker {broker_id}')
+                for broker_id in broker_ids
+            ], period, stat='Maximum', width=8),
+            self._widget('Data log disk used (%)', [
+                _widget_metric('KafkaDataLogsDiskUsed', dict(cluster, **{'Broker ID': broker_id}), label=f'broker {broker_id}')
+                for broker_id in broker_ids
+            ], period, stat='Maximum', width=8, threshold=thresholds['disk_used_percent'])
+        ]
+        
+        for broker_id in broker_ids:
+            broker = dict(cluster, **{'Broker ID': broker_id})
+        
+            widgets.append(self._widget(f'Broker {broker_id} throughput (bytes/s)', [
+                _widget_metric('BytesInPerSec', broker, label='in'),
+                _widget_metric('BytesOutPerSec', broker, label='out')
+            ], period, threshold=round(ingress_limit_mb_per_second * MB), width=8))
+        
+            widgets.append(self._widget(f'Broker {broker_id} CPU (%)', [
+                _widget_metric('CpuUser', broker, label='user'),
+                _widget_metric('CpuSystem', broker, label='system')
+            ], period, stacked=True, threshold=thresholds['cpu_percent'], width=8))
+        
+            widgets.append(self._widget(f'Broker {broker_id} request latency (ms)', [
+                _widget_metric('ProduceTotalTimeMsMean', broker, label='produce'),
+                _widget_metric('FetchConsumerTotalTimeMsMean', broker, label='fetch consumer')
+            ], period, width=8))
+        
+        if metrics_level >= MSK_METRICS_LEVELS.index('PER_BROKER'):
+            widgets.append(self._widget('Request handler / network processor idle (%)', [
+                _widget_metric(metric_name, dict(cluster, **{'Broker ID': broker_id}), label=f'{label} broker {broker_id}')
+                for metric_name, label in [('RequestHandlerAvgIdlePercent', 'request handler'), ('NetworkProcessorAvgIdlePercent', 'network')]
+                for broker_id in broker_ids
+            ], period, width=24))
+        
+        for topic_plan in msk.topic_plans:
+            if metrics_level >= MSK_METRICS_LEVELS.index('PER_TOPIC_PER_BROKER'):
+                widgets.append(self._widget(f'{topic_plan.name} bytes in per broker ({topic_plan.partitions} partitions)', [
+                    _widget_metric('BytesInPerSec', dict(cluster, **{'Broker ID': broker_id, 'Topic': topic_plan.name}), label=f'broker {broker_id}')
+                    for broker_id in broker_ids
+                ], period, stacked=True))
+        
+            consumer_groups = monitoring_conf.consumer_groups.get(topic_plan.name, [])
+            if consumer_groups:
+                widgets.append(self._widget(f'{topic_plan.name} consumer lag (s)', [
+                    _widget_metric('EstimatedMaxTimeLag', dict(cluster, **{'Consumer Group': consumer_group, 'Topic': topic_plan.name}), label=consumer_group)
+                    for consumer_group in consumer_groups
+                ], period, stat='Maximum', threshold=thresholds['max_time_lag_seconds']))
+        
+        cloudwatch.CfnDashboard(self, f'MskDashboard-{environment}',
+            dashboard_name=f'{cluster_name}',
+            dashboard_body=self.to_json_string({'widgets': widgets})
+        )
+
+    def _widget(self, title: str, metrics: List[list], period: int, stat: str = 'Average', stacked: bool = False,
+                threshold=None, width: int = 12) -> dict:
+        properties = {
+            'title': title,
+            'region': self.region,
+            'view': 'timeSeries',
+            'stacked': stacked,
+            'period': period,
+            'stat': stat,
+            'metrics': metrics
+        }
+        if threshold is not None:
+            properties['annotations'] = {'horizontal': [{'label': 'alarm', 'value': threshold}]}
+        return {'type': 'metric', 'width': width, 'height': 6, 'properties': properties}
+
+    def _alarm(self, alarm_id: str, alarm_name: str, description: str, metric_name: str, dimensions: dict,
+               statistic: str, threshold, comparison_operator: str = 'GreaterThanThreshold',
+               treat_missing_data: str = 'missing') -> cloudwatch.CfnAlarm:
+        return cloudwatch.CfnAlarm(self, f'MskAlarm-{alarm_id}-{self.environment_name}',
+            alarm_name=alarm_name,
+            alarm_description=description,
+            namespace=NAMESPACE,
+            metric_name=metric_name,
+            dimensions=[cloudwatch.CfnAlarm.DimensionProperty(name=name, value=value) for name, value in dimensions.items()],
+            statistic=statistic,
+            period=self.monitoring_conf.period_seconds,
+            evaluation_periods=self.monitoring_conf.evaluation_periods,
+            threshold=threshold,
+            comparison_operator=comparison_operator,
+            treat_missing_data=treat_missing_data,
+            alarm_actions=[self.alarm_topic.ref],
+            ok_actions=[self.alarm_topic.ref]
+        )
+
+    def _cpu_alarm(self, broker_id: str, broker: dict, alarm_name: str, threshold: int) -> cloudwatch.CfnAlarm:
+        # CpuUser + CpuSystem, MSK publishes them as separate metrics
+        metrics = [
+            cloudwatch.CfnAlarm.MetricDataQueryProperty(
+                id=query_id,
+                metric_stat=cloudwatch.CfnAlarm.MetricStatProperty(
+                    metric=cloudwatch.CfnAlarm.MetricProperty(
+                        namespace=NAMESPACE,
+                        metric_name=metric_name,
+                        dimensions=[cloudwatch.CfnAlarm.DimensionProperty(name=name, value=value) for name, value in broker.items()]
+                    ),
+                    period=self.monitoring_conf.period_seconds,
+                    stat='Average'
+                ),
+                return_data=False
+            )
+            for query_id, metric_name in [('user', 'CpuUser'), ('system', 'CpuSystem')]
+        ]
+        metrics.append(cloudwatch.CfnAlarm.MetricDataQueryProperty(
+            id='cpu',
+            expression='user + system',
+            label=f'broker {broker_id} CPU',
+            return_data=True
+        ))
+        
+        return cloudwatch.CfnAlarm(self, f'MskAlarm-Broker{broker_id}Cpu-{self.environment_name}',
+            alarm_name=alarm_name,
+            alarm_description=f'Broker {broker_id} CpuUser + CpuSystem is over {threshold}%.',
+            metrics=metrics,
+            evaluation_periods=self.monitoring_conf.evaluation_periods,
+            threshold=threshold,
+            comparison_operator='GreaterThanThreshold',
+            alarm_actions=[self.alarm_topic.ref],
+            ok_actions=[self.alarm_topic.ref]
+        )
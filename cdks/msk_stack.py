@@ -1,26 +1,94 @@
 from aws_cdk import (
+    CustomResource,
+    Fn,
     Stack,
-    aws_msk as msk
+    Token,
+    aws_applicationautoscaling as appscaling,
+    aws_iam as iam,
+    aws_lambda as lambda_,
+    aws_msk as msk,
+    aws_s3_assets as s3_assets
 )
 from constructs import Construct
 
-from configs import general_config, msk_config
-
-CDK_MSK_CONF = msk_config.MSKConfig()
-CDK_GENERAL_CONF = general_config.GeneralConfig()
+from configs.model import load_config
+from tools.msk_sizing import plan_topics
 
 class CdkMSKStack(Stack):
 
     def __init__(self, scope: Construct, construct_id: str, environment:str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
         
+        conf = load_config(environment)
+        msk_conf = conf.msk
+        
         kafka_cluster_name = f'kafka-cluster-{environment}'
+        kafka_configuration_name = f'kafka-configuration-{environment}'
+        
+        instance_type = msk_conf.instance_type
+        kafka_version = msk_conf.kafka_version
+        provisioned_throughput = msk_conf.provisioned_throughput
+        storage_mode = msk_conf.storage_mode
+        storage_autoscaling = msk_conf.storage_autoscaling
+        open_monitoring = msk_conf.open_monitoring
+        
+        # read by the stacks built on the cluster (msk-monitoring, redshift)
+        self.cluster_name = kafka_cluster_name
+        
+        # partitions / replication of the topic catalog, fails before any construct when the brokers are too small
+        self.topic_plans = plan_topics(msk_conf.topics,
+            broker_count=msk_conf.number_of_broker,
+            instance_type=instance_type,
+            broker_configuration=msk_conf.broker_configuration,
+            load_factor=msk_conf.topic_load_factor,
+            partition_write_mb_per_second=msk_conf.partition_write_mb_per_second,
+            utilization=msk_conf.broker_utilization_target,
+            broker_volume_size=storage_autoscaling['max_volume_size'] if storage_autoscaling else msk_conf.broker_volume_size,
+            provisioned_throughput=provisioned_throughput,
+            local_retention_hours=msk_conf.tiered_local_retention_hours if storage_mode == 'TIERED' else None
+        )
+        
+        """
+          broker tuning profile
+        """
+        
+        server_properties = '\n'.join(
+            f'{key}={value}' for key, value in msk_conf.broker_configuration.items()
+        )
+        
+        etl_bronze_msk_configuration = msk.CfnConfiguration(self, f'MskConfiguration-{environment}',
+            name = kafka_configuration_name,
+            description = f'broker performance profile for {kafka_cluster_name}',
+            kafka_versions_list = [kafka_version],
+            server_properties = server_properties
+        )
         
         etl_bronze_msk_cluster = msk.CfnCluster(self, f'MskCluster-{environment}f',
             cluster_name = kafka_cluster_name,
-            kafka_version = CDK_MSK_CONF.kafka_version,
-            number_of_broker_nodes =CDK_MSK_CONF.number_of_broker[environment],
-            enhanced_monitoring = CDK_MSK_CONF.metrics_level,
+            kafka_version = kafka_version,
+            number_of_broker_nodes =msk_conf.number_of_broker,
+            enhanced_monitoring = msk_conf.metrics_level,
+            open_monitoring = msk.CfnCluster.OpenMonitoringProperty(
+                prometheus=msk.CfnCluster.PrometheusProperty(
+                    jmx_exporter=msk.CfnCluster.JmxExporterProperty(
+                        enabled_in_broker=open_monitoring['jmx_exporter']
+                    ),
+                    node_exporter=msk.CfnCluster.NodeExporterProperty(
+                        enabled_in_broker=open_monitoring['node_exporter']
+                    )
+                )
+            ) if open_monitoring else None,
+            client_authentication = msk.CfnCluster.ClientAuthenticationProperty(
+                sasl=msk.CfnCluster.SaslProperty(
+                    iam=msk.CfnCluster.IamProperty(enabled=True)
+                ),
+                # existing clients keep connecting over unauthenticated TLS
+                unauthenticated=msk.CfnCluster.UnauthenticatedProperty(enabled=True)
+            ) if msk_conf.iam_authentication else None,
+            configuration_info = msk.CfnCluster.ConfigurationInfoProperty(
+                arn = etl_bronze_msk_configuration.attr_arn,
+                revision = Token.as_number(etl_bronze_msk_configuration.get_att('LatestRevision.Revision'))
+            ),
             tags={
                 'Name': kafka_cluster_name,
                 'Cost': 'cost',
@@ -28,14 +96,169 @@ class CdkMSKStack(Stack):
             },
             broker_node_group_info = msk.CfnCluster.BrokerNodeGroupInfoProperty(
                 broker_az_distribution='DEFAULT',
-                instance_type = CDK_MSK_CONF.instance_type[environment],
-                security_groups = CDK_GENERAL_CONF.security_group,
-                client_subnets = CDK_GENERAL_CONF.subnet_ids,
+                instance_type = instance_type,
+                security_groups = conf.general.security_group,
+                client_subnets = conf.general.subnet_ids,
                 storage_info = msk.CfnCluster.StorageInfoProperty(
                     ebs_storage_info=msk.CfnCluster.EBSStorageInfoProperty(
-                        volume_size=CDK_MSK_CONF.broker_volume_size[environment]
+                        volume_size=msk_conf.broker_volume_size,
+                        provisioned_throughput=msk.CfnCluster.ProvisionedThroughputProperty(
+                            enabled=True,
+                            volume_throughput=provisioned_throughput
+                        ) if provisioned_throughput else None
                     )
                 )
             )
         )
         
+        # not exposed by this aws-cdk-lib version's CfnCluster
+        etl_bronze_msk_cluster.add_property_override('StorageMode', storage_mode)
+        
+        self.cluster = etl_bronze_msk_cluster
+        
+        """
+          broker storage autoscaling
+        """
+        
+        if storage_autoscaling:
+            storage_scalable_target = appscaling.CfnScalableTarget(self, f'MskStorageScalableTarget-{environment}',
+                service_namespace = 'kafka',
+                scalable_dimension = 'kafka:broker-storage:VolumeSize',
+                resource_id = etl_bronze_msk_cluster.ref,
+                # MSK only accepts 1 here, the effective minimum is the current volume size
+                min_capacity = 1,
+                max_capacity = storage_autoscaling['max_volume_size'],
+                role_arn = f'arn:{self.partition}:iam::{self.account}:role/aws-service-role/kafka.application-autoscaling.amazonaws.com/AWSServiceRoleForApplicationAutoScaling_KafkaCluster'
+            )
+            
+            appscaling.CfnScalingPolicy(self, f'MskStorageScalingPolicy-{environment}',
+                policy_name = f'{kafka_cluster_name}-storage-utilization',
+                policy_type = 'TargetTrackingScaling',
+                scaling_target_id = storage_scalable_target.ref,
+                target_tracking_scaling_policy_configuration = appscaling.CfnScalingPolicy.TargetTrackingScalingPolicyConfigurationProperty(
+                    target_value = storage_autoscaling['target_utilization'],
+                    disable_scale_in = True,
+                    predefined_metric_specification = appscaling.CfnScalingPolicy.PredefinedMetricSpecificationProperty(
+                        predefined_metric_type = 'KafkaBrokerStorageUtilization'
+                    )
+                )
+            )
+        
+        """
+          topics, created / grown by a Lambda in the cluster VPC (it needs a route to the MSK API for the bootstrap brokers)
+        """
+        
+        kafka_topics_statements = [
+            {
+                'Effect': 'Allow',
+                'Action': [
+                    'kafka:GetBootstrapBrokers'
+                ],
+                'Resource': etl_bronze_msk_cluster.ref
+            }
+        ]
+        
+        # with IAM authentication the Lambda connects over SASL/IAM (port 9098) as its role
+        if msk_conf.iam_authentication:
+            # arn:...:cluster/<cluster name>/<cluster uuid>, topic ARNs are arn:...:topic/<cluster name>/<cluster uuid>/<topic>
+            msk_cluster_uuid = Fn.select(2, Fn.split('/', etl_bronze_msk_cluster.ref))
+            
+            kafka_topics_statements += [
+                {
+                    'Effect': 'Allow',
+                    'Action': [
+                        'kafka-cluster:Connect',
+                        'kafka-cluster:DescribeCluster'
+                    ],
+                    'Resource': etl_bronze_msk_cluster.ref
+                },
+                {
+                    'Effect': 'Allow',
+                    'Action': [
+                        'kafka-cluster:CreateTopic',
+                        'kafka-cluster:DescribeTopic',
+                        'kafka-cluster:AlterTopic',
+                        'kafka-cluster:DescribeTopicDynamicConfiguration',
+                        'kafka-cluster:AlterTopicDynamicConfiguration'
+                    ],
+                    'Resource': [
+                        f'arn:{self.partition}:kafka:{self.region}:{self.account}:topic/{kafka_cluster_name}/{msk_cluster_uuid}/{topic_plan.name}'
+                        for topic_plan in self.topic_plans
+                    ]
+                }
+            ]
+        
+        kafka_topics_role = iam.CfnRole(self, f'KafkaTopicsRole-{environment}',
+            path='/',
+            managed_policy_arns=[
+                f'arn:{self.partition}:iam::aws:policy/service-role/AWSLambdaVPCAccessExecutionRole'
+            ],
+            policies=[
+                iam.CfnRole.PolicyProperty(
+                    policy_name='KafkaTopicsPolicy',
+                    policy_document={
+                        'Version': '2012-10-17',
+                        'Statement': kafka_topics_statements
+                    }
+                )
+            ],
+            assume_role_policy_document={
+                'Version': '2012-10-17',
+                'Statement': [
+                    {
+                        'Effect': 'Allow',
+                        'Principal': {
+                            'Service': [
+                                'lambda.amazonaws.com'
+                            ]
+                        },
+                        'Action': [
+                            'sts:AssumeRole'
+                        ]
+                    }
+                ]
+            },
+        )
+        
+        kafka_topics_code = s3_assets.Asset(self, f'KafkaTopicsCode-{environment}',
+            path='lambdas/kafka_topics',
+            # bytecode left by local test runs would change the asset hash
+            exclude=['__pycache__']
+        )
+        
+        kafka_topics_function = lambda_.CfnFunction(self, f'KafkaTopicsFunction-{environment}',
+            function_name=f'kafka-topics-{environment}',
+            runtime='python3.9',
+            handler='index.handler',
+            timeout=300,
+            memory_size=256,
+            role=kafka_topics_role.attr_arn,
+            code=lambda_.CfnFunction.CodeProperty(
+                s3_bucket=kafka_topics_code.s3_bucket_name,
+                s3_key=kafka_topics_code.s3_object_key
+            ),
+            layers=[msk_conf.kafka_admin_layer_arn],
+            vpc_config=lambda_.CfnFunction.VpcConfigProperty(
+                security_group_ids=conf.general.security_group,
+                subnet_ids=conf.general.subnet_ids
+            )
+        )
+        
+        CustomResource(self, f'KafkaTopics-{environment}',
+            service_token=kafka_topics_function.attr_arn,
+            resource_type='Custom::KafkaTopics',
+            properties={
+                'ClusterArn': etl_bronze_msk_cluster.ref,
+                'IamAuthentication': msk_conf.iam_authentication,
+                'Topics': [
+                    {
+                        'Name': topic_plan.name,
+                        'Partitions': topic_plan.partitions,
+                        'ReplicationFactor': topic_plan.replication_factor,
+                        'Configs': topic_plan.configs
+                    }
+                    for topic_plan in self.topic_plans
+                ]
+            }
+        )
+        
@@ -1,71 +1,117 @@
 from aws_cdk import (
     Stack,
     CfnTag,
-    aws_ec2 as ec2,
+    aws_autoscaling as autoscaling,
     aws_iam as iam,
-    aws_elasticloadbalancingv2 as elbv2,
-    aws_route53 as route53,
     aws_elasticache as elasticache,
     aws_rds as rds,
     aws_secretsmanager as secretsmanager
 )
 from constructs import Construct
 
-from configs import general_config, redash_config
-
-CDK_GENERAL_CONF = general_config.GeneralConfig()
-CDK_REDASH_CONF = redash_config.RedashConfig
-
-with open(CDK_REDASH_CONF.user_data_shell_path) as f:
-    redash_user_data = f.read()
+from cdks.alb_stack import CdkALBStack
+from cdks.ec2_service import Ec2Service
+from cdks.user_data import ServiceUserData
+from configs.model import load_config
 
 class CdkRedashStack(Stack):
 
-    def __init__(self, scope: Construct, construct_id: str, environment:str, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, environment:str, alb: CdkALBStack, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
         
+        conf = load_config(environment)
+        redash_conf = conf.redash
+        
         redis_name = f'redash-redis-{environment}'
         postgresql_name = f'redash-postgresql-{environment}'
         redash_service_name = f'redash-{environment}'
-        redash_instance_profile_name = f'redash-instance-profile-{environment}'
-        redash_target_group_name = f'redash-target_group-{environment}'
-        redash_dns = f'redash-{environment}.com'
-        
-        redash_redis = elasticache.CfnCacheCluster(self, f"RedashRedisCluster-{environment}",
-            cluster_name = redis_name,
-            vpc_security_group_ids = CDK_GENERAL_CONF.security_group,
-            engine = CDK_REDASH_CONF.redis['engine'],
-            engine_version = CDK_REDASH_CONF.redis['engine_version'],
-            port = 6379,
-            num_cache_nodes = CDK_REDASH_CONF.redis['number_cache_nodes'],
-            cache_node_type = CDK_REDASH_CONF.redis['node_type'],
-            cache_subnet_group_name = 'in-default-all-vpc',
-            tags=[
-                CfnTag(key='Name',value=redash_service_name),
-                CfnTag(key='Cost',value='infra'),
-                CfnTag(key='Environment',value=environment)
-            ]
-        )
+        
+        redis_conf = redash_conf.redis
+        
+        if redis_conf['replication_group']:
+            redash_redis_parameter_group = elasticache.CfnParameterGroup(self, f'RedashRedisParameterGroup-{environment}',
+                cache_parameter_group_family = redash_conf.redis_parameter_group_family,
+                description = f'redis parameters for {redis_name}',
+                properties = dict(
+                    redash_conf.redis_parameters,
+                    **{'cluster-enabled': 'yes' if redis_conf['cluster_mode'] else 'no'}
+                )
+            )
+            
+            redash_redis = elasticache.CfnReplicationGroup(self, f"RedashRedisReplicationGroup-{environment}",
+                replication_group_id = redis_name,
+                replication_group_description = f'redash queue and query result cache {environment}',
+                security_group_ids = conf.general.security_group,
+                engine = redis_conf['engine'],
+                engine_version = redis_conf['engine_version'],
+                port = 6379,
+                cache_node_type = redis_conf['node_type'],
+                cache_parameter_group_name = redash_redis_parameter_group.ref,
+                cache_subnet_group_name = 'in-default-all-vpc',
+                num_node_groups = redis_conf['num_node_groups'],
+                replicas_per_node_group = redis_conf['replicas_per_node_group'],
+                automatic_failover_enabled = redis_conf['replicas_per_node_group'] > 0,
+                multi_az_enabled = redis_conf['replicas_per_node_group'] > 0,
+                data_tiering_enabled = redis_conf['data_tiering'],
+                tags=[
+                    CfnTag(key='Name',value=redash_service_name),
+                    CfnTag(key='Cost',value='infra'),
+                    CfnTag(key='Environment',value=environment)
+                ]
+            )
+            
+            if redis_conf['cluster_mode']:
+                redis_primary_address = redash_redis.attr_configuration_end_point_address
+                redis_reader_address = redash_redis.attr_configuration_end_point_address
+            else:
+                redis_primary_address = redash_redis.attr_primary_end_point_address
+                redis_reader_address = redash_redis.attr_reader_end_point_address
+        else:
+            redash_redis = elasticache.CfnCacheCluster(self, f"RedashRedisCluster-{environment}",
+                cluster_name = redis_name,
+                vpc_security_group_ids = conf.general.security_group,
+                engine = redis_conf['engine'],
+                engine_version = redis_conf['engine_version'],
+                port = 6379,
+                num_cache_nodes = redis_conf['number_cache_nodes'],
+                cache_node_type = redis_conf['node_type'],
+                cache_subnet_group_name = 'in-default-all-vpc',
+                tags=[
+                    CfnTag(key='Name',value=redash_service_name),
+                    CfnTag(key='Cost',value='infra'),
+                    CfnTag(key='Environment',value=environment)
+                ]
+            )
+            
+            redis_primary_address = redash_redis.attr_redis_endpoint_address
+            redis_reader_address = redash_redis.attr_redis_endpoint_address
         
         master_secret = secretsmanager.Secret.from_secret_name_v2(self, f'ImportedRedashDBSecret-{environment}',
-            secret_name=CDK_REDASH_CONF.secret_name
+            secret_name=redash_conf.secret_name
         )
         
+        postgres_storage = redash_conf.postgres_storage
+        postgres_read_replica = redash_conf.postgres_read_replica
+        performance_insights_retention = redash_conf.postgres_performance_insights_retention
+        
         redash_postgres_db = rds.CfnDBInstance(self, f"RedashPostgresDB-{environment}",
-            db_instance_class = CDK_REDASH_CONF.postgres_db['db_instance_type'],
-            allocated_storage = CDK_REDASH_CONF.postgres_db['db_allocated_storage'],
-            backup_retention_period = CDK_REDASH_CONF.postgres_db['backup_retention_period'],
+            db_instance_class = redash_conf.postgres_instance_type,
+            allocated_storage = postgres_storage['allocated_storage'],
+            backup_retention_period = redash_conf.postgres_db['backup_retention_period'],
             db_instance_identifier = postgresql_name,
-            db_name = CDK_REDASH_CONF.postgres_db['db_name'],
+            db_name = redash_conf.postgres_db['db_name'],
             db_subnet_group_name = 'default-postgresql',
-            engine = CDK_REDASH_CONF.postgres_db['engine'],
-            engine_version = CDK_REDASH_CONF.postgres_db['engine_version'],
-            vpc_security_groups = CDK_GENERAL_CONF.security_group,
+            engine = redash_conf.postgres_db['engine'],
+            engine_version = redash_conf.postgres_db['engine_version'],
+            vpc_security_groups = conf.general.security_group,
             master_username = master_secret.secret_value_from_json('username').to_string(),
             master_user_password = master_secret.secret_value_from_json('password').to_string(),
-            multi_az = False,
+            multi_az = redash_conf.postgres_multi_az,
             publicly_accessible = False,
-            storage_type = 'gp2',
+            storage_type = postgres_storage['storage_type'],
+            iops = postgres_storage['iops'],
+            enable_performance_insights = performance_insights_retention is not None,
+            performance_insights_retention_period = performance_insights_retention,
             tags=[
                 CfnTag(key='Name',value=redash_service_name),
                 CfnTag(key='Cost',value='infra'),
@@ -73,146 +119,150 @@ class CdkRedashStack(Stack):
             ]
         )
         
-        redash_iam_role = iam.CfnRole(self, f'RedashRole-{environment}',
-            path='/',
-            managed_policy_arns = [
-                'arn:aws:iam::aws:policy/AmazonRedshiftReadOnlyAccess',
-                'arn:aws:iam::aws:policy/CloudWatchFullAccess'
-            ],
-            policies=[
-                iam.CfnRole.PolicyProperty(
-                    policy_name="RedashRDSPolicy",
-                    policy_document={
-                        'Version': '2012-10-17',
-                        'Statement': [
-                            {
-                                'Sid': '',
-                                'Effect': 'Allow',
-                                'Action': [
-                                    'rds.*'
-                                ],
-                                'resource': 'arn:aws:rds:ap-northeast-1:473024607515:db:redash-staging'
-                            }
-                        ]
-                    }
-                ),
-                iam.CfnRole.PolicyProperty(
-                    policy_name="RedashRedisPolicy",
-                    policy_document={
-                        'Version': '2012-10-17',
-                        'Statement': [
-                            {
-                                'Sid': '',
-                                'Effect': 'Allow',
-                                'Action': [
-                                    'elasticache.*'
-                                ],
-                                'resource': 'arn:aws:elasticache:ap-northeast-1:473024607515:cluster:redash-staging'
-                            }
-                        ]
-                    }
-                )
-            ],
-            assume_role_policy_document={
-                'Version': '2012-10-17',
-                'Statement': [
-                    {
-                        'Sid': '',
-                        'Effect': 'Allow',
-                        'Principal': {
-                            'Service': [
-                                'ec2.amazonaws.com'
-                            ]
-                        },
-                        'Action': [
-                            'sts:AssumeRole'
-                        ]
-                    }
+        if postgres_storage['storage_throughput']:
+            # not exposed by this aws-cdk-lib version's CfnDBInstance
+            redash_postgres_db.add_property_override('StorageThroughput', postgres_storage['storage_throughput'])
+        
+        if postgres_read_replica:
+            redash_postgres_read_replica = rds.CfnDBInstance(self, f"RedashPostgresReadReplica-{environment}",
+                db_instance_class = postgres_read_replica['db_instance_type'],
+                db_instance_identifier = f'{postgresql_name}-replica',
+                source_db_instance_identifier = redash_postgres_db.ref,
+                vpc_security_groups = conf.general.security_group,
+                publicly_accessible = False,
+                storage_type = postgres_storage['storage_type'],
+                iops = postgres_storage['iops'],
+                enable_performance_insights = performance_insights_retention is not None,
+                performance_insights_retention_period = performance_insights_retention,
+                tags=[
+                    CfnTag(key='Name',value=redash_service_name),
+                    CfnTag(key='Cost',value='infra'),
+                    CfnTag(key='Environment',value=environment)
                 ]
-            },
-        )
+            )
+            
+            if postgres_storage['storage_throughput']:
+                redash_postgres_read_replica.add_property_override('StorageThroughput', postgres_storage['storage_throughput'])
         
-        redash_instance_profile = iam.CfnInstanceProfile(self, f'RedashInstanceProfile-{environment}',
-            instance_profile_name=redash_instance_profile_name,
-            roles = [redash_iam_role.ref]
-        )
+        redash_policies = [
+            iam.CfnRole.PolicyProperty(
+                policy_name="RedashRDSPolicy",
+                policy_document={
+                    'Version': '2012-10-17',
+                    'Statement': [
+                        {
+                            'Sid': '',
+                            'Effect': 'Allow',
+                            'Action': [
+                                'rds.*'
+                            ],
+                            'resource': 'arn:aws:rds:ap-northeast-1:473024607515:db:redash-staging'
+                        }
+                    ]
+                }
+            ),
+            iam.CfnRole.PolicyProperty(
+                policy_name="RedashRedisPolicy",
+                policy_document={
+                    'Version': '2012-10-17',
+                    'Statement': [
+                        {
+                            'Sid': '',
+                            'Effect': 'Allow',
+                            'Action': [
+                                'elasticache.*'
+                            ],
+                            'resource': 'arn:aws:elasticache:ap-northeast-1:473024607515:cluster:redash-staging'
+                        }
+                    ]
+                }
+            ),
+            # the workers divide the queue depth by the InService instances of their group
+            iam.CfnRole.PolicyProperty(
+                policy_name="RedashWorkerAutoScalingPolicy",
+                policy_document={
+                    'Version': '2012-10-17',
+                    'Statement': [
+                        {
+                            'Effect': 'Allow',
+                            'Action': [
+                                'autoscaling:DescribeAutoScalingInstances',
+                                'autoscaling:DescribeAutoScalingGroups'
+                            ],
+                            'Resource': '*'
+                        }
+                    ]
+                }
+            )
+        ]
         
-        redash_instance = ec2.CfnInstance(self, f'RedashInstance-{environment}',
-            instance_type=CDK_REDASH_CONF.instance_type,
-            key_name=CDK_GENERAL_CONF.ec2_key_name,
-            subnet_id=CDK_GENERAL_CONF.subnet_ids[0],
-            security_group_ids=CDK_GENERAL_CONF.security_group,
-            image_id=CDK_REDASH_CONF.ami[environment],
-            iam_instance_profile=redash_instance_profile.ref,
-            tags=[
-                CfnTag(key='Name',value=redash_service_name),
-                CfnTag(key='Cost',value='infra'),
-                CfnTag(key='Environment',value=environment)
-            ],
-            block_device_mappings=[ec2.CfnInstance.BlockDeviceMappingProperty(
-                device_name="/dev/sda1",
-                ebs=ec2.CfnInstance.EbsProperty(
-                    delete_on_termination=True,
-                    volume_size=10,
-                    volume_type="gp2"
-                )
-            )],
-            user_data=redash_user_data
-        )
+        """
+          web and worker tiers, the cache endpoints and the tier role are passed to redash through its env file
+        """
         
-        redash_target_group = elbv2.CfnTargetGroup(self, f'RedashTargetGroup-{environment}',
-            name=redash_target_group_name,
-            port=CDK_REDASH_CONF.service_port,
-            protocol='HTTP',
-            protocol_version='HTTP1',
-            target_type='instance',
-            targets=[
-                elbv2.CfnTargetGroup.TargetDescriptionProperty(
-                    id=redash_instance.ref,
-                    port=CDK_REDASH_CONF.service_port
-                )
-            ],
-            vpc_id=CDK_GENERAL_CONF.vpc_id,
-            target_group_attributes=[
-                elbv2.CfnTargetGroup.TargetGroupAttributeProperty(
-                    key='load_balancing.algorithm.type',
-                    value=CDK_REDASH_CONF.target_group_lb,
-                )
-            ],
-            tags=[
-                CfnTag(key='Name',value=redash_service_name),
-                CfnTag(key='Cost',value='infra'),
-                CfnTag(key='Environment',value=environment)
+        redash_env = [
+            f'REDASH_ENVIRONMENT={environment}',
+            f'REDASH_REDIS_URL=redis://{redis_primary_address}:6379/0',
+            f'REDASH_REDIS_READER_URL=redis://{redis_reader_address}:6379/0',
+            f'AWS_DEFAULT_REGION={self.region}'
+        ]
+        redash_tier_env = {
+            'web': ['REDASH_ROLE=web'],
+            'worker': [
+                'REDASH_ROLE=worker',
+                f"REDASH_QUEUE_NAMES={' '.join(redash_conf.worker_queues)}",
+                f"REDASH_QUEUE_METRIC_NAMESPACE={redash_conf.queue_backlog_metric['namespace']}",
+                f"REDASH_QUEUE_METRIC_NAME={redash_conf.queue_backlog_metric['metric_name']}"
             ]
+        }
+        
+        # the env file lines hold tokens and stay in the uncompressed prelude
+        redash_tier_user_data = {
+            tier: ServiceUserData(
+                script_paths=([redash_conf.queue_depth_user_data_shell_path] if tier == 'worker' else []) +
+                    [redash_conf.user_data_shell_path],
+                prelude=[f'mkdir -p $(dirname {redash_conf.redash_env_file})'] +
+                    [f"echo '{line}' >> {redash_conf.redash_env_file}" for line in redash_env + redash_tier_env[tier]]
+            )
+            for tier in ['web', 'worker']
+        }
+        
+        # the web tier is the service fleet behind the listener rule
+        self.service = Ec2Service(self, f'Redash-{environment}',
+            service_name='redash',
+            environment=environment,
+            conf=redash_conf,
+            alb=alb,
+            user_data=redash_tier_user_data['web'],
+            managed_policy_arns=[
+                'arn:aws:iam::aws:policy/AmazonRedshiftReadOnlyAccess',
+                'arn:aws:iam::aws:policy/CloudWatchFullAccess'
+            ],
+            policies=redash_policies
         )
         
-        redash_dns_record = route53.CfnRecordSet(self, f'RedashRecordSet-{environment}',
-            hosted_zone_id=CDK_REDASH_CONF.private_zone_id,
-            name=redash_dns,
-            type='A',
-            alias_target=route53.CfnRecordSet.AliasTargetProperty(
-                dns_name=CDK_REDASH_CONF.recordset_dns_name,
-                hosted_zone_id=CDK_REDASH_CONF.etl_alb_zone_id,
-                evaluate_target_health=False
-            ),
+        redash_worker_asg = self.service.add_auto_scaling_group('worker',
+            instance_type=redash_conf.worker_instance_type,
+            capacity=redash_conf.worker_autoscaling,
+            user_data=redash_tier_user_data['worker']
         )
         
-        redash_listener_rule = elbv2.CfnListenerRule(self, f'RedashListenerRule-{environment}',
-            priority=1,
-            listener_arn=CDK_REDASH_CONF.linstener_arn,
-            actions = [
-                elbv2.CfnListenerRule.ActionProperty(
-                    type='forward',
-                    target_group_arn=redash_target_group.ref
-                )
-            ],
-            conditions = [
-                elbv2.CfnListenerRule.RuleConditionProperty(
-                    field='host-header',
-                    host_header_config = elbv2.CfnListenerRule.HostHeaderConfigProperty(
-                        values=[redash_dns_record.ref]
-                    ),
-                )
-            ]
+        # every worker publishes the same backlog per InService worker, so the average is that backlog
+        autoscaling.CfnScalingPolicy(self, f'RedashWorkerScalingPolicy-{environment}',
+            auto_scaling_group_name=redash_worker_asg.ref,
+            policy_type='TargetTrackingScaling',
+            estimated_instance_warmup=redash_conf.health_check_grace_period,
+            target_tracking_configuration=autoscaling.CfnScalingPolicy.TargetTrackingConfigurationProperty(
+                customized_metric_specification=autoscaling.CfnScalingPolicy.CustomizedMetricSpecificationProperty(
+                    namespace=redash_conf.queue_backlog_metric['namespace'],
+                    metric_name=redash_conf.queue_backlog_metric['metric_name'],
+                    dimensions=[
+                        autoscaling.CfnScalingPolicy.MetricDimensionProperty(name='Environment', value=environment)
+                    ],
+                    statistic='Average',
+                    unit='Count'
+                ),
+                target_value=redash_conf.worker_scaling_target_backlog
+            )
         )
     
@@ -1,22 +1,49 @@
+import json
+from typing import Optional
+
 from aws_cdk import (
+    CustomResource,
+    Fn,
     Stack,
     CfnTag,
+    aws_iam as iam,
+    aws_lambda as lambda_,
     aws_redshift as redshift,
+    aws_s3_assets as s3_assets,
     aws_secretsmanager as secretsmanager
 )
 
 from constructs import Construct
 
-from configs import redsfhit_config, general_config
+from cdks.msk_stack import CdkMSKStack
+from configs.model import load_config
+
+
+def streaming_view_name(topic: str) -> str:
+    return topic.replace('.', '_').replace('-', '_')
+
+
+def streaming_view_sql(view_schema: str, external_schema: str, topic: str) -> str:
+    """
+    Auto refresh materialized view over one MSK topic, the JSON message value parsed into a SUPER payload.
+    """
+    return (
+        f'CREATE MATERIALIZED VIEW {view_schema}.{streaming_view_name(topic)} AUTO REFRESH YES AS '
+        f'SELECT kafka_partition, kafka_offset, kafka_timestamp_type, kafka_timestamp, kafka_key, '
+        f'JSON_PARSE(kafka_value) AS payload, kafka_headers '
+        f'FROM {external_schema}."{topic}" '
+        f'WHERE CAN_JSON_PARSE(kafka_value)'
+    )
 
-CDK_REDSHIFT_CONF = redsfhit_config.RedshiftConfig()
-CDK_GENERAL_CONF = general_config.GeneralConfig()
 
 class CdkRedshiftStack(Stack):
 
-    def __init__(self, scope: Construct, construct_id: str, environment:str, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, environment:str, msk: Optional[CdkMSKStack] = None, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
         
+        conf = load_config(environment)
+        redshift_conf = conf.redshift
+        
         """
           redshift + secret manger
         """
@@ -25,24 +52,128 @@ class CdkRedshiftStack(Stack):
         redshift_subnet_group_name = f'redshift-subnet-group-{environment}'
         
         master_secret = secretsmanager.Secret.from_secret_name_v2(self, f'ImportedRedsfhitSecret-{environment}',
-            secret_name=CDK_REDSHIFT_CONF.secret_name
+            secret_name=redshift_conf.secret_name
         )
         
         redshift_subnet_group = redshift.CfnClusterSubnetGroup(self, redshift_subnet_group_name,
             description=f'redshift cluster subnet group in {environment}',
-            subnet_ids=CDK_GENERAL_CONF.subnet_ids
+            subnet_ids=conf.general.subnet_ids
+        )
+        
+        """
+          streaming ingestion role, reads the MSK topics with IAM authentication
+        """
+        
+        streaming_conf = redshift_conf.streaming_ingestion
+        
+        if streaming_conf:
+            if msk is None:
+                raise RuntimeError('Redshift streaming_ingestion needs the msk stack.')
+            unknown_topics = [topic for topic in streaming_conf['topics'] if topic not in [topic_plan.name for topic_plan in msk.topic_plans]]
+            if unknown_topics:
+                raise RuntimeError(f'Redshift streaming_ingestion topics {", ".join(unknown_topics)} are not in the msk topics.')
+            if not conf.msk.iam_authentication:
+                raise RuntimeError('Redshift streaming_ingestion needs msk iam_authentication.')
+            
+            # arn:...:cluster/<cluster name>/<cluster uuid>, topic ARNs are arn:...:topic/<cluster name>/<cluster uuid>/<topic>
+            msk_cluster_uuid = Fn.select(2, Fn.split('/', msk.cluster.ref))
+            
+            streaming_role = iam.CfnRole(self, f'RedshiftStreamingRole-{environment}',
+                path='/',
+                policies=[
+                    iam.CfnRole.PolicyProperty(
+                        policy_name='RedshiftStreamingIngestionPolicy',
+                        policy_document={
+                            'Version': '2012-10-17',
+                            'Statement': [
+                                {
+                                    'Effect': 'Allow',
+                                    'Action': [
+                                        'kafka:GetBootstrapBrokers',
+                                        'kafka:DescribeCluster',
+                                        'kafka-cluster:Connect',
+                                        'kafka-cluster:DescribeCluster'
+                                    ],
+                                    'Resource': msk.cluster.ref
+                                },
+                                {
+                                    'Effect': 'Allow',
+                                    'Action': [
+                                        'kafka-cluster:DescribeTopic',
+                                        'kafka-cluster:ReadData'
+                                    ],
+                                    'Resource': [
+                                        f'arn:{self.partition}:kafka:{self.region}:{self.account}:topic/{msk.cluster_name}/{msk_cluster_uuid}/{topic}'
+                                        for topic in streaming_conf['topics']
+                                    ]
+                                }
+                            ]
+                        }
+                    )
+                ],
+                assume_role_policy_document={
+                    'Version': '2012-10-17',
+                    'Statement': [
+                        {
+                            'Effect': 'Allow',
+                            'Principal': {
+                                'Service': [
+                                    'redshift.amazonaws.com'
+                                ]
+                            },
+                            'Action': [
+                                'sts:AssumeRole'
+                            ]
+                        }
+                    ]
+                },
+            )
+        
+        """
+          workload management parameter group
+        """
+        
+        wlm_json_configuration = list(redshift_conf.wlm_queues)
+        if redshift_conf.short_query_acceleration:
+            wlm_json_configuration.append({'short_query_queue': True})
+        
+        redshift_parameter_group = redshift.CfnClusterParameterGroup(self, f'redshift-parameter-group-{environment}',
+            description=f'redshift cluster workload management in {environment}',
+            parameter_group_family=redshift_conf.parameter_group_family,
+            parameters=[
+                redshift.CfnClusterParameterGroup.ParameterProperty(
+                    parameter_name='wlm_json_configuration',
+                    parameter_value=json.dumps(wlm_json_configuration)
+                ),
+                redshift.CfnClusterParameterGroup.ParameterProperty(
+                    parameter_name='max_concurrency_scaling_clusters',
+                    parameter_value=str(redshift_conf.max_concurrency_scaling_clusters)
+                ),
+                redshift.CfnClusterParameterGroup.ParameterProperty(
+                    parameter_name='enable_result_cache_for_session_queries',
+                    parameter_value='true' if redshift_conf.enable_result_cache else 'false'
+                )
+            ],
+            tags=[
+                CfnTag(key='Name',value=redshift_cluster_name),
+                CfnTag(key='Cost',value='infra'),
+                CfnTag(key='Environment',value=environment)
+            ]
         )
         
         redsfhit_cluster = redshift.CfnCluster(self, redshift_cluster_name,
             cluster_identifier = redshift_cluster_name,
             cluster_subnet_group_name = redshift_subnet_group.ref,
-            cluster_type = CDK_REDSHIFT_CONF.cluster_type,
+            cluster_parameter_group_name = redshift_parameter_group.ref,
+            cluster_type = redshift_conf.cluster_type,
             db_name = 'dev',
             master_username = master_secret.secret_value_from_json('username').to_string(),
             master_user_password = master_secret.secret_value_from_json('password').to_string(),
-            node_type = CDK_REDSHIFT_CONF.node_type,
-            number_of_nodes=CDK_REDSHIFT_CONF.number_of_nodes,
-            vpc_security_group_ids = CDK_GENERAL_CONF.security_group,
+            node_type = redshift_conf.node_type,
+            # NumberOfNodes is only allowed on multi-node clusters
+            number_of_nodes=redshift_conf.number_of_nodes if redshift_conf.cluster_type == 'multi-node' else None,
+            vpc_security_group_ids = conf.general.security_group,
+            iam_roles = [streaming_role.attr_arn] if streaming_conf else None,
             tags=[
                 CfnTag(key='Name',value=redshift_cluster_name),
                 CfnTag(key='Cost',value='infra'),
@@ -50,3 +181,187 @@ class CdkRedshiftStack(Stack):
             ]
         )
         
+        """
+          scheduled elastic resize / pause / resume
+        """
+        
+        scheduled_actions = redshift_conf.scheduled_actions
+        
+        if scheduled_actions:
+            redshift_scheduler_role = iam.CfnRole(self, f'RedshiftSchedulerRole-{environment}',
+                path='/',
+                policies=[
+                    iam.CfnRole.PolicyProperty(
+                        policy_name='RedshiftScheduledActionPolicy',
+                        policy_document={
+                            'Version': '2012-10-17',
+                            'Statement': [
+                                {
+                                    'Effect': 'Allow',
+                                    'Action': [
+                                        'redshift:ResizeCluster',
+                                        'redshift:PauseCluster',
+                                        'redshift:ResumeCluster'
+                                    ],
+                                    'Resource': f'arn:{self.partition}:redshift:{self.region}:{self.account}:cluster:{redshift_cluster_name}'
+                                }
+                            ]
+                        }
+                    )
+                ],
+                assume_role_policy_document={
+                    'Version': '2012-10-17',
+                    'Statement': [
+                        {
+                            'Effect': 'Allow',
+                            'Principal': {
+                                'Service': [
+                                    'scheduler.redshift.amazonaws.com'
+                                ]
+                            },
+                            'Action': [
+                                'sts:AssumeRole'
+                            ]
+                        }
+                    ]
+                },
+            )
+        
+        for scheduled_action in scheduled_actions:
+            if scheduled_action['action'] == 'resize':
+                target_action = redshift.CfnScheduledAction.ScheduledActionTypeProperty(
+                    resize_cluster=redshift.CfnScheduledAction.ResizeClusterMessageProperty(
+                        cluster_identifier=redsfhit_cluster.ref,
+                        number_of_nodes=scheduled_action['number_of_nodes'],
+                        classic=False
+                    )
+                )
+            elif scheduled_action['action'] == 'pause':
+                target_action = redshift.CfnScheduledAction.ScheduledActionTypeProperty(
+                    pause_cluster=redshift.CfnScheduledAction.PauseClusterMessageProperty(
+                        cluster_identifier=redsfhit_cluster.ref
+                    )
+                )
+            elif scheduled_action['action'] == 'resume':
+                target_action = redshift.CfnScheduledAction.ScheduledActionTypeProperty(
+                    resume_cluster=redshift.CfnScheduledAction.ResumeClusterMessageProperty(
+                        cluster_identifier=redsfhit_cluster.ref
+                    )
+                )
+            else:
+                raise RuntimeError(f'Redshift scheduled action {scheduled_action["action"]} does not match allowed values.')
+            
+            redshift.CfnScheduledAction(self, f'RedshiftScheduledAction-{scheduled_action["name"]}-{environment}',
+                scheduled_action_name=f'{redshift_cluster_name}-{scheduled_action["name"]}',
+                schedule=scheduled_action['schedule'],
+                iam_role=redshift_scheduler_role.attr_arn,
+                enable=True,
+                target_action=target_action
+            )
+        
+        """
+          streaming ingestion schemas and materialized views, created through the Redshift Data API
+        """
+        
+        if not streaming_conf:
+            return
+        
+        streaming_views_role = iam.CfnRole(self, f'RedshiftStreamingViewsRole-{environment}',
+            path='/',
+            managed_policy_arns=[
+                f'arn:{self.partition}:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole'
+            ],
+            policies=[
+                iam.CfnRole.PolicyProperty(
+                    policy_name='RedshiftStreamingViewsPolicy',
+                    policy_document={
+                        'Version': '2012-10-17',
+                        'Statement': [
+                            {
+                                'Effect': 'Allow',
+                                'Action': [
+                                    'redshift-data:ExecuteStatement'
+                                ],
+                                'Resource': f'arn:{self.partition}:redshift:{self.region}:{self.account}:cluster:{redshift_cluster_name}'
+                            },
+                            {
+                                # statement ids have no resource ARN
+                                'Effect': 'Allow',
+                                'Action': [
+                                    'redshift-data:DescribeStatement',
+                                    'redshift-data:GetStatementResult'
+                                ],
+                                'Resource': '*'
+                            },
+                            {
+                                'Effect': 'Allow',
+                                'Action': [
+                                    'secretsmanager:GetSecretValue'
+                                ],
+                                'Resource': f'arn:{self.partition}:secretsmanager:{self.region}:{self.account}:secret:{redshift_conf.secret_name}-*'
+                            }
+                        ]
+                    }
+                )
+            ],
+            assume_role_policy_document={
+                'Version': '2012-10-17',
+                'Statement': [
+                    {
+                        'Effect': 'Allow',
+                        'Principal': {
+                            'Service': [
+                                'lambda.amazonaws.com'
+                            ]
+                        },
+                        'Action': [
+                            'sts:AssumeRole'
+                        ]
+                    }
+                ]
+            },
+        )
+        
+        streaming_views_code = s3_assets.Asset(self, f'RedshiftStreamingViewsCode-{environment}',
+            path='lambdas/redshift_streaming',
+            # bytecode left by local test runs would change the asset hash
+            exclude=['__pycache__']
+        )
+        
+        streaming_views_function = lambda_.CfnFunction(self, f'RedshiftStreamingViewsFunction-{environment}',
+            function_name=f'redshift-streaming-views-{environment}',
+            runtime='python3.9',
+            handler='index.handler',
+            timeout=900,
+            memory_size=128,
+            role=streaming_views_role.attr_arn,
+            code=lambda_.CfnFunction.CodeProperty(
+                s3_bucket=streaming_views_code.s3_bucket_name,
+                s3_key=streaming_views_code.s3_object_key
+            )
+        )
+        
+        CustomResource(self, f'RedshiftStreamingIngestion-{environment}',
+            service_token=streaming_views_function.attr_arn,
+            resource_type='Custom::RedshiftStreamingIngestion',
+            properties={
+                'ClusterIdentifier': redsfhit_cluster.ref,
+                'Database': streaming_conf['database'],
+                'SecretArn': redshift_conf.secret_name,
+                'ViewSchema': streaming_conf['view_schema'],
+                'SchemaStatements': [
+                    f"CREATE EXTERNAL SCHEMA IF NOT EXISTS {streaming_conf['external_schema']} FROM MSK "
+                    f"IAM_ROLE '{streaming_role.attr_arn}' AUTHENTICATION iam CLUSTER_ARN '{msk.cluster.ref}'",
+                    f"CREATE SCHEMA IF NOT EXISTS {streaming_conf['view_schema']}"
+                ],
+                'Views': [
+                    {
+                        'Name': streaming_view_name(topic),
+                        'Topic': topic,
+                        'Sql': streaming_view_sql(streaming_conf['view_schema'], streaming_conf['external_schema'], topic)
+                    }
+                    for topic in streaming_conf['topics']
+                ]
+            }
+        )
+        
@@ -0,0 +1,224 @@
+import importlib
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from configs.model import ENVIRONMENTS, EnvironmentConfig, load_config
+from tools.profiling import SynthProfiler
+
+'''
+Stack registry used by app.py.
+Each entry maps a short stack key to the module and class building it, so app.py
+only imports and instantiates the stacks selected through the `stacks` context
+(plus their dependencies) instead of every stack in cdks/. build_stacks is the one
+place stacks are instantiated, app.py, the snapshot tests and the synth benchmark
+all go through it.
+
+    synth one stack: cdk synth --context environment=staging --context stacks=msk cdk-msk-staging
+'''
+
+@dataclass(frozen=True)
+class StackSpec:
+    module: str
+    class_name: str
+    stack_id: str
+    tag_name: str
+    depends_on: Tuple[str, ...] = ()
+    # dependencies (also listed in depends_on) passed to the stack constructor,
+    # as keyword arguments named after the key ('-' -> '_')
+    references: Tuple[str, ...] = ()
+    # whether depends_on / references apply in an environment, given its config; None always applies them
+    dependencies_when: Optional[Callable[[EnvironmentConfig], bool]] = None
+    # files read while building the stack, besides its own module (hashed by the synth cache)
+    inputs: Tuple[str, ...] = ()
+
+    def load(self):
+        return getattr(importlib.import_module(self.module), self.class_name)
+
+    def depends_on_for(self, environment: str) -> Tuple[str, ...]:
+        if self.dependencies_when and not self.dependencies_when(load_config(environment)):
+            return ()
+        return self.depends_on
+
+    def references_for(self, environment: str) -> Tuple[str, ...]:
+        if self.dependencies_when and not self.dependencies_when(load_config(environment)):
+            return ()
+        return self.references
+
+    def stack_id_for(self, environment: str) -> str:
+        return self.stack_id.format(env=environment)
+
+    def tag_name_for(self, environment: str) -> str:
+        return self.tag_name.format(env=environment)
+
+
+STACK_REGISTRY: Dict[str, StackSpec] = {
+    'msk': StackSpec(
+        module='cdks.msk_stack',
+        class_name='CdkMSKStack',
+        stack_id='cdk-msk-{env}',
+        tag_name='cdk-msk-{env}',
+        inputs=('configs/msk_config.py', 'configs/general_config.py', 'tools/msk_sizing.py', 'lambdas/kafka_topics/index.py')
+    ),
+    'msk-monitoring': StackSpec(
+        module='cdks.msk_monitoring_stack',
+        class_name='CdkMSKMonitoringStack',
+        stack_id='cdk-msk-monitoring-{env}',
+        tag_name='cdk-msk-monitoring-{env}',
+        depends_on=('msk',),
+        references=('msk',),
+        inputs=('configs/msk_monitoring_config.py', 'configs/msk_config.py', 'configs/general_config.py', 'cdks/msk_stack.py', 'tools/msk_sizing.py', 'lambdas/kafka_topics/index.py')
+    ),
+    'redshift': StackSpec(
+        module='cdks.redshift_stack',
+        class_name='CdkRedshiftStack',
+        stack_id='cdk-etl-redshift-{env}',
+        tag_name='cdk-redshift-{env}',
+        depends_on=('msk',),
+        references=('msk',),
+        # the MSK cluster is only read by streaming ingestion
+        dependencies_when=lambda conf: conf.redshift.streaming_ingestion is not None,
+        inputs=('configs/redshift_config.py', 'configs/general_config.py', 'configs/msk_config.py', 'cdks/msk_stack.py', 'tools/msk_sizing.py', 'lambdas/kafka_topics/index.py', 'lambdas/redshift_streaming/index.py')
+    ),
+    'eventbridge': StackSpec(
+        module='cdks.eventbridge_stack',
+        class_name='CdkEventBridgeStack',
+        stack_id='cdk-etl-eventbridge-{env}',
+        tag_name='cdk-eventbridge-{env}',
+        inputs=('configs/eventbridge_config.py',)
+    ),
+    'alb': StackSpec(
+        module='cdks.alb_stack',
+        class_name='CdkALBStack',
+        stack_id='cdk-etl-alb-{env}',
+        tag_name='cdk-alb-{env}',
+        inputs=('configs/general_config.py',)
+    ),
+    'kafka-ui': StackSpec(
+        module='cdks.kafka_ui_stack',
+        class_name='CdkKafkaUIStack',
+        stack_id='cdk-kafka-ui-{env}',
+        tag_name='cdk-kafka-ui-{env}',
+        depends_on=('alb',),
+        references=('alb',),
+        inputs=('configs/kafka_ui_config.py', 'configs/ec2_service_config.py', 'configs/general_config.py', 'cdks/ec2_service.py', 'cdks/user_data.py', 'cdks/alb_stack.py', 'user_data/service_user_data.sh')
+    ),
+    'schema-registry': StackSpec(
+        module='cdks.schema_registry_stack',
+        class_name='CdkSchemaRegistryStack',
+        stack_id='cdk-schema-registry-{env}',
+        tag_name='cdk-schema-registry-{env}',
+        depends_on=('alb',),
+        references=('alb',),
+        inputs=('configs/schema_registry_config.py', 'configs/ec2_service_config.py', 'configs/general_config.py', 'cdks/ec2_service.py', 'cdks/user_data.py', 'cdks/alb_stack.py', 'user_data/service_user_data.sh')
+    ),
+    'redash': StackSpec(
+        module='cdks.redash_stack',
+        class_name='CdkRedashStack',
+        stack_id='cdk-redash-{env}',
+        tag_name='cdk-redash-{env}',
+        depends_on=('alb',),
+        references=('alb',),
+        inputs=('configs/redash_config.py', 'configs/ec2_service_config.py', 'configs/general_config.py', 'cdks/ec2_service.py', 'cdks/user_data.py', 'cdks/alb_stack.py', 'user_data/service_user_data.sh', 'user_data/redash_queue_depth.sh')
+    ),
+}
+
+# stacks built when no `stacks` context is given
+DEFAULT_STACKS = ('msk', 'msk-monitoring', 'redshift', 'eventbridge')
+
+
+def parse_selection(value, environment: str) -> List[str]:
+    """
+    Turn the `stacks` context value into registry keys.
+    Accepts registry keys or full stack ids, comma separated or as a list, and `all`.
+    """
+    if value is None:
+        return list(DEFAULT_STACKS)
+
+    names = value.split(',') if isinstance(value, str) else list(value)
+    names = [name.strip() for name in names if name.strip()]
+
+    if names == ['all']:
+        return list(STACK_REGISTRY)
+
+    stack_ids = {spec.stack_id_for(environment): key for key, spec in STACK_REGISTRY.items()}
+
+    selected = []
+    for name in names:
+        key = name if name in STACK_REGISTRY else stack_ids.get(name)
+        if key is None:
+            raise RuntimeError(f'The stack value {name} does not match any registered stack.')
+        selected.append(key)
+
+    return selected
+
+
+def resolve(selected: Iterable[str], environment: str) -> List[str]:
+    """
+    Expand the selected keys with their dependencies in environment, dependencies first,
+    keeping the registry order otherwise.
+    """
+    ordered: List[str] = []
+
+    def visit(key: str, path: Optional[Tuple[str, ...]] = ()):
+        if key in ordered:
+            return
+        if key in path:
+            raise RuntimeError(f'Circular stack dependency: {" -> ".join(path + (key,))}')
+        for dep in STACK_REGISTRY[key].depends_on_for(environment):
+            visit(dep, path + (key,))
+        ordered.append(key)
+
+    wanted = set(selected)
+    for key in STACK_REGISTRY:
+        if key in wanted:
+            visit(key)
+
+    return ordered
+
+
+def tagging_func(stack, name, env):
+    import aws_cdk as cdk
+
+    cdk.Tags.of(stack).add('Name', name)
+    cdk.Tags.of(stack).add('Cost', 'cost')
+    cdk.Tags.of(stack).add('Environment', env)
+
+
+def build_stacks(app, environment: str, stack_keys: Iterable[str], stacks: Optional[dict] = None,
+                 profiler: Optional[SynthProfiler] = None) -> dict:
+    """
+    Instantiate and tag the stacks of stack_keys (dependencies first, see resolve) in app.
+    stacks holds the stacks already built, where dependencies and references are looked up,
+    the returned dict adds the new ones to it.
+    """
+    import aws_cdk as cdk
+
+    profiler = profiler or SynthProfiler(enabled=False)
+    bootstrap_bucket = load_config(environment).general.bootstrap_bucket
+    stacks = dict(stacks or {})
+
+    for stack_key in stack_keys:
+        stack_spec = STACK_REGISTRY[stack_key]
+        stack_id = stack_spec.stack_id_for(environment)
+
+        with profiler.phase(stack_id, 'import'):
+            stack_class = stack_spec.load()
+
+        with profiler.phase(stack_id, 'construct'):
+            stack = stack_class(
+                app,
+                stack_id,
+                environment=environment,
+                **{reference.replace('-', '_'): stacks[reference] for reference in stack_spec.references_for(environment)},
+                synthesizer=cdk.DefaultStackSynthesizer(
+                    file_assets_bucket_name=bootstrap_bucket
+                )
+            )
+            for dependency in stack_spec.depends_on_for(environment):
+                stack.add_dependency(stacks[dependency])
+
+        with profiler.phase(stack_id, 'tagging'):
+            tagging_func(stack, name=stack_spec.tag_name_for(environment), env=environment)
+        stacks[stack_key] = stack
+
+    return stacks
@@ -0,0 +1,121 @@
+import base64
+import gzip
+from typing import List, Sequence
+
+from aws_cdk import (
+    Fn,
+    Stack,
+    aws_iam as iam,
+    aws_s3_assets as s3_assets
+)
+from constructs import Construct
+
+from configs.model import USER_DATA_DELIVERY_MODES
+
+'''
+user_data of the EC2 services: a prelude of shell lines (these may hold tokens, e.g.
+endpoints of resources in the same stack) followed by shell scripts from user_data/.
+The scripts are only read when the user_data is rendered, i.e. when the stack is built.
+
+delivery
+    inline    the prelude and the scripts as one script (16 KB EC2 limit)
+    gzip      MIME multipart: the prelude as a text/x-shellscript part and the scripts
+              gzip compressed in an application/x-gzip part, cloud-init decompresses it
+    s3_asset  the scripts are uploaded as S3 assets, the user_data only holds the prelude
+              and downloads and runs them at boot (needs the aws cli on the AMI)
+'''
+
+MIME_BOUNDARY = '==USERDATA=='
+
+
+def _read_scripts(script_paths: Sequence[str]) -> List[str]:
+    scripts = []
+    for index, path in enumerate(script_paths):
+        with open(path) as f:
+            script = f.read()
+        # only the first script keeps its shebang
+        if index and script.startswith('#!'):
+            script = script.partition('\n')[2]
+        scripts.append(script.rstrip('\n') + '\n')
+    return scripts
+
+
+class ServiceUserData:
+
+    def __init__(self, script_paths: Sequence[str], prelude: Sequence[str] = ()) -> None:
+        self.script_paths = list(script_paths)
+        self.prelude = list(prelude)
+
+    def render(self, scope: Construct, id: str, delivery: str, role: iam.CfnRole) -> str:
+        """
+        The base64 user_data for an instance or launch template. role is the instance role,
+        it is granted read access to the S3 assets.
+        """
+        if delivery not in USER_DATA_DELIVERY_MODES:
+            raise RuntimeError('The user_data_delivery value does not match allowed values.')
+
+        if delivery == 's3_asset':
+            return Fn.base64(self._s3_asset_script(scope, id, role))
+
+        scripts = _read_scripts(self.script_paths)
+        shebang, _, first_script = scripts[0].partition('\n')
+
+        if delivery == 'inline':
+            return Fn.base64('\n'.join([shebang] + self.prelude + [first_script + ''.join(scripts[1:])]))
+
+        compressed = base64.b64encode(gzip.compress(''.join(scripts).encode(), mtime=0)).decode()
+        parts = [
+            f'Content-Type: multipart/mixed; boundary="{MIME_BOUNDARY}"',
+            'MIME-Version: 1.0',
+            ''
+        ]
+        if self.prelude:
+            parts += [
+                f'--{MIME_BOUNDARY}',
+                'Content-Type: text/x-shellscript; charset="us-ascii"',
+                '',
+                shebang
+            ] + self.prelude
+        parts += [
+            f'--{MIME_BOUNDARY}',
+            'Content-Type: application/x-gzip',
+            'Content-Transfer-Encoding: base64',
+            '',
+            compressed,
+            f'--{MIME_BOUNDARY}--',
+            ''
+        ]
+        return Fn.base64('\n'.join(parts))
+
+    def _s3_asset_script(self, scope: Construct, id: str, role: iam.CfnRole) -> str:
+        lines = ['#!/bin/bash', 'set -e'] + self.prelude
+        object_arns = []
+        for index, path in enumerate(self.script_paths):
+            asset = s3_assets.Asset(scope, f'{id}Script{index}', path=path)
+            local_path = f'/var/lib/cloud/user-data-{index}.sh'
+            lines += [
+                f'aws s3 cp --region {Stack.of(scope).region} {asset.s3_object_url} {local_path}',
+                f'bash {local_path}'
+            ]
+            object_arns.append(f'arn:{Stack.of(scope).partition}:s3:::{asset.s3_bucket_name}/{asset.s3_object_key}')
+
+        # the role is an L1 CfnRole, so the read access is added as one more inline policy
+        role.policies = list(role.policies or []) + [
+            iam.CfnRole.PolicyProperty(
+                policy_name=f'{id}UserDataAssets',
+                policy_document={
+                    'Version': '2012-10-17',
+                    'Statement': [
+                        {
+                            'Effect': 'Allow',
+                            'Action': [
+                                's3:GetObject'
+                            ],
+                            'Resource': object_arns
+                        }
+                    ]
+                }
+            )
+        ]
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,59 @@
+from configs.general_config import GeneralConfig
+
+# defaults of the services built with cdks.ec2_service.Ec2Service,
+# the service config classes subclass it and override what they tune
+class Ec2ServiceConfig:
+    user_data_shell_path = 'user_data/service_user_data.sh'
+
+    # 'inline', 'gzip' (MIME multipart, cloud-init decompresses it) or 's3_asset'
+    # (scripts uploaded as S3 assets and downloaded at boot), see cdks.user_data
+    user_data_delivery = 'gzip'
+
+    instance_type = 't3.small'
+    
+    # gp3 root volume, throughput in MiB/s (125 to 1000) and iops (3000 to 16000)
+    root_volume = {
+        'device_name': '/dev/sda1',
+        'size': 10,
+        'throughput': 125,
+        'iops': 3000
+    }
+    
+    service_port = 80
+    
+    # target tracking on 'cpu' (average CPU percent) or 'request_count' (ALB requests per target)
+    scaling_metric = 'cpu'
+    scaling_target = {
+        'cpu': 60,
+        'request_count': 1000
+    }
+    
+    # seconds for a new instance to start the service before its health checks count
+    health_check_grace_period = 300
+    
+    # round_robin or least_outstanding_requests, the latter can not be combined with slow start
+    target_group_lb = GeneralConfig.target_group_defaults['algorithm']
+    
+    # seconds the target group keeps in-flight requests going to a deregistering target
+    deregistration_delay_seconds = GeneralConfig.target_group_defaults['deregistration_delay_seconds']
+    
+    # seconds a new target ramps up its share of requests, 0 disables slow start
+    slow_start_seconds = GeneralConfig.target_group_defaults['slow_start_seconds']
+    
+    # None or {'type': 'lb_cookie', 'duration_seconds': ...}
+    stickiness = None
+    
+    health_check = {
+        'path': '/',
+        'interval_seconds': 30,
+        'timeout_seconds': 5,
+        'healthy_threshold_count': 5,
+        'unhealthy_threshold_count': 2,
+        'matcher': '200'
+    }
+    
+    # listener of the etl ALB (CdkALBStack.listeners) the host-header rule is added to
+    listener = 'default'
+    
+    private_zone_id = 'Zxxxxx'
+    
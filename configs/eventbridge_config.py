@@ -0,0 +1,15 @@
+class EventBridgeConfig:
+    # up to batch_size events, or what arrived within batching_window_seconds, per invocation
+    batch_size = 100
+    batching_window_seconds = 60
+    
+    # concurrent alert Lambda invocations the event source mapping makes (ScalingConfig,
+    # 2 to 1000), None leaves it to the SQS pollers. Capped on the mapping rather than with
+    # reserved concurrency, which throttles the pollers and sends alerts to the dead-letter queue.
+    maximum_concurrency = 2
+    
+    # keep at least 6x the Lambda timeout plus the batching window
+    visibility_timeout_seconds = 420
+    max_receive_count = 3
+    dead_letter_retention_days = 14
+    
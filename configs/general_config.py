@@ -11,3 +11,19 @@ class GeneralConfig:
         'subnet-xxxxx'
     ]
     
+    # etl ALB load balancer attributes
+    alb = {
+        # raised above the 60s default, redash API calls can wait on long running queries
+        'idle_timeout_seconds': 120,
+        'http2_enabled': True,
+        'desync_mitigation_mode': 'defensive',
+        'drop_invalid_header_fields': True
+    }
+    
+    # defaults of the target groups created by the service stacks (see configs/ec2_service_config.py)
+    target_group_defaults = {
+        'algorithm': 'least_outstanding_requests',
+        'deregistration_delay_seconds': 30,
+        'slow_start_seconds': 0
+    }
+    
@@ -0,0 +1,5 @@
+from configs.ec2_service_config import Ec2ServiceConfig
+
+class KafkaUIConfig(Ec2ServiceConfig):
+    service_port = 8080
+    
@@ -0,0 +1,439 @@
+import functools
+import json
+import os
+import typing
+from dataclasses import dataclass, field, fields
+from typing import Any, List, Optional
+
+from configs.eventbridge_config import EventBridgeConfig
+from configs.general_config import GeneralConfig
+from configs.kafka_ui_config import KafkaUIConfig
+from configs.msk_config import MSKConfig
+from configs.msk_monitoring_config import MSKMonitoringConfig
+from configs.redash_config import RedashConfig
+from configs.redshift_config import RedshiftConfig
+from configs.schema_registry_config import SchemaRegistryConfig
+
+'''
+Typed config model of one environment.
+Values shared by every environment live in the config classes of configs/, the values
+that differ per environment (the per_environment() fields below) in one JSON file per
+environment, configs/environments/<environment>.json, keyed by section and field name.
+load_config() reads the environment file once, resolves both into frozen dataclasses,
+checks the types and the rules across values, and reports every error at once, before
+app.py creates any construct. The result is memoized, every stack of a synth shares
+the same EnvironmentConfig.
+
+    conf = load_config('staging')
+    conf.msk.instance_type  # configs/environments/staging.json msk.instance_type
+    conf.msk.topics         # MSKConfig.topics
+'''
+
+ENVIRONMENTS = ['develop', 'staging', 'production']
+
+ENVIRONMENTS_DIR = os.path.join(os.path.dirname(__file__), 'environments')
+
+USER_DATA_DELIVERY_MODES = ['inline', 'gzip', 's3_asset']
+
+# MSK enhanced monitoring levels, each one publishes the metrics of the previous ones
+MSK_METRICS_LEVELS = ['DEFAULT', 'PER_BROKER', 'PER_TOPIC_PER_BROKER', 'PER_TOPIC_PER_PARTITION']
+
+
+def per_environment():
+    # read from the section of configs/environments/<environment>.json instead of the config class
+    return field(metadata={'per_environment': True})
+
+
+def environment_path(environment: str) -> str:
+    return os.path.join(ENVIRONMENTS_DIR, f'{environment}.json')
+
+
+def load_environment_values(environment: str) -> dict:
+    """
+    {section: {field: value}} of configs/environments/<environment>.json.
+    """
+    if environment not in ENVIRONMENTS:
+        raise RuntimeError('The environment value does not match allowed values.')
+    with open(environment_path(environment)) as f:
+        return json.load(f)
+
+
+def _matches(value: Any, annotation: Any) -> bool:
+    origin = typing.get_origin(annotation)
+    if annotation is Any:
+        return True
+    if origin is typing.Union:
+        return any(_matches(value, arg) for arg in typing.get_args(annotation))
+    if origin is list:
+        item, = typing.get_args(annotation)
+        return isinstance(value, list) and all(_matches(entry, item) for entry in value)
+    if annotation is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    if annotation is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if annotation is type(None):
+        return value is None
+    return isinstance(value, origin or annotation)
+
+
+def _type_name(annotation: Any) -> str:
+    return getattr(annotation, '__name__', None) or str(annotation).replace('typing.', '')
+
+
+@dataclass(frozen=True, slots=True)
+class GeneralSettings:
+    bootstrap_bucket: str
+    ec2_key_name: str
+    vpc_id: str
+    security_group: List[str]
+    subnet_ids: List[str]
+    alb: dict
+    # ALB access logs, None disables them. The bucket needs the ELB log delivery policy.
+    alb_access_logs: Optional[dict] = per_environment()
+    target_group_defaults: dict
+
+    def validate(self) -> List[str]:
+        errors = []
+        if self.alb['desync_mitigation_mode'] not in ['monitor', 'defensive', 'strictest']:
+            errors.append('The alb desync_mitigation_mode value does not match allowed values.')
+        if len(self.subnet_ids) < 2:
+            errors.append('The etl ALB needs subnet_ids in at least two availability zones.')
+        return errors
+
+
+@dataclass(frozen=True, slots=True)
+class MSKSettings:
+    instance_type: str = per_environment()
+    broker_volume_size: int = per_environment()
+    number_of_broker: int = per_environment()
+    metrics_level: str
+    # Prometheus open monitoring of the brokers, None disables it. The exporters listen on
+    # 11001 (JMX) and 11002 (node) of every broker, the security group has to let the scraper in.
+    open_monitoring: Optional[dict] = per_environment()
+    # SASL/IAM client authentication (port 9098) next to the unauthenticated TLS listener existing
+    # clients use. The topic provisioning Lambda and Redshift streaming ingestion connect through it.
+    iam_authentication: bool = per_environment()
+    # tiered storage needs a tiered kafka version
+    kafka_version: str = per_environment()
+    # LOCAL keeps every log segment on the broker EBS volume,
+    # TIERED moves closed segments to MSK tiered storage (not available on kafka.t3 brokers)
+    storage_mode: str = per_environment()
+    tiered_storage_kafka_versions: List[str]
+    # Application Auto Scaling of the broker EBS volume, None disables it.
+    # broker_volume_size is the starting size, the volume grows up to max_volume_size GiB (16384 at most)
+    # whenever broker storage utilization goes over target_utilization percent. MSK never scales storage in.
+    storage_autoscaling: Optional[dict] = per_environment()
+    # EBS provisioned storage throughput in MiB/s per broker, None keeps the volume baseline.
+    # MSK only supports it on provisioned_throughput_instance_types.
+    provisioned_throughput: Optional[int] = per_environment()
+    provisioned_throughput_instance_types: List[str]
+    # broker server.properties rendered into the cluster's AWS::MSK::Configuration
+    broker_configuration: dict = per_environment()
+    topics: List[dict]
+    # share of the catalog write_mb_per_second each environment takes
+    topic_load_factor: float = per_environment()
+    partition_write_mb_per_second: float
+    broker_utilization_target: float
+    tiered_local_retention_hours: int
+    # Lambda layer with kafka-python and aws-msk-iam-sasl-signer-python for the topic provisioning custom resource
+    kafka_admin_layer_arn: str = per_environment()
+
+    def validate(self) -> List[str]:
+        errors = []
+        topic_names = [topic['name'] for topic in self.topics]
+        if len(set(topic_names)) != len(topic_names):
+            errors.append('The msk topics names have to be unique.')
+        if self.metrics_level not in MSK_METRICS_LEVELS:
+            errors.append('The msk metrics_level value does not match allowed values.')
+        if self.provisioned_throughput and self.instance_type not in self.provisioned_throughput_instance_types:
+            errors.append(f'MSK provisioned throughput is not supported on {self.instance_type}.')
+        if self.storage_mode not in ['LOCAL', 'TIERED']:
+            errors.append('The msk storage_mode value does not match allowed values.')
+        if self.storage_mode == 'TIERED':
+            if self.kafka_version not in self.tiered_storage_kafka_versions:
+                errors.append(f'MSK tiered storage is not supported on kafka {self.kafka_version}.')
+            if self.instance_type.startswith('kafka.t3.'):
+                errors.append(f'MSK tiered storage is not supported on {self.instance_type}.')
+        if self.storage_autoscaling and self.storage_autoscaling['max_volume_size'] <= self.broker_volume_size:
+            errors.append('MSK storage autoscaling max_volume_size must be larger than broker_volume_size.')
+        return errors
+
+
+@dataclass(frozen=True, slots=True)
+class MSKMonitoringSettings:
+    # email subscriptions of the msk-alarms-<env> SNS topic every alarm notifies
+    alarm_emails: List[str] = per_environment()
+    period_seconds: int
+    evaluation_periods: int = per_environment()
+    # The broker BytesInPerSec alarm has no threshold here, it is derived from the broker
+    # instance limits at MSKSettings.broker_utilization_target (tools/msk_sizing.py).
+    # disk_used_percent has to stay above the storage autoscaling target_utilization.
+    thresholds: dict = per_environment()
+    consumer_groups: dict
+
+    def validate(self) -> List[str]:
+        errors = []
+        for name in ['cpu_percent', 'disk_used_percent']:
+            if not 0 < self.thresholds[name] <= 100:
+                errors.append(f'The msk_monitoring {name} threshold has to be a percentage.')
+        if self.period_seconds % 60 and self.period_seconds not in [10, 30]:
+            errors.append('The msk_monitoring period_seconds has to be 10, 30 or a multiple of 60.')
+        return errors
+
+
+@dataclass(frozen=True, slots=True)
+class RedshiftSettings:
+    secret_name: str
+    # single-node clusters have exactly one node and cannot be elastic resized
+    cluster_type: str = per_environment()
+    node_type: str
+    # nodes outside the scheduled ETL window, see scheduled_actions
+    number_of_nodes: int = per_environment()
+    # AWS::Redshift::ScheduledAction, schedules are in UTC.
+    # action is resize (elastic resize to number_of_nodes), pause or resume.
+    scheduled_actions: List[dict] = per_environment()
+    parameter_group_family: str
+    # manual WLM queues in wlm_json_configuration format, the last queue is the default queue.
+    # memory_percent_to_use of all queues must not exceed 100 and query_concurrency must not exceed 50.
+    wlm_queues: List[dict] = per_environment()
+    # concurrency scaling clusters that queues with concurrency_scaling 'auto' may burst to
+    max_concurrency_scaling_clusters: int = per_environment()
+    short_query_acceleration: bool = per_environment()
+    enable_result_cache: bool
+    # Redshift streaming ingestion from the MSK cluster, None disables it. external_schema maps
+    # the cluster (IAM authentication), every MSKConfig.topics entry listed in topics gets an
+    # auto refresh materialized view in view_schema, named after the topic ('.' and '-' -> '_'),
+    # with the JSON message value parsed into a SUPER payload column. The views are created
+    # through the Redshift Data API in database, never dropped by the stack.
+    streaming_ingestion: Optional[dict] = per_environment()
+
+    def validate(self) -> List[str]:
+        errors = []
+        if sum(queue['memory_percent_to_use'] for queue in self.wlm_queues) > 100:
+            errors.append('Redshift WLM queues use more than 100 percent of memory.')
+        if sum(queue['query_concurrency'] for queue in self.wlm_queues) > 50:
+            errors.append('Redshift WLM queues use more than 50 query slots.')
+        if self.cluster_type not in ['single-node', 'multi-node']:
+            errors.append('The redshift cluster_type value does not match allowed values.')
+        if self.cluster_type == 'single-node' and self.number_of_nodes != 1:
+            errors.append('A single-node Redshift cluster has exactly 1 node.')
+        if self.cluster_type == 'multi-node' and self.number_of_nodes < 2:
+            errors.append('A multi-node Redshift cluster needs at least 2 nodes.')
+        for scheduled_action in self.scheduled_actions:
+            if scheduled_action['action'] not in ['resize', 'pause', 'resume']:
+                errors.append(f'Redshift scheduled action {scheduled_action["action"]} does not match allowed values.')
+            if scheduled_action['action'] == 'resize' and self.cluster_type == 'single-node':
+                errors.append(f'Redshift scheduled action {scheduled_action["name"]} resizes a single-node cluster.')
+        if self.streaming_ingestion:
+            if not self.streaming_ingestion['topics']:
+                errors.append('Redshift streaming_ingestion needs at least one topic.')
+            if self.streaming_ingestion['external_schema'] == self.streaming_ingestion['view_schema']:
+                errors.append('Redshift streaming_ingestion view_schema has to differ from external_schema.')
+        return errors
+
+
+@dataclass(frozen=True, slots=True)
+class EventBridgeSettings:
+    # buffered mode targets an SQS queue instead of the alert Lambda, and the Lambda
+    # consumes the queue in batches through an event source mapping
+    buffered: bool = per_environment()
+    batch_size: int
+    batching_window_seconds: int
+    maximum_concurrency: Optional[int]
+    visibility_timeout_seconds: int
+    max_receive_count: int
+    dead_letter_retention_days: int
+    # execution role of lambda_redshift_slack_alert_<env>, granted to consume the queue
+    lambda_role_name: str = per_environment()
+
+    def validate(self) -> List[str]:
+        errors = []
+        if self.buffered and self.batching_window_seconds > self.visibility_timeout_seconds:
+            errors.append('The eventbridge visibility_timeout_seconds must cover batching_window_seconds.')
+        if self.maximum_concurrency is not None and not 2 <= self.maximum_concurrency <= 1000:
+            errors.append('The eventbridge maximum_concurrency has to be between 2 and 1000.')
+        return errors
+
+
+@dataclass(frozen=True, slots=True)
+class ServiceSettings:
+    user_data_shell_path: str
+    user_data_delivery: str
+    instance_type: str
+    ami: str = per_environment()
+    root_volume: dict
+    service_port: int
+    # 'instance' runs a single EC2 instance, 'autoscaling' runs an Auto Scaling group
+    # spread over every GeneralConfig.subnet_ids subnet behind the target group
+    deployment_mode: str = per_environment()
+    # min_capacity / max_capacity / desired_capacity in 'autoscaling' mode
+    autoscaling: Optional[dict] = per_environment()
+    scaling_metric: str
+    scaling_target: dict
+    health_check_grace_period: int
+    target_group_lb: str
+    deregistration_delay_seconds: int
+    slow_start_seconds: int
+    stickiness: Optional[dict]
+    health_check: dict
+    listener: str
+    private_zone_id: str
+
+    def validate(self) -> List[str]:
+        errors = []
+        if self.deployment_mode not in ['instance', 'autoscaling']:
+            errors.append('The deployment_mode value does not match allowed values.')
+        if self.deployment_mode == 'autoscaling' and not self.autoscaling:
+            errors.append('The autoscaling deployment_mode needs autoscaling capacity.')
+        if self.scaling_metric not in ['cpu', 'request_count']:
+            errors.append('The scaling_metric value does not match allowed values.')
+        if self.target_group_lb not in ['round_robin', 'least_outstanding_requests']:
+            errors.append('The target_group_lb value does not match allowed values.')
+        if self.target_group_lb == 'least_outstanding_requests' and self.slow_start_seconds:
+            errors.append('The target group can not combine slow start with least_outstanding_requests.')
+        if self.user_data_delivery not in USER_DATA_DELIVERY_MODES:
+            errors.append('The user_data_delivery value does not match allowed values.')
+        return errors
+
+
+@dataclass(frozen=True, slots=True)
+class RedashSettings(ServiceSettings):
+    queue_depth_user_data_shell_path: str
+    secret_name: str
+    # Redis used by Redash for its query queues and query result cache.
+    # replication_group False keeps a single node CfnCacheCluster. With True a CfnReplicationGroup
+    # is built with replicas_per_node_group read replicas and automatic failover; cluster_mode shards
+    # the keyspace into num_node_groups shards (the Redash RQ queues need cluster_mode False).
+    # data_tiering needs an r6gd node_type and moves cold keys from memory to the node's SSD.
+    redis: dict = per_environment()
+    redis_parameter_group_family: str
+    redis_parameters: dict
+    redash_env_file: str
+    postgres_db: dict
+    # iops / storage_throughput have to fit in the instance class EBS bandwidth
+    postgres_instance_type: str = per_environment()
+    # gp3 baseline is 3000 IOPS / 125 MiB/s below 400 GiB and 12000 IOPS / 500 MiB/s from 400 GiB,
+    # iops and storage_throughput (MiB/s) can only be raised above the baseline from 400 GiB.
+    # None keeps the baseline.
+    postgres_storage: dict = per_environment()
+    postgres_multi_az: bool = per_environment()
+    # read replica of the metadata db for reporting queries on Redash's own tables, None disables it
+    postgres_read_replica: Optional[dict] = per_environment()
+    # Performance Insights retention in days (7 is the free tier), None disables it
+    postgres_performance_insights_retention: Optional[int] = per_environment()
+    worker_instance_type: str
+    worker_autoscaling: dict = per_environment()
+    worker_queues: List[str]
+    queue_backlog_metric: dict
+    worker_scaling_target_backlog: int
+
+    def validate(self) -> List[str]:
+        errors = ServiceSettings.validate(self)
+        if self.redis['replication_group'] and self.redis['data_tiering'] and not self.redis['node_type'].startswith('cache.r6gd.'):
+            errors.append(f"ElastiCache data tiering is not supported on {self.redis['node_type']}.")
+        if self.postgres_storage['storage_type'] not in ['gp2', 'gp3', 'io1']:
+            errors.append('The redash postgres storage_type value does not match allowed values.')
+        if (self.postgres_storage['iops'] or self.postgres_storage['storage_throughput']) and int(self.postgres_storage['allocated_storage']) < 400:
+            errors.append('Redash postgres gp3 iops and storage_throughput need allocated_storage of 400 GiB or more.')
+        return errors
+
+
+@dataclass(frozen=True, slots=True)
+class EnvironmentConfig:
+    environment: str
+    general: GeneralSettings
+    msk: MSKSettings
+    msk_monitoring: MSKMonitoringSettings
+    redshift: RedshiftSettings
+    eventbridge: EventBridgeSettings
+    kafka_ui: ServiceSettings
+    schema_registry: ServiceSettings
+    redash: RedashSettings
+
+
+# EnvironmentConfig field -> (settings class, config class)
+SECTIONS = {
+    'general': (GeneralSettings, GeneralConfig),
+    'msk': (MSKSettings, MSKConfig),
+    'msk_monitoring': (MSKMonitoringSettings, MSKMonitoringConfig),
+    'redshift': (RedshiftSettings, RedshiftConfig),
+    'eventbridge': (EventBridgeSettings, EventBridgeConfig),
+    'kafka_ui': (ServiceSettings, KafkaUIConfig),
+    'schema_registry': (ServiceSettings, SchemaRegistryConfig),
+    'redash': (RedashSettings, RedashConfig),
+}
+
+
+def _resolve(settings_class, config, environment_values: dict, section: str):
+    """
+    (settings, errors) of one config class and its environment values, settings is None
+    when a value is missing or mistyped.
+    """
+    values = {}
+    errors = []
+    hints = typing.get_type_hints(settings_class)
+
+    for settings_field in fields(settings_class):
+        name = settings_field.name
+        if settings_field.metadata.get('per_environment'):
+            if hasattr(config, name):
+                errors.append(f'{section}.{name} is set per environment, not in {config.__name__}.')
+                continue
+            if name not in environment_values and not _matches(None, hints[name]):
+                errors.append(f'{section}.{name} has no environment value.')
+                continue
+            value = environment_values.get(name)
+        elif not hasattr(config, name):
+            errors.append(f'{section}.{name} is missing.')
+            continue
+        else:
+            value = getattr(config, name)
+
+        if not _matches(value, hints[name]):
+            errors.append(f'{section}.{name} has to be {_type_name(hints[name])}, got {type(value).__name__}.')
+            continue
+        values[name] = value
+
+    unknown = sorted(set(environment_values) - {
+        settings_field.name for settings_field in fields(settings_class) if settings_field.metadata.get('per_environment')
+    })
+    errors += [f'{section}.{name} is not a per environment value.' for name in unknown]
+
+    if errors:
+        return None, errors
+
+    settings = settings_class(**values)
+    return settings, [f'{section}: {error}' for error in settings.validate()]
+
+
+def build_settings(settings_class, config, environment: str, section: str = 'config',
+                   environment_values: Optional[dict] = None):
+    """
+    Resolve and validate one config class (e.g. a service config defined in a test) for one
+    environment. environment_values defaults to the section of the environment file.
+    """
+    if environment_values is None:
+        environment_values = load_environment_values(environment).get(section, {})
+    settings, errors = _resolve(settings_class, config, environment_values, section)
+    if errors:
+        raise RuntimeError(f'The {environment} {section} does not match the config model:\n    ' + '\n    '.join(errors))
+    return settings
+
+
+@functools.lru_cache(maxsize=None)
+def load_config(environment: str) -> EnvironmentConfig:
+    """
+    Resolve and validate every config class with the environment file, raising one RuntimeError with all errors.
+    """
+    environment_values = load_environment_values(environment)
+
+    sections = {}
+    errors = [f'{section} is not a config section.' for section in sorted(set(environment_values) - set(SECTIONS))]
+    for section, (settings_class, config) in SECTIONS.items():
+        sections[section], section_errors = _resolve(settings_class, config, environment_values.get(section, {}), section)
+        errors += section_errors
+
+    if errors:
+        raise RuntimeError(f'The {environment} config does not match the config model:\n    ' + '\n    '.join(errors))
+
+    return EnvironmentConfig(environment=environment, **sections)
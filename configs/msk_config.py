@@ -1,22 +1,55 @@
 class MSKConfig:
-    instance_type = {
-        'develop': 'kafka.t3.small',
-        'staging': 'kafka.m5.large',
-        'production': 'kafka.m5.xlarge'
-    }
+    metrics_level = 'PER_TOPIC_PER_BROKER'
     
-    broker_volume_size = {
-        'develop': 600,
-        'staging': 4000,
-        'production': 12000
-    }
+    tiered_storage_kafka_versions = [
+        '2.8.2.tiered',
+        '3.6.0',
+        '3.7.x',
+        '3.8.x'
+    ]
     
-    number_of_broker = {
-        'develop': 2,
-        'staging': 4,
-        'production': 4
-    }
+    provisioned_throughput_instance_types = [
+        'kafka.m5.4xlarge',
+        'kafka.m5.8xlarge',
+        'kafka.m5.12xlarge',
+        'kafka.m5.16xlarge',
+        'kafka.m5.24xlarge'
+    ]
     
-    metrics_level = 'PER_TOPIC_PER_BROKER'
-    kafka_version = '2.8.0'
+    # topic catalog provisioned on the cluster, partitions and replication are planned from
+    # the brokers by tools/msk_sizing.py. write_mb_per_second is the production peak,
+    # consumer_parallelism the consumers of the largest consumer group, consumer_groups the
+    # groups reading the topic, configs extra topic configs.
+    topics = [
+        {
+            'name': 'etl.bronze.events',
+            'write_mb_per_second': 20,
+            'retention_hours': 72,
+            'consumer_parallelism': 12,
+            'consumer_groups': 2
+        },
+        {
+            'name': 'etl.bronze.cdc',
+            'write_mb_per_second': 8,
+            'retention_hours': 168,
+            'consumer_parallelism': 6,
+            'consumer_groups': 1
+        },
+        {
+            'name': 'etl.bronze.dead-letter',
+            'write_mb_per_second': 0.5,
+            'retention_hours': 336,
+            'consumer_parallelism': 1,
+            'consumer_groups': 1
+        }
+    ]
+    
+    # MB/s one partition is planned for, a consumer has to keep up with a partition on its own
+    partition_write_mb_per_second = 5
+    
+    # share of the broker network / storage throughput and disk the topics may plan for
+    broker_utilization_target = 0.6
+    
+    # hours of a tiered storage topic kept on the broker disk, the rest is read from tiered storage
+    tiered_local_retention_hours = 12
     
@@ -0,0 +1,18 @@
+class MSKMonitoringConfig:
+    # alarm period, an alarm fires after evaluation_periods breaching periods in a row
+    period_seconds = 60
+    
+    # consumer groups reading the MSKConfig.topics entries, their lag is put on the dashboard and alarmed on
+    consumer_groups = {
+        'etl.bronze.events': [
+            'etl-bronze-loader',
+            'etl-bronze-audit'
+        ],
+        'etl.bronze.cdc': [
+            'etl-cdc-loader'
+        ],
+        'etl.bronze.dead-letter': [
+            'etl-dead-letter-replayer'
+        ]
+    }
+    
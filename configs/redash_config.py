@@ -0,0 +1,57 @@
+from configs.ec2_service_config import Ec2ServiceConfig
+
+class RedashConfig(Ec2ServiceConfig):
+    queue_depth_user_data_shell_path = 'user_data/redash_queue_depth.sh'
+    secret_name = 'my/redash'
+    
+    redis_parameter_group_family = 'redis6.x'
+    
+    # volatile-lru only evicts keys with a TTL (cached query results), never the queue keys
+    redis_parameters = {
+        'maxmemory-policy': 'volatile-lru',
+        'maxmemory-samples': '10',
+        'reserved-memory-percent': '25',
+        'timeout': '300',
+        'tcp-keepalive': '60'
+    }
+    
+    # user_data appends the Redis / Postgres endpoints to this Redash env file
+    redash_env_file = '/opt/redash/env'
+    
+    postgres_db = {
+        'backup_retention_period': 7,
+        'db_name': 'redash',
+        'engine': 'postgres',
+        'engine_version': '13.4'
+    }
+    
+    # the web tier serves the UI / API behind the ALB, the worker tier runs the queries
+    instance_type = 't3.medium'
+    worker_instance_type = 'm6i.large'
+    
+    # the web tier target-tracks average CPU percent
+    scaling_metric = 'cpu'
+    
+    # RQ queues counted into the backlog metric published by every worker, the queue depth
+    # divided by the InService instances of the worker Auto Scaling group
+    worker_queues = ['queries', 'scheduled_queries']
+    queue_backlog_metric = {
+        'namespace': 'Redash',
+        'metric_name': 'QueryBacklogPerWorker'
+    }
+    # queued queries per worker instance the worker tier target-tracks
+    worker_scaling_target_backlog = 5
+    
+    service_port = 5000
+    # let in-flight dashboard API calls finish during deploys
+    deregistration_delay_seconds = 60
+    
+    health_check = {
+        'path': '/ping',
+        'interval_seconds': 15,
+        'timeout_seconds': 5,
+        'healthy_threshold_count': 2,
+        'unhealthy_threshold_count': 3,
+        'matcher': '200'
+    }
+    
@@ -1,6 +1,9 @@
 class RedshiftConfig:
-    cluster_type = 'multi-node'
-    node_type = 'ra3.xlplus'
     secret_name = 'my/redshift'
-    number_of_nodes = 2
+    
+    node_type = 'ra3.xlplus'
+    
+    parameter_group_family = 'redshift-1.0'
+    
+    enable_result_cache = True
     
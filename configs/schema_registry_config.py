@@ -0,0 +1,30 @@
+from configs.ec2_service_config import Ec2ServiceConfig
+
+class SchemaRegistryConfig(Ec2ServiceConfig):
+    instance_type = 't3.small'
+    
+    service_port = 8081
+    listener = 'schema-registry'
+    # slow start is not supported with least_outstanding_requests
+    target_group_lb = 'round_robin'
+    # new instances read the whole schemas topic before serving from their cache
+    slow_start_seconds = 30
+    
+    scaling_metric = 'request_count'
+    scaling_target = {
+        'cpu': 60,
+        'request_count': 1000
+    }
+    
+    # seconds for a new instance to start the registry and read the schemas topic
+    health_check_grace_period = 180
+    
+    health_check = {
+        'path': '/',
+        'interval_seconds': 10,
+        'timeout_seconds': 5,
+        'healthy_threshold_count': 2,
+        'unhealthy_threshold_count': 3,
+        'matcher': '200'
+    }
+    
@@ -0,0 +1,99 @@
+import json
+import os
+import urllib.request
+
+import boto3
+from aws_msk_iam_sasl_signer import MSKAuthTokenProvider
+from kafka.admin import ConfigResource, ConfigResourceType, KafkaAdminClient, NewPartitions, NewTopic
+
+'''
+Custom::KafkaTopics handler of CdkMSKStack, runs in the cluster VPC with kafka-python and
+aws-msk-iam-sasl-signer-python from a layer. It connects with SASL/IAM (OAUTHBEARER) as its role
+when the cluster has IAM authentication, over unauthenticated TLS otherwise.
+Create / Update creates the missing topics, raises the partition count of existing topics
+to the planned one (partitions are never removed) and applies the topic configs.
+Delete keeps the topics and their data.
+'''
+
+
+class _IAMTokenProvider:
+    def token(self) -> str:
+        token, _ = MSKAuthTokenProvider.generate_auth_token(os.environ['AWS_REGION'])
+        return token
+
+
+def _admin_client(cluster_arn: str, iam_authentication: bool) -> KafkaAdminClient:
+    brokers = boto3.client('kafka').get_bootstrap_brokers(ClusterArn=cluster_arn)
+    if iam_authentication:
+        return KafkaAdminClient(
+            bootstrap_servers=brokers['BootstrapBrokerStringSaslIam'].split(','),
+            security_protocol='SASL_SSL',
+            sasl_mechanism='OAUTHBEARER',
+            sasl_oauth_token_provider=_IAMTokenProvider()
+        )
+    return KafkaAdminClient(bootstrap_servers=brokers['BootstrapBrokerStringTls'].split(','), security_protocol='SSL')
+
+
+def ensure_topics(cluster_arn: str, topics: list, iam_authentication: bool) -> None:
+    admin = _admin_client(cluster_arn, iam_authentication)
+    try:
+        existing = {
+            topic['topic']: len(topic['partitions'])
+            for topic in admin.describe_topics([topic['Name'] for topic in topics])
+            if topic['error_code'] == 0
+        }
+
+        # CloudFormation hands every property value over as a string
+        missing = [
+            NewTopic(
+                name=topic['Name'],
+                num_partitions=int(topic['Partitions']),
+                replication_factor=int(topic['ReplicationFactor']),
+                topic_configs=topic['Configs']
+            )
+            for topic in topics if topic['Name'] not in existing
+        ]
+        if missing:
+            admin.create_topics(missing)
+
+        grown = {
+            topic['Name']: NewPartitions(total_count=int(topic['Partitions']))
+            for topic in topics
+            if topic['Name'] in existing and existing[topic['Name']] < int(topic['Partitions'])
+        }
+        if grown:
+            admin.create_partitions(grown)
+
+        configured = [
+            ConfigResource(ConfigResourceType.TOPIC, topic['Name'], configs=topic['Configs'])
+            for topic in topics if topic['Name'] in existing
+        ]
+        if configured:
+            admin.alter_configs(configured)
+    finally:
+        admin.close()
+
+
+def _respond(event, context, status: str, reason: str) -> None:
+    body = json.dumps({
+        'Status': status,
+        'Reason': reason or f'see {context.log_stream_name}',
+        'PhysicalResourceId': f"{event['ResourceProperties']['ClusterArn']}/topics",
+        'StackId': event['StackId'],
+        'RequestId': event['RequestId'],
+        'LogicalResourceId': event['LogicalResourceId']
+    }).encode()
+    request = urllib.request.Request(event['ResponseURL'], data=body, method='PUT', headers={'Content-Type': ''})
+    urllib.request.urlopen(request, timeout=30)
+
+
+def handler(event, context):
+    status, reason = 'SUCCESS', ''
+    try:
+        if event['RequestType'] in ('Create', 'Update'):
+            properties = event['ResourceProperties']
+            # CloudFormation hands the boolean over as the string 'true' / 'false'
+            ensure_topics(properties['ClusterArn'], properties['Topics'], str(properties.get('IamAuthentication')).lower() == 'true')
+    except Exception as error:
+        status, reason = 'FAILED', str(error)
+    _respond(event, context, status, reason)
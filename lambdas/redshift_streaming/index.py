@@ -0,0 +1,80 @@
+import json
+import time
+import urllib.request
+
+import boto3
+
+'''
+Custom::RedshiftStreamingIngestion handler of CdkRedshiftStack.
+Create / Update runs the external schema and view schema statements (both IF NOT EXISTS)
+through the Redshift Data API and creates the materialized views missing from the view
+schema. Existing views are left as they are, Delete keeps the schemas, the views and the
+data they ingested. The statements are sent without WithEvent, so they do not reach the
+Redshift Data statement alerts of CdkEventBridgeStack.
+'''
+
+POLL_SECONDS = 2
+
+data_api = boto3.client('redshift-data')
+
+
+def _execute(properties: dict, sql: str, parameters: list = None) -> str:
+    request = {
+        'ClusterIdentifier': properties['ClusterIdentifier'],
+        'Database': properties['Database'],
+        'SecretArn': properties['SecretArn'],
+        'Sql': sql
+    }
+    if parameters:
+        request['Parameters'] = parameters
+    statement_id = data_api.execute_statement(**request)['Id']
+
+    while True:
+        statement = data_api.describe_statement(Id=statement_id)
+        if statement['Status'] == 'FINISHED':
+            return statement_id
+        if statement['Status'] in ('FAILED', 'ABORTED'):
+            raise RuntimeError(f"{statement.get('Error', statement['Status'])}: {sql}")
+        time.sleep(POLL_SECONDS)
+
+
+def ensure_views(properties: dict) -> None:
+    for sql in properties['SchemaStatements']:
+        _execute(properties, sql)
+
+    # stv_mv_info name and schema are blank-padded CHAR columns
+    statement_id = _execute(
+        properties,
+        'SELECT TRIM(name) FROM stv_mv_info WHERE TRIM(schema) = :schema',
+        [{'name': 'schema', 'value': properties['ViewSchema']}]
+    )
+    result = data_api.get_statement_result(Id=statement_id)
+    existing = {record[0]['stringValue'].strip() for record in result['Records']}
+
+    for view in properties['Views']:
+        if view['Name'] not in existing:
+            _execute(properties, view['Sql'])
+
+
+def _respond(event, context, status: str, reason: str) -> None:
+    properties = event['ResourceProperties']
+    body = json.dumps({
+        'Status': status,
+        'Reason': reason or f'see {context.log_stream_name}',
+        'PhysicalResourceId': f"{properties['ClusterIdentifier']}/{properties['Database']}/{properties['ViewSchema']}",
+        'StackId': event['StackId'],
+        'RequestId': event['RequestId'],
+        'LogicalResourceId': event['LogicalResourceId']
+    }).encode()
+    request = urllib.request.Request(event['ResponseURL'], data=body, method='PUT', headers={'Content-Type': ''})
+    urllib.request.urlopen(request, timeout=30)
+
+
+def handler(event, context):
+    status, reason = 'SUCCESS', ''
+    try:
+        if event['RequestType'] in ('Create', 'Update'):
+            ensure_views(event['ResourceProperties'])
+    except Exception as error:
+        status, reason = 'FAILED', str(error)
+    _respond(event, context, status, reason)
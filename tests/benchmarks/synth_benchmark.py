@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from cdks.stack_registry import ENVIRONMENTS, STACK_REGISTRY, build_stacks, resolve
+
+'''
+Synth performance benchmark.
+Every registered stack is synthesized for every environment in a fresh process (so the
+jsii runtime start is not shared), fully offline. Each run records construct / synth /
+wall time, peak RSS of the synth process and the template size. Results are compared
+with tests/benchmarks/baseline.json and a metric that grows by more than the
+threshold percentage is reported as a regression.
+
+    python -m tests.benchmarks.synth_benchmark
+    python -m tests.benchmarks.synth_benchmark --stacks msk,redash --threshold 15
+    python -m tests.benchmarks.synth_benchmark --update-baseline
+'''
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_THRESHOLD = float(os.environ.get('SYNTH_BENCHMARK_THRESHOLD', 25))
+
+# metrics checked against the baseline, with the smallest absolute growth worth reporting
+# so that sub-second timing noise on small stacks does not fail the run
+REGRESSION_METRICS = {
+    'wall_seconds': 0.5,
+    'peak_rss_mb': 20,
+    'template_bytes': 512,
+}
+
+
+def _measure(stack_key: str, environment: str) -> dict:
+    """
+    Build and synthesize one stack in this process. Runs inside the benchmark child process.
+    """
+    started = time.perf_counter()
+
+    import aws_cdk as cdk
+
+    imported = time.perf_counter()
+
+    outdir = tempfile.mkdtemp(prefix='synth-benchmark-')
+    app = cdk.App(outdir=outdir, context={'environment': environment})
+
+    # dependencies are built before timing starts, only the measured stack is timed
+    stacks = build_stacks(app, environment, resolve([stack_key], environment)[:-1])
+
+    construct_started = time.perf_counter()
+    build_stacks(app, environment, [stack_key], stacks=stacks)
+
+    constructed = time.perf_counter()
+    assembly = app.synth()
+    synthesized = time.perf_counter()
+
+    template_path = os.path.join(outdir, f'{STACK_REGISTRY[stack_key].stack_id_for(environment)}.template.json')
+    with open(template_path) as f:
+        template = f.read()
+
+    return {
+        'import_seconds': round(imported - started, 3),
+        'construct_seconds': round(constructed - construct_started, 3),
+        'synth_seconds': round(synthesized - constructed, 3),
+        'template_bytes': len(template.encode()),
+        'resource_count': len(json.loads(template).get('Resources', {})),
+        'stack_count': len(assembly.stacks),
+    }
+
+
+def measure(stack_key: str, environment: str) -> dict:
+    """
+    Benchmark one stack in a child process and add its wall time and peak RSS.
+    """
+    with tempfile.TemporaryFile() as stdout:
+        env = dict(os.environ, JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION='1')
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'tests.benchmarks.synth_benchmark', '--measure', stack_key, environment],
+            stdout=stdout,
+            stderr=subprocess.PIPE,
+            env=env
+        )
+        stderr = process.stderr.read()
+        # wait4 returns the rusage of the child including the jsii node process it reaped
+        _, status, rusage = os.wait4(process.pid, 0)
+        wall_seconds = time.perf_counter() - started
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        if process.returncode != 0:
+            raise RuntimeError(f'Benchmark of {stack_key} ({environment}) failed:\n{stderr.decode()}')
+
+        stdout.seek(0)
+        result = json.loads(stdout.read().decode().strip().splitlines()[-1])
+
+    result['wall_seconds'] = round(wall_seconds, 3)
+    # ru_maxrss is in kilobytes on Linux
+    result['peak_rss_mb'] = round(rusage.ru_maxrss / 1024, 1)
+    return result
+
+
+def run(stacks: Optional[List[str]] = None, environments: Optional[List[str]] = None) -> Dict[str, dict]:
+    results = {}
+    for stack_key in stacks or list(STACK_REGISTRY):
+        for environment in environments or ENVIRONMENTS:
+            results[f'{stack_key}/{environment}'] = measure(stack_key, environment)
+    return results
+
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results: Dict[str, dict], path: str = BASELINE_PATH) -> None:
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def find_regressions(name: str, result: dict, baseline: Optional[dict], threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """
+    Metrics of one benchmark that grew by more than `threshold` percent over the baseline.
+    """
+    if not baseline:
+        return []
+
+    regressions = []
+    for metric, min_delta in REGRESSION_METRICS.items():
+        previous = baseline.get(metric)
+        current = result.get(metric)
+        if not previous or current is None:
+            continue
+        growth = (current - previous) / previous * 100
+        if growth > threshold and current - previous > min_delta:
+            regressions.append(f'{name} {metric}: {previous} -> {current} (+{growth:.1f}%)')
+    return regressions
+
+
+def format_results(results: Dict[str, dict]) -> str:
+    lines = [f'{"benchmark":<32} {"wall s":>8} {"construct s":>12} {"synth s":>8} {"rss MB":>8} {"bytes":>8} {"resources":>10}']
+    for name, result in results.items():
+        lines.append(
+            f'{name:<32} {result["wall_seconds"]:>8.2f} {result["construct_seconds"]:>12.3f} '
+            f'{result["synth_seconds"]:>8.2f} {result["peak_rss_mb"]:>8.1f} '
+            f'{result["template_bytes"]:>8} {result["resource_count"]:>10}'
+        )
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark stack synthesis.')
+    parser.add_argument('--stacks', default=None, help='comma separated registry keys, all by default')
+    parser.add_argument('--environments', default=None, help='comma separated environments, all by default')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed growth over the baseline in percent')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--measure', nargs=2, metavar=('STACK', 'ENVIRONMENT'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(_measure(*args.measure)))
+        return 0
+
+    results = run(
+        stacks=args.stacks.split(',') if args.stacks else None,
+        environments=args.environments.split(',') if args.environments else None
+    )
+    print(format_results(results))
+
+    if args.update_baseline:
+        save_baseline(results)
+        return 0
+
+    baseline = load_baseline()
+    regressions = [
+        regression
+        for name, result in results.items()
+        for regression in find_regressions(name, result, baseline.get(name), args.threshold)
+    ]
+    for regression in regressions:
+        print(f'REGRESSION {regression}', file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
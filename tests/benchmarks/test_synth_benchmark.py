@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from cdks.stack_registry import ENVIRONMENTS, STACK_REGISTRY
+from tests.benchmarks.synth_benchmark import DEFAULT_THRESHOLD, find_regressions, load_baseline, measure
+
+# each benchmark starts its own jsii runtime, so the suite only runs when asked for:
+# SYNTH_BENCHMARK=1 python -m pytest tests/benchmarks
+requires_benchmark = pytest.mark.skipif(
+    not os.environ.get('SYNTH_BENCHMARK'),
+    reason='set SYNTH_BENCHMARK=1 to run the synth benchmarks'
+)
+
+BASELINE = load_baseline()
+
+
+@requires_benchmark
+@pytest.mark.parametrize('environment', ENVIRONMENTS)
+@pytest.mark.parametrize('stack_key', list(STACK_REGISTRY))
+def test_synth_within_baseline(stack_key, environment):
+    name = f'{stack_key}/{environment}'
+    result = measure(stack_key, environment)
+
+    assert result['resource_count'] > 0
+    assert not find_regressions(name, result, BASELINE.get(name), DEFAULT_THRESHOLD)
+
+
+def test_find_regressions_ignores_noise():
+    baseline = {'wall_seconds': 1.0, 'peak_rss_mb': 200, 'template_bytes': 1000}
+
+    assert find_regressions('msk/develop', {'wall_seconds': 1.3, 'peak_rss_mb': 210, 'template_bytes': 1100}, baseline, 25) == []
+    assert find_regressions('msk/develop', {'wall_seconds': 2.0, 'peak_rss_mb': 200, 'template_bytes': 1000}, baseline, 25) == [
+        'msk/develop wall_seconds: 1.0 -> 2.0 (+100.0%)'
+    ]
@@ -1,15 +1,337 @@
+import json
+
 import aws_cdk as core
 import aws_cdk.assertions as assertions
 
-from cdk.cdk_stack import CdkStack
+from cdks.alb_stack import CdkALBStack
+from cdks.eventbridge_stack import CdkEventBridgeStack
+from cdks.kafka_ui_stack import CdkKafkaUIStack
+from cdks.msk_stack import CdkMSKStack
+from cdks.redash_stack import CdkRedashStack
+from cdks.redshift_stack import CdkRedshiftStack
+from cdks.schema_registry_stack import CdkSchemaRegistryStack
+from cdks.stack_registry import resolve
+from configs.eventbridge_config import EventBridgeConfig
+from configs.general_config import GeneralConfig
+from configs.model import load_config
+from configs.redash_config import RedashConfig
+from configs.redshift_config import RedshiftConfig
+
+
+def test_msk_cluster_created():
+    app = core.App()
+    stack = CdkMSKStack(app, "cdk-msk-develop", environment='develop')
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::MSK::Cluster", {
+        "ClusterName": "kafka-cluster-develop",
+        "NumberOfBrokerNodes": load_config('develop').msk.number_of_broker,
+        # develop keeps the baseline unauthenticated TLS only
+        "ClientAuthentication": assertions.Match.absent()
+    })
+    template.has_resource_properties("Custom::KafkaTopics", {"IamAuthentication": False})
+
+
+def test_msk_broker_configuration_attached():
+    app = core.App()
+    stack = CdkMSKStack(app, "cdk-msk-production", environment='production')
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::MSK::Configuration", {
+        "ServerProperties": assertions.Match.string_like_regexp("num.network.threads=8")
+    })
+    template.has_resource_properties("AWS::MSK::Cluster", {
+        "ConfigurationInfo": {
+            "Arn": {"Fn::GetAtt": [assertions.Match.any_value(), "Arn"]},
+            "Revision": {"Fn::GetAtt": [assertions.Match.any_value(), "LatestRevision.Revision"]}
+        },
+        "BrokerNodeGroupInfo": {
+            "StorageInfo": {
+                "EBSStorageInfo": {
+                    # kafka.m5.xlarge brokers keep the volume baseline throughput
+                    "ProvisionedThroughput": assertions.Match.absent()
+                }
+            }
+        }
+    })
+
+
+def test_msk_tiered_storage_and_storage_autoscaling():
+    app = core.App()
+    stack = CdkMSKStack(app, "cdk-msk-production", environment='production')
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::MSK::Cluster", {
+        "StorageMode": "TIERED",
+        "KafkaVersion": load_config('production').msk.kafka_version
+    })
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalableTarget", {
+        "ScalableDimension": "kafka:broker-storage:VolumeSize",
+        "MaxCapacity": load_config('production').msk.storage_autoscaling['max_volume_size']
+    })
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalingPolicy", {
+        "TargetTrackingScalingPolicyConfiguration": {
+            "DisableScaleIn": True,
+            "TargetValue": load_config('production').msk.storage_autoscaling['target_utilization']
+        }
+    })
+
+
+def test_msk_develop_has_no_storage_autoscaling():
+    app = core.App()
+    stack = CdkMSKStack(app, "cdk-msk-develop", environment='develop')
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::ApplicationAutoScaling::ScalableTarget", 0)
+
+
+def test_redshift_parameter_group_bound_to_cluster():
+    app = core.App()
+    msk = CdkMSKStack(app, "cdk-msk-production", environment='production')
+    stack = CdkRedshiftStack(app, "cdk-etl-redshift-production", environment='production', msk=msk)
+    template = assertions.Template.from_stack(stack)
+
+    parameter_groups = template.find_resources("AWS::Redshift::ClusterParameterGroup")
+    assert len(parameter_groups) == 1
+    parameter_group_id, parameter_group = parameter_groups.popitem()
+
+    parameters = {
+        parameter['ParameterName']: parameter['ParameterValue']
+        for parameter in parameter_group['Properties']['Parameters']
+    }
+    wlm = json.loads(parameters['wlm_json_configuration'])
+    assert [queue.get('name') for queue in wlm] == ['etl', 'dashboard', 'default', None]
+    assert wlm[-1] == {'short_query_queue': True}
+    assert parameters['max_concurrency_scaling_clusters'] == '3'
+    assert parameters['enable_result_cache_for_session_queries'] == 'true'
+
+    template.has_resource_properties("AWS::Redshift::Cluster", {
+        "ClusterParameterGroupName": {"Ref": parameter_group_id}
+    })
+
+
+def test_redshift_without_streaming_ingestion_builds_without_msk():
+    app = core.App()
+    stack = CdkRedshiftStack(app, "cdk-etl-redshift-develop", environment='develop')
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("Custom::RedshiftStreamingIngestion", 0)
+    template.has_resource_properties("AWS::Redshift::Cluster", {"IamRoles": assertions.Match.absent()})
+    assert stack.dependencies == []
+    assert resolve(['redshift'], 'develop') == ['redshift']
+    assert resolve(['redshift'], 'staging') == ['msk', 'redshift']
+
+
+def test_redshift_scheduled_resize_in_production():
+    app = core.App()
+    msk = CdkMSKStack(app, "cdk-msk-production", environment='production')
+    stack = CdkRedshiftStack(app, "cdk-etl-redshift-production", environment='production', msk=msk)
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Redshift::Cluster", {
+        "NodeType": RedshiftConfig.node_type,
+        "NumberOfNodes": load_config('production').redshift.number_of_nodes
+    })
+    template.resource_count_is("AWS::Redshift::ScheduledAction", len(load_config('production').redshift.scheduled_actions))
+    template.has_resource_properties("AWS::Redshift::ScheduledAction", {
+        "TargetAction": {"ResizeCluster": {"Classic": False, "NumberOfNodes": 4}}
+    })
+
+
+def test_redshift_streaming_ingestion_from_msk():
+    app = core.App()
+    msk = CdkMSKStack(app, "cdk-msk-production", environment='production')
+    stack = CdkRedshiftStack(app, "cdk-etl-redshift-production", environment='production', msk=msk)
+    template = assertions.Template.from_stack(stack)
+
+    msk_template = assertions.Template.from_stack(msk)
+    msk_template.has_resource_properties("AWS::MSK::Cluster", {
+        "ClientAuthentication": {"Sasl": {"Iam": {"Enabled": True}}, "Unauthenticated": {"Enabled": True}}
+    })
+    msk_template.has_resource_properties("Custom::KafkaTopics", {"IamAuthentication": True})
+    msk_template.has_resource_properties("AWS::IAM::Role", {
+        "Policies": [{
+            "PolicyName": "KafkaTopicsPolicy",
+            "PolicyDocument": {
+                "Statement": assertions.Match.array_with([assertions.Match.object_like({
+                    "Action": assertions.Match.array_with(['kafka-cluster:CreateTopic', 'kafka-cluster:AlterTopicDynamicConfiguration'])
+                })])
+            }
+        }]
+    })
+    template.has_resource_properties("AWS::Redshift::Cluster", {
+        "IamRoles": [{"Fn::GetAtt": [assertions.Match.string_like_regexp("RedshiftStreamingRole"), "Arn"]}]
+    })
+    ingestion, = template.find_resources("Custom::RedshiftStreamingIngestion").values()
+    external_schema = json.dumps(ingestion["Properties"]["SchemaStatements"][0])
+    assert "AUTHENTICATION iam CLUSTER_ARN" in external_schema
+    assert "Fn::ImportValue" in external_schema
+    assert [view["Name"] for view in ingestion["Properties"]["Views"]] == ['etl_bronze_events', 'etl_bronze_cdc']
+
+
+def test_eventbridge_buffers_alerts_through_sqs():
+    app = core.App()
+    stack = CdkEventBridgeStack(app, "cdk-etl-eventbridge-production", environment='production')
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::SQS::Queue", 2)
+    template.resource_count_is("AWS::Lambda::Permission", 0)
+    template.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "FunctionName": "lambda_redshift_slack_alert_production",
+        "BatchSize": EventBridgeConfig.batch_size,
+        "MaximumBatchingWindowInSeconds": EventBridgeConfig.batching_window_seconds,
+        "ScalingConfig": {"MaximumConcurrency": EventBridgeConfig.maximum_concurrency}
+    })
+    # the alert Lambda is capped on the mapping, a reserved concurrency would throttle the pollers
+    template.resource_count_is("Custom::AWS", 0)
+
+
+def test_eventbridge_invokes_lambda_directly_when_not_buffered():
+    app = core.App()
+    stack = CdkEventBridgeStack(app, "cdk-etl-eventbridge-develop", environment='develop')
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::SQS::Queue", 0)
+    template.resource_count_is("AWS::Lambda::Permission", 1)
+
+
+def test_schema_registry_autoscaling_group_in_production():
+    app = core.App()
+    alb = CdkALBStack(app, "cdk-etl-alb-production", environment='production')
+    stack = CdkSchemaRegistryStack(app, "cdk-schema-registry-production", environment='production', alb=alb)
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::EC2::Instance", 0)
+    template.has_resource_properties("AWS::AutoScaling::AutoScalingGroup", {
+        "MinSize": str(load_config('production').schema_registry.autoscaling['min_capacity']),
+        "VPCZoneIdentifier": GeneralConfig.subnet_ids,
+        "HealthCheckType": "ELB"
+    })
+    template.has_resource_properties("AWS::AutoScaling::ScalingPolicy", {
+        "PolicyType": "TargetTrackingScaling",
+        "TargetTrackingConfiguration": assertions.Match.object_like({
+            "PredefinedMetricSpecification": assertions.Match.object_like({
+                "PredefinedMetricType": "ALBRequestCountPerTarget"
+            })
+        })
+    })
+
+
+def test_schema_registry_single_instance_in_develop():
+    app = core.App()
+    alb = CdkALBStack(app, "cdk-etl-alb-develop", environment='develop')
+    stack = CdkSchemaRegistryStack(app, "cdk-schema-registry-develop", environment='develop', alb=alb)
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::EC2::Instance", 1)
+    template.resource_count_is("AWS::AutoScaling::AutoScalingGroup", 0)
 
-# example tests. To run these tests, uncomment this file along with the example
-# resource in cdk/cdk_stack.py
-def test_sqs_queue_created():
+
+def test_redash_redis_replication_group_in_production():
+    app = core.App()
+    alb = CdkALBStack(app, "cdk-etl-alb-production", environment='production')
+    stack = CdkRedashStack(app, "cdk-redash-production", environment='production', alb=alb)
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::ElastiCache::CacheCluster", 0)
+    template.has_resource_properties("AWS::ElastiCache::ParameterGroup", {
+        "Properties": assertions.Match.object_like({
+            "maxmemory-policy": RedashConfig.redis_parameters['maxmemory-policy']
+        })
+    })
+    template.has_resource_properties("AWS::ElastiCache::ReplicationGroup", {
+        "ReplicasPerNodeGroup": load_config('production').redash.redis['replicas_per_node_group'],
+        "AutomaticFailoverEnabled": True,
+        "DataTieringEnabled": True,
+        "CacheParameterGroupName": {"Ref": assertions.Match.any_value()}
+    })
+    user_data = json.dumps(template.find_resources("AWS::EC2::LaunchTemplate"))
+    assert "PrimaryEndPoint.Address" in user_data
+    assert "ReaderEndPoint.Address" in user_data
+
+
+def test_redash_postgres_gp3_with_read_replica_in_production():
+    app = core.App()
+    alb = CdkALBStack(app, "cdk-etl-alb-production", environment='production')
+    stack = CdkRedashStack(app, "cdk-redash-production", environment='production', alb=alb)
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::RDS::DBInstance", 2)
+    template.has_resource_properties("AWS::RDS::DBInstance", {
+        "DBInstanceIdentifier": "redash-postgresql-production",
+        "StorageType": "gp3",
+        "Iops": load_config('production').redash.postgres_storage['iops'],
+        "StorageThroughput": load_config('production').redash.postgres_storage['storage_throughput'],
+        "EnablePerformanceInsights": True
+    })
+    template.has_resource_properties("AWS::RDS::DBInstance", {
+        "SourceDBInstanceIdentifier": {"Ref": assertions.Match.any_value()}
+    })
+
+
+def test_redash_web_and_worker_tiers():
     app = core.App()
-    stack = CdkStack(app, "cdk")
+    alb = CdkALBStack(app, "cdk-etl-alb-production", environment='production')
+    stack = CdkRedashStack(app, "cdk-redash-production", environment='production', alb=alb)
     template = assertions.Template.from_stack(stack)
 
-#     template.has_resource_properties("AWS::SQS::Queue", {
-#         "VisibilityTimeout": 300
-#     })
+    template.resource_count_is("AWS::EC2::Instance", 0)
+    template.resource_count_is("AWS::AutoScaling::AutoScalingGroup", 2)
+    template.has_resource_properties("AWS::AutoScaling::AutoScalingGroup", {
+        "AutoScalingGroupName": "redash-asg-production",
+        "TargetGroupARNs": [{"Ref": assertions.Match.any_value()}]
+    })
+    template.has_resource_properties("AWS::AutoScaling::AutoScalingGroup", {
+        "AutoScalingGroupName": "redash-worker-asg-production",
+        "TargetGroupARNs": assertions.Match.absent()
+    })
+    template.has_resource_properties("AWS::AutoScaling::ScalingPolicy", {
+        "TargetTrackingConfiguration": assertions.Match.object_like({
+            "CustomizedMetricSpecification": assertions.Match.object_like({
+                "MetricName": RedashConfig.queue_backlog_metric['metric_name']
+            }),
+            "TargetValue": RedashConfig.worker_scaling_target_backlog
+        })
+    })
+
+
+def test_alb_attributes_and_subnets():
+    app = core.App()
+    stack = CdkALBStack(app, "cdk-etl-alb-develop", environment='develop')
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::ElasticLoadBalancingV2::LoadBalancer", {
+        "Subnets": GeneralConfig.subnet_ids,
+        "LoadBalancerAttributes": assertions.Match.array_with([
+            {"Key": "idle_timeout.timeout_seconds", "Value": str(GeneralConfig.alb['idle_timeout_seconds'])},
+            {"Key": "routing.http2.enabled", "Value": "true"},
+            {"Key": "routing.http.desync_mitigation_mode", "Value": GeneralConfig.alb['desync_mitigation_mode']},
+            {"Key": "access_logs.s3.enabled", "Value": "false"}
+        ])
+    })
+
+
+def test_service_stacks_reference_alb_listeners():
+    app = core.App()
+    alb = CdkALBStack(app, "cdk-etl-alb-develop", environment='develop')
+    services = [
+        CdkKafkaUIStack(app, "cdk-kafka-ui-develop", environment='develop', alb=alb),
+        CdkSchemaRegistryStack(app, "cdk-schema-registry-develop", environment='develop', alb=alb),
+        CdkRedashStack(app, "cdk-redash-develop", environment='develop', alb=alb)
+    ]
+
+    priorities = []
+    for service in services:
+        rules = assertions.Template.from_stack(service).find_resources("AWS::ElasticLoadBalancingV2::ListenerRule")
+        for rule in rules.values():
+            assert "Fn::ImportValue" in rule["Properties"]["ListenerArn"]
+            priorities.append(rule["Properties"]["Priority"])
+    assert len(set(priorities)) == len(services)
+
+    # priorities do not depend on which services are synthesized
+    other_app = core.App()
+    other_alb = CdkALBStack(other_app, "cdk-etl-alb-develop", environment='develop')
+    redash = CdkRedashStack(other_app, "cdk-redash-develop", environment='develop', alb=other_alb)
+    assertions.Template.from_stack(redash).has_resource_properties("AWS::ElasticLoadBalancingV2::ListenerRule", {
+        "Priority": priorities[2]
+    })
@@ -0,0 +1,65 @@
+import pytest
+
+from configs.model import (ENVIRONMENTS, MSKSettings, RedshiftSettings, ServiceSettings, build_settings, load_config,
+                           load_environment_values)
+from configs.msk_config import MSKConfig
+from configs.redshift_config import RedshiftConfig
+from configs.schema_registry_config import SchemaRegistryConfig
+
+
+def _environment_values(environment, section, **values):
+    return dict(load_environment_values(environment)[section], **values)
+
+
+def test_load_config_resolves_every_environment_once():
+    for environment in ENVIRONMENTS:
+        conf = load_config(environment)
+        environment_values = load_environment_values(environment)
+
+        assert conf is load_config(environment)
+        assert conf.msk.number_of_broker == environment_values['msk']['number_of_broker']
+        assert conf.msk.topics == MSKConfig.topics
+        assert conf.schema_registry.autoscaling == environment_values['schema_registry'].get('autoscaling')
+
+
+def test_build_settings_reports_every_error_at_once():
+    class BrokenMSKConfig(MSKConfig):
+        metrics_level = None
+        # per environment values belong to the environment file
+        instance_type = {'develop': 'kafka.t3.small'}
+
+    environment_values = _environment_values('develop', 'msk', number_of_broker='2', broker_count=2)
+    del environment_values['kafka_version']
+
+    with pytest.raises(RuntimeError) as error:
+        build_settings(MSKSettings, BrokenMSKConfig, 'develop', 'msk', environment_values)
+
+    assert 'msk.number_of_broker has to be int, got str.' in str(error.value)
+    assert 'msk.metrics_level has to be str, got NoneType.' in str(error.value)
+    assert 'msk.instance_type is set per environment, not in BrokenMSKConfig.' in str(error.value)
+    assert 'msk.kafka_version has no environment value.' in str(error.value)
+    assert 'msk.broker_count is not a per environment value.' in str(error.value)
+
+
+def test_build_settings_checks_rules_across_values():
+    with pytest.raises(RuntimeError, match='MSK tiered storage is not supported on kafka 2.8.0.'):
+        build_settings(MSKSettings, MSKConfig, 'develop', 'msk', _environment_values('develop', 'msk', storage_mode='TIERED'))
+
+    with pytest.raises(RuntimeError, match='MSK provisioned throughput is not supported on kafka.m5.xlarge.'):
+        build_settings(MSKSettings, MSKConfig, 'production', 'msk', _environment_values('production', 'msk', provisioned_throughput=250))
+
+    with pytest.raises(RuntimeError) as error:
+        build_settings(RedshiftSettings, RedshiftConfig, 'production', 'redshift',
+                       _environment_values('production', 'redshift', cluster_type='single-node'))
+    assert 'A single-node Redshift cluster has exactly 1 node.' in str(error.value)
+    assert 'Redshift scheduled action resize-up-before-etl resizes a single-node cluster.' in str(error.value)
+
+    with pytest.raises(RuntimeError, match='needs autoscaling capacity'):
+        build_settings(ServiceSettings, SchemaRegistryConfig, 'production', 'schema_registry',
+                       _environment_values('production', 'schema_registry', autoscaling=None))
+
+
+def test_build_settings_reads_the_environment_file_by_default():
+    settings = build_settings(MSKSettings, MSKConfig, 'staging', 'msk')
+
+    assert settings == load_config('staging').msk
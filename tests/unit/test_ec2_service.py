@@ -0,0 +1,113 @@
+import base64
+import gzip
+import json
+
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+import pytest
+
+from cdks.alb_stack import CdkALBStack
+from cdks.ec2_service import Ec2Service
+from cdks.user_data import ServiceUserData
+from configs.ec2_service_config import Ec2ServiceConfig
+from configs.model import ServiceSettings, build_settings
+
+
+SERVICE_ENVIRONMENT_VALUES = {
+    'ami': 'ami-xxxxx',
+    'deployment_mode': 'instance',
+    'autoscaling': None
+}
+
+
+class TunedServiceConfig(Ec2ServiceConfig):
+    service_port = 9000
+    target_group_lb = 'least_outstanding_requests'
+    deregistration_delay_seconds = 20
+    stickiness = {'type': 'lb_cookie', 'duration_seconds': 600}
+    root_volume = {
+        'device_name': '/dev/xvda',
+        'size': 20,
+        'throughput': 250,
+        'iops': 4000
+    }
+
+
+def _service_template(conf) -> assertions.Template:
+    app = core.App()
+    alb = CdkALBStack(app, "cdk-etl-alb-develop", environment='develop')
+    stack = core.Stack(app, "ec2-service-test")
+    Ec2Service(stack, "Service",
+        service_name='tuned',
+        environment='develop',
+        conf=build_settings(ServiceSettings, conf, 'develop', 'tuned', SERVICE_ENVIRONMENT_VALUES),
+        alb=alb,
+        user_data=ServiceUserData(['user_data/service_user_data.sh'], prelude=['echo tuned']),
+        managed_policy_arns=[]
+    )
+    return assertions.Template.from_stack(stack)
+
+
+def test_ec2_service_applies_performance_settings():
+    template = _service_template(TunedServiceConfig)
+
+    template.has_resource_properties("AWS::ElasticLoadBalancingV2::TargetGroup", {
+        "Name": "tuned-tg-develop",
+        "HealthCheckPort": "9000",
+        "TargetGroupAttributes": assertions.Match.array_with([
+            {"Key": "load_balancing.algorithm.type", "Value": "least_outstanding_requests"},
+            {"Key": "deregistration_delay.timeout_seconds", "Value": "20"},
+            {"Key": "stickiness.lb_cookie.duration_seconds", "Value": "600"}
+        ])
+    })
+    template.has_resource_properties("AWS::EC2::LaunchTemplate", {
+        "LaunchTemplateData": assertions.Match.object_like({
+            "BlockDeviceMappings": [{
+                "DeviceName": "/dev/xvda",
+                "Ebs": {"DeleteOnTermination": True, "VolumeSize": 20, "VolumeType": "gp3", "Iops": 4000, "Throughput": 250}
+            }]
+        })
+    })
+    template.has_resource_properties("AWS::EC2::Instance", {
+        "LaunchTemplate": assertions.Match.object_like({"LaunchTemplateId": {"Ref": assertions.Match.any_value()}})
+    })
+
+
+def test_ec2_service_rejects_slow_start_with_least_outstanding_requests():
+    class SlowStartConfig(TunedServiceConfig):
+        slow_start_seconds = 30
+
+    with pytest.raises(RuntimeError):
+        _service_template(SlowStartConfig)
+
+
+def test_ec2_service_gzip_user_data_decompresses_to_the_scripts():
+    template = _service_template(TunedServiceConfig)
+
+    launch_template = list(template.find_resources("AWS::EC2::LaunchTemplate").values())[0]
+    mime = launch_template["Properties"]["LaunchTemplateData"]["UserData"]["Fn::Base64"]
+    assert 'Content-Type: text/x-shellscript' in mime
+    assert 'echo tuned' in mime
+
+    compressed = mime.split('Content-Transfer-Encoding: base64\n\n')[1].split('\n')[0]
+    with open('user_data/service_user_data.sh') as f:
+        assert gzip.decompress(base64.b64decode(compressed)).decode() == f.read().rstrip('\n') + '\n'
+
+
+def test_ec2_service_s3_asset_user_data_grants_read_access():
+    class AssetConfig(TunedServiceConfig):
+        user_data_delivery = 's3_asset'
+
+    template = _service_template(AssetConfig)
+
+    user_data = json.dumps(template.find_resources("AWS::EC2::LaunchTemplate"))
+    assert 'aws s3 cp' in user_data
+    template.has_resource_properties("AWS::IAM::Role", {
+        "Policies": assertions.Match.array_with([
+            assertions.Match.object_like({
+                "PolicyDocument": assertions.Match.object_like({
+                    "Statement": [assertions.Match.object_like({"Action": ["s3:GetObject"]})]
+                })
+            })
+        ])
+    })
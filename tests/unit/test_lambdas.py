@@ -0,0 +1,197 @@
+import importlib.util
+import json
+import sys
+import types
+
+import pytest
+
+
+class StubDataAPI:
+    def __init__(self, existing_views):
+        self.existing_views = existing_views
+        self.statements = []
+
+    def execute_statement(self, **request):
+        self.statements.append(request)
+        return {'Id': str(len(self.statements))}
+
+    def describe_statement(self, Id):
+        return {'Status': 'FINISHED'}
+
+    def get_statement_result(self, Id):
+        return {'Records': [[{'stringValue': name}] for name in self.existing_views]}
+
+
+class StubKafka:
+    def get_bootstrap_brokers(self, ClusterArn):
+        return {'BootstrapBrokerStringTls': 'b-1:9094,b-2:9094', 'BootstrapBrokerStringSaslIam': 'b-1:9098,b-2:9098'}
+
+
+class StubAdminClient:
+    instances = []
+
+    def __init__(self, **config):
+        self.config = config
+        self.calls = []
+        self.closed = False
+        StubAdminClient.instances.append(self)
+
+    def describe_topics(self, topics):
+        # etl.bronze.events exists with 2 partitions, the other topics are unknown
+        return [
+            {'topic': topic, 'partitions': [{}, {}] if topic == 'etl.bronze.events' else [], 'error_code': 0 if topic == 'etl.bronze.events' else 3}
+            for topic in topics
+        ]
+
+    def create_topics(self, topics):
+        self.calls.append(('create_topics', topics))
+
+    def create_partitions(self, partitions):
+        self.calls.append(('create_partitions', partitions))
+
+    def alter_configs(self, resources):
+        self.calls.append(('alter_configs', resources))
+
+    def close(self):
+        self.closed = True
+
+
+def _load_handler(monkeypatch, name, clients):
+    boto3 = types.ModuleType('boto3')
+    boto3.client = lambda service: clients[service]
+    kafka_admin = types.ModuleType('kafka.admin')
+    kafka_admin.KafkaAdminClient = StubAdminClient
+    kafka_admin.NewTopic = lambda **kwargs: kwargs
+    kafka_admin.NewPartitions = lambda **kwargs: kwargs
+    kafka_admin.ConfigResourceType = types.SimpleNamespace(TOPIC='TOPIC')
+    kafka_admin.ConfigResource = lambda resource_type, name, configs: {'name': name, 'configs': configs}
+    signer = types.ModuleType('aws_msk_iam_sasl_signer')
+    signer.MSKAuthTokenProvider = types.SimpleNamespace(generate_auth_token=lambda region: (f'token-{region}', 0))
+    monkeypatch.setitem(sys.modules, 'boto3', boto3)
+    monkeypatch.setitem(sys.modules, 'kafka', types.ModuleType('kafka'))
+    monkeypatch.setitem(sys.modules, 'kafka.admin', kafka_admin)
+    monkeypatch.setitem(sys.modules, 'aws_msk_iam_sasl_signer', signer)
+    monkeypatch.setenv('AWS_REGION', 'ap-northeast-1')
+
+    spec = importlib.util.spec_from_file_location(f'{name}_index', f'lambdas/{name}/index.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    responses = []
+    monkeypatch.setattr(module.urllib.request, 'urlopen', lambda request, timeout: responses.append(json.loads(request.data)))
+    return module, responses
+
+
+def _event(request_type, properties):
+    return {
+        'RequestType': request_type,
+        'ResourceProperties': properties,
+        'StackId': 'stack',
+        'RequestId': 'request',
+        'LogicalResourceId': 'resource',
+        'ResponseURL': 'https://cloudformation.example/response'
+    }
+
+
+CONTEXT = types.SimpleNamespace(log_stream_name='stream')
+
+STREAMING_PROPERTIES = {
+    'ClusterIdentifier': 'redshift-cluster-staging',
+    'Database': 'dev',
+    'SecretArn': 'arn:secret',
+    'ViewSchema': 'streaming',
+    'SchemaStatements': ['CREATE EXTERNAL SCHEMA IF NOT EXISTS msk ...', 'CREATE SCHEMA IF NOT EXISTS streaming'],
+    'Views': [
+        {'Name': 'etl_bronze_events', 'Sql': 'CREATE MATERIALIZED VIEW streaming.etl_bronze_events ...'},
+        {'Name': 'etl_bronze_cdc', 'Sql': 'CREATE MATERIALIZED VIEW streaming.etl_bronze_cdc ...'}
+    ]
+}
+
+TOPICS_PROPERTIES = {
+    'ClusterArn': 'arn:cluster',
+    'IamAuthentication': 'true',
+    'Topics': [
+        {'Name': 'etl.bronze.events', 'Partitions': '6', 'ReplicationFactor': '3', 'Configs': {'retention.ms': '86400000'}},
+        {'Name': 'etl.bronze.cdc', 'Partitions': '3', 'ReplicationFactor': '3', 'Configs': {'retention.ms': '3600000'}}
+    ]
+}
+
+
+@pytest.mark.parametrize('request_type', ['Create', 'Update'])
+def test_redshift_streaming_creates_only_missing_views(monkeypatch, request_type):
+    # stv_mv_info returns blank-padded CHAR names
+    data_api = StubDataAPI(['etl_bronze_events   '])
+    module, responses = _load_handler(monkeypatch, 'redshift_streaming', {'redshift-data': data_api})
+
+    module.handler(_event(request_type, STREAMING_PROPERTIES), CONTEXT)
+
+    sqls = [statement['Sql'] for statement in data_api.statements]
+    assert sqls[:2] == STREAMING_PROPERTIES['SchemaStatements']
+    assert 'TRIM(schema) = :schema' in sqls[2]
+    assert sqls[3:] == ['CREATE MATERIALIZED VIEW streaming.etl_bronze_cdc ...']
+    assert responses[0]['Status'] == 'SUCCESS'
+    assert responses[0]['PhysicalResourceId'] == 'redshift-cluster-staging/dev/streaming'
+
+
+def test_redshift_streaming_delete_keeps_the_views(monkeypatch):
+    data_api = StubDataAPI([])
+    module, responses = _load_handler(monkeypatch, 'redshift_streaming', {'redshift-data': data_api})
+
+    module.handler(_event('Delete', STREAMING_PROPERTIES), CONTEXT)
+
+    assert data_api.statements == []
+    assert responses[0]['Status'] == 'SUCCESS'
+
+
+def test_redshift_streaming_reports_failed_statements(monkeypatch):
+    data_api = StubDataAPI([])
+    data_api.describe_statement = lambda Id: {'Status': 'FAILED', 'Error': 'permission denied'}
+    module, responses = _load_handler(monkeypatch, 'redshift_streaming', {'redshift-data': data_api})
+
+    module.handler(_event('Create', STREAMING_PROPERTIES), CONTEXT)
+
+    assert responses[0]['Status'] == 'FAILED'
+    assert responses[0]['Reason'].startswith('permission denied: CREATE EXTERNAL SCHEMA')
+
+
+@pytest.mark.parametrize('request_type', ['Create', 'Update'])
+def test_kafka_topics_creates_grows_and_configures_topics(monkeypatch, request_type):
+    StubAdminClient.instances = []
+    module, responses = _load_handler(monkeypatch, 'kafka_topics', {'kafka': StubKafka()})
+
+    module.handler(_event(request_type, TOPICS_PROPERTIES), CONTEXT)
+
+    admin, = StubAdminClient.instances
+    assert admin.config['bootstrap_servers'] == ['b-1:9098', 'b-2:9098']
+    assert admin.config['security_protocol'] == 'SASL_SSL'
+    assert admin.config['sasl_mechanism'] == 'OAUTHBEARER'
+    assert admin.config['sasl_oauth_token_provider'].token() == 'token-ap-northeast-1'
+    assert admin.calls == [
+        ('create_topics', [{'name': 'etl.bronze.cdc', 'num_partitions': 3, 'replication_factor': 3, 'topic_configs': {'retention.ms': '3600000'}}]),
+        ('create_partitions', {'etl.bronze.events': {'total_count': 6}}),
+        ('alter_configs', [{'name': 'etl.bronze.events', 'configs': {'retention.ms': '86400000'}}])
+    ]
+    assert admin.closed
+    assert responses[0]['Status'] == 'SUCCESS'
+    assert responses[0]['PhysicalResourceId'] == 'arn:cluster/topics'
+
+
+def test_kafka_topics_without_iam_authentication_connects_over_tls(monkeypatch):
+    StubAdminClient.instances = []
+    module, responses = _load_handler(monkeypatch, 'kafka_topics', {'kafka': StubKafka()})
+
+    module.handler(_event('Create', dict(TOPICS_PROPERTIES, IamAuthentication='false')), CONTEXT)
+
+    admin, = StubAdminClient.instances
+    assert admin.config == {'bootstrap_servers': ['b-1:9094', 'b-2:9094'], 'security_protocol': 'SSL'}
+    assert responses[0]['Status'] == 'SUCCESS'
+
+
+def test_kafka_topics_delete_keeps_the_topics(monkeypatch):
+    StubAdminClient.instances = []
+    module, responses = _load_handler(monkeypatch, 'kafka_topics', {'kafka': StubKafka()})
+
+    module.handler(_event('Delete', TOPICS_PROPERTIES), CONTEXT)
+
+    assert StubAdminClient.instances == []
+    assert responses[0]['Status'] == 'SUCCESS'
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from configs.model import environment_path, load_config
+from tools.msk_capacity import catalog_targets, validate_config, write_config
+from tools.msk_sizing import ClusterPlan, plan_cluster
+
+PROVISIONED_THROUGHPUT_INSTANCE_TYPES = ['kafka.m5.4xlarge', 'kafka.m5.8xlarge']
+
+
+def test_plan_cluster_picks_fewest_vcpus_in_az_multiples():
+    plans = plan_cluster(100, 200, 24, 3, 3, 0.6, PROVISIONED_THROUGHPUT_INSTANCE_TYPES, ['kafka.m5.large', 'kafka.m5.2xlarge'])
+
+    # 9 x 2 vCPUs before 3 x 8 vCPUs
+    assert [(plan.instance_type, plan.number_of_broker) for plan in plans] == [('kafka.m5.large', 9), ('kafka.m5.2xlarge', 3)]
+    assert [plan.broker_volume_size for plan in plans] == [4800, 14400]
+
+
+def test_plan_cluster_provisions_volume_throughput_only_where_supported():
+    plans = plan_cluster(300, 300, 1, 3, 3, 0.6, PROVISIONED_THROUGHPUT_INSTANCE_TYPES, ['kafka.m5.4xlarge'])
+
+    assert plans[0].number_of_broker == 3
+    # 300 MB/s written per broker at 60% needs 500 MB/s of volume throughput
+    assert plans[0].provisioned_throughput == 500
+    assert plan_cluster(300, 300, 1, 3, 3, 0.6, [], ['kafka.m5.4xlarge'])[0].number_of_broker == 6
+
+
+def test_validate_config_reports_saturated_brokers():
+    msk_conf = load_config('production').msk
+    targets = catalog_targets(msk_conf, msk_conf.tiered_local_retention_hours)
+
+    assert validate_config(msk_conf, targets, 3, 0.6) == []
+
+    targets['ingress_mb_per_second'] *= 20
+    assert any('MB/s written per broker' in error for error in validate_config(msk_conf, targets, 3, 0.6))
+
+
+def test_write_config_rewrites_only_the_planned_values(tmp_path):
+    path = tmp_path / 'staging.json'
+    with open(environment_path('staging')) as f:
+        source = f.read()
+    path.write_text(source)
+
+    write_config(ClusterPlan('kafka.m5.xlarge', 6, 3000, None, 0, 0, 0), 'staging', str(path))
+    written = path.read_text()
+
+    msk_values = dict(json.loads(source)['msk'], instance_type='kafka.m5.xlarge', number_of_broker=6, broker_volume_size=3000)
+    assert json.loads(written) == dict(json.loads(source), msk=msk_values)
+    assert len(written.splitlines()) == len(source.splitlines())
+
+    # over the staging storage_autoscaling max_volume_size, nothing is written
+    with pytest.raises(RuntimeError, match='max_volume_size'):
+        write_config(ClusterPlan('kafka.m5.xlarge', 6, 9000, None, 0, 0, 0), 'staging', str(path))
+    assert path.read_text() == written
@@ -0,0 +1,47 @@
+import pytest
+
+from tools.msk_sizing import plan_topics
+
+BROKER_CONFIGURATION = {'default.replication.factor': 3, 'min.insync.replicas': 2}
+
+
+def _plan(topics, **kwargs):
+    settings = dict(
+        broker_count=3,
+        instance_type='kafka.m5.large',
+        broker_configuration=BROKER_CONFIGURATION,
+        load_factor=1.0,
+        partition_write_mb_per_second=5,
+        utilization=0.6,
+        broker_volume_size=1000
+    )
+    settings.update(kwargs)
+    return plan_topics(topics, **settings)
+
+
+def test_plan_topics_partitions_for_throughput_and_consumers():
+    plans = _plan([
+        {'name': 'throughput', 'write_mb_per_second': 12, 'retention_hours': 1, 'consumer_parallelism': 1},
+        {'name': 'consumers', 'write_mb_per_second': 1, 'retention_hours': 1, 'consumer_parallelism': 7},
+        {'name': 'small', 'write_mb_per_second': 0.1, 'retention_hours': 1, 'consumer_parallelism': 1},
+    ])
+
+    # rounded up to a multiple of the 3 brokers
+    assert [plan.partitions for plan in plans] == [3, 9, 3]
+    assert {plan.replication_factor for plan in plans} == {3}
+    assert plans[0].configs == {'retention.ms': '3600000', 'min.insync.replicas': '2'}
+
+
+def test_plan_topics_tiered_storage_keeps_local_retention():
+    plan, = _plan([{'name': 'tiered', 'write_mb_per_second': 1, 'retention_hours': 168, 'consumer_parallelism': 1}], local_retention_hours=12)
+
+    assert plan.configs['remote.storage.enable'] == 'true'
+    assert plan.configs['local.retention.ms'] == str(12 * 3600 * 1000)
+
+
+def test_plan_topics_rejects_catalog_over_broker_throughput():
+    with pytest.raises(RuntimeError, match='MB/s written per broker'):
+        _plan([{'name': 'hot', 'write_mb_per_second': 60, 'retention_hours': 1, 'consumer_parallelism': 1}])
+
+    with pytest.raises(RuntimeError, match='GB retained per broker'):
+        _plan([{'name': 'long', 'write_mb_per_second': 5, 'retention_hours': 720, 'consumer_parallelism': 1}])
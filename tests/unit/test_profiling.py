@@ -0,0 +1,51 @@
+import pytest
+
+from tools.profiling import JSII_CALLS, SynthProfiler
+
+
+def test_phases_are_folded_with_self_time():
+    profiler = SynthProfiler()
+    with profiler.phase('cdk-msk-develop', 'construct'):
+        with profiler.phase('jsii:create CfnCluster'):
+            pass
+
+    folded = profiler.folded()
+    assert set(profiler.samples) == {
+        'cdk-msk-develop',
+        'cdk-msk-develop;construct',
+        'cdk-msk-develop;construct;jsii:create CfnCluster',
+    }
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in folded.splitlines())
+
+    report = profiler.report()
+    assert report['stacks']['cdk-msk-develop']['construct'] > 0
+
+
+def test_disabled_profiler_records_nothing(tmp_path):
+    profiler = SynthProfiler(enabled=False, profile_dir=str(tmp_path))
+    profiler.install()
+    with profiler.phase('synth'):
+        pass
+
+    assert not profiler.samples
+    assert profiler.write('develop') is None
+
+
+def test_synth_app_restores_jsii_when_a_stack_fails(tmp_path, monkeypatch):
+    import aws_cdk as cdk
+    import jsii
+
+    import app
+
+    def build_stacks(*args, **kwargs):
+        raise RuntimeError('stack failed')
+
+    monkeypatch.setattr(app, 'build_stacks', build_stacks)
+    originals = {method: getattr(jsii, method) for method in JSII_CALLS}
+
+    with pytest.raises(RuntimeError, match='stack failed'):
+        app.synth_app(cdk.App(outdir=str(tmp_path / 'cdk.out'), context={
+            'environment': 'develop', 'profile': 'true', 'profile_dir': str(tmp_path)
+        }))
+
+    assert {method: getattr(jsii, method) for method in JSII_CALLS} == originals
@@ -0,0 +1,271 @@
+import functools
+import json
+import os
+import tempfile
+
+import aws_cdk as core
+import pytest
+
+from cdks.stack_registry import ENVIRONMENTS, STACK_REGISTRY, build_stacks, resolve
+from configs.eventbridge_config import EventBridgeConfig
+from configs.kafka_ui_config import KafkaUIConfig
+from configs.model import load_config
+from configs.msk_config import MSKConfig
+from configs.msk_monitoring_config import MSKMonitoringConfig
+from configs.redash_config import RedashConfig
+from configs.redshift_config import RedshiftConfig
+from configs.schema_registry_config import SchemaRegistryConfig
+from tools.msk_sizing import broker_ingress_limit_mb_per_second
+
+'''
+Template snapshots of every registered stack in every environment.
+Each stack is synthesized offline (the configs only hold literal values, no lookups) and
+compared with tests/snapshots/<stack id>.json. The stacks are built once per test
+process (each in its own temporary outdir) and shared by the tests reading the same
+template, so the suite can be spread over pytest-xdist workers (requirements-dev.txt):
+
+    python -m pytest tests/unit/test_snapshots.py -n auto
+
+After an intended template change, review the diff and rewrite the snapshots:
+
+    UPDATE_SNAPSHOTS=1 python -m pytest tests/unit/test_snapshots.py
+'''
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'snapshots')
+
+UPDATE_SNAPSHOTS = bool(os.environ.get('UPDATE_SNAPSHOTS'))
+
+# properties a throughput or latency regression would hide in, reported first when a snapshot differs
+PERFORMANCE_PROPERTIES = {
+    'AWS::MSK::Cluster': ['NumberOfBrokerNodes', 'BrokerNodeGroupInfo', 'StorageMode', 'EnhancedMonitoring'],
+    'AWS::MSK::Configuration': ['ServerProperties'],
+    'Custom::KafkaTopics': ['Topics'],
+    'AWS::Redshift::Cluster': ['ClusterType', 'NodeType', 'NumberOfNodes'],
+    'AWS::Redshift::ClusterParameterGroup': ['Parameters'],
+    'AWS::Lambda::EventSourceMapping': ['BatchSize', 'MaximumBatchingWindowInSeconds', 'ScalingConfig'],
+    'AWS::ElastiCache::ReplicationGroup': ['CacheNodeType', 'NumNodeGroups', 'ReplicasPerNodeGroup', 'DataTieringEnabled'],
+    'AWS::ElastiCache::CacheCluster': ['CacheNodeType', 'NumCacheNodes'],
+    'AWS::RDS::DBInstance': ['DBInstanceClass', 'StorageType', 'AllocatedStorage', 'Iops', 'StorageThroughput'],
+    'AWS::ElasticLoadBalancingV2::LoadBalancer': ['LoadBalancerAttributes'],
+    'AWS::ElasticLoadBalancingV2::TargetGroup': ['TargetGroupAttributes', 'HealthCheckIntervalSeconds', 'HealthyThresholdCount'],
+    'AWS::EC2::LaunchTemplate': ['LaunchTemplateData.InstanceType', 'LaunchTemplateData.BlockDeviceMappings'],
+    'AWS::AutoScaling::AutoScalingGroup': ['MinSize', 'MaxSize', 'DesiredCapacity'],
+}
+
+
+def _stack_cases():
+    return [pytest.param(stack_key, environment, id=f'{stack_key}-{environment}')
+            for environment in ENVIRONMENTS for stack_key in STACK_REGISTRY]
+
+
+@functools.lru_cache(maxsize=None)
+def synthesize(stack_key: str, environment: str) -> dict:
+    """
+    Build one stack (and its dependencies) the way app.py does and return its template
+    and the context the synth was missing, i.e. the lookups it would have made.
+    """
+    app = core.App(outdir=tempfile.mkdtemp(prefix='synth-snapshot-'), context={'environment': environment})
+    build_stacks(app, environment, resolve([stack_key], environment))
+
+    assembly = app.synth()
+    with open(os.path.join(assembly.directory, 'manifest.json')) as f:
+        missing = json.load(f).get('missing', [])
+
+    return {
+        'template': assembly.get_stack_by_name(STACK_REGISTRY[stack_key].stack_id_for(environment)).template,
+        'missing': missing
+    }
+
+
+def _lookup(value, path: str):
+    for key in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def performance_properties(template: dict) -> dict:
+    """
+    {'<logical id>.<property path>': value} of every PERFORMANCE_PROPERTIES entry in the template.
+    """
+    properties = {}
+    for logical_id, resource in template.get('Resources', {}).items():
+        for path in PERFORMANCE_PROPERTIES.get(resource.get('Type'), []):
+            value = _lookup(resource.get('Properties', {}), path)
+            if value is not None:
+                properties[f'{logical_id}.{path}'] = value
+    return properties
+
+
+def performance_changes(snapshot: dict, template: dict) -> list:
+    before = performance_properties(snapshot)
+    after = performance_properties(template)
+    return [
+        f'{name}: {json.dumps(before.get(name))} -> {json.dumps(after.get(name))}'
+        for name in sorted(set(before) | set(after))
+        if before.get(name) != after.get(name)
+    ]
+
+
+def _resources(template: dict, resource_type: str) -> list:
+    return [resource.get('Properties', {}) for resource in template['Resources'].values() if resource['Type'] == resource_type]
+
+
+def _attributes(properties: dict, key: str) -> dict:
+    return {attribute['Key']: attribute['Value'] for attribute in properties[key]}
+
+
+def test_every_stack_case_has_its_own_snapshot():
+    # one snapshot file per test case, so xdist workers never write the same file
+    stack_ids = [STACK_REGISTRY[case.values[0]].stack_id_for(case.values[1]) for case in _stack_cases()]
+
+    assert len(set(stack_ids)) == len(stack_ids)
+
+
+@pytest.mark.parametrize('stack_key,environment', _stack_cases())
+def test_stack_matches_snapshot(stack_key, environment):
+    result = synthesize(stack_key, environment)
+    template = result['template']
+
+    assert result['missing'] == [], 'the synth has to stay offline, without context lookups'
+
+    snapshot_path = os.path.join(SNAPSHOT_DIR, f'{STACK_REGISTRY[stack_key].stack_id_for(environment)}.json')
+    if UPDATE_SNAPSHOTS or not os.path.exists(snapshot_path):
+        # only this test writes this snapshot, the rename keeps a half written file from being read
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        partial_path = f'{snapshot_path}.{os.getpid()}.tmp'
+        with open(partial_path, 'w') as f:
+            f.write(json.dumps(template, indent=1, sort_keys=True) + '\n')
+        os.replace(partial_path, snapshot_path)
+        if not UPDATE_SNAPSHOTS:
+            pytest.fail(f'{snapshot_path} did not exist and was written, review and commit it')
+        return
+
+    with open(snapshot_path) as f:
+        snapshot = json.load(f)
+
+    if template != snapshot:
+        changes = performance_changes(snapshot, template)
+        pytest.fail(
+            f'{snapshot_path} differs from the synthesized template, run with UPDATE_SNAPSHOTS=1 if intended.\n' +
+            ('performance properties changed:\n    ' + '\n    '.join(changes) if changes else 'no performance property changed')
+        )
+
+
+@pytest.mark.parametrize('environment', ENVIRONMENTS)
+def test_msk_broker_capacity(environment):
+    cluster, = _resources(synthesize('msk', environment)['template'], 'AWS::MSK::Cluster')
+
+    assert cluster['NumberOfBrokerNodes'] == load_config(environment).msk.number_of_broker
+    assert cluster['BrokerNodeGroupInfo']['InstanceType'] == load_config(environment).msk.instance_type
+    assert cluster['BrokerNodeGroupInfo']['StorageInfo']['EBSStorageInfo']['VolumeSize'] == load_config(environment).msk.broker_volume_size
+    assert cluster['StorageMode'] == load_config(environment).msk.storage_mode
+
+
+@pytest.mark.parametrize('environment', ENVIRONMENTS)
+def test_msk_topics_cover_consumer_parallelism(environment):
+    topics, = _resources(synthesize('msk', environment)['template'], 'Custom::KafkaTopics')
+    partitions = {topic['Name']: topic['Partitions'] for topic in topics['Topics']}
+
+    assert set(partitions) == {topic['name'] for topic in MSKConfig.topics}
+    for topic in MSKConfig.topics:
+        assert partitions[topic['name']] >= topic['consumer_parallelism']
+        assert partitions[topic['name']] % load_config(environment).msk.number_of_broker == 0
+
+
+@pytest.mark.parametrize('environment', ENVIRONMENTS)
+def test_msk_monitoring_alarms_follow_the_cluster(environment):
+    alarms = _resources(synthesize('msk-monitoring', environment)['template'], 'AWS::CloudWatch::Alarm')
+    by_metric = {}
+    for alarm in alarms:
+        by_metric.setdefault(alarm.get('MetricName', 'CpuUser + CpuSystem'), []).append(alarm)
+
+    # one alarm per broker for every broker metric
+    for metric_name in ['BytesInPerSec', 'CpuUser + CpuSystem', 'KafkaDataLogsDiskUsed', 'UnderReplicatedPartitions']:
+        assert len(by_metric[metric_name]) == load_config(environment).msk.number_of_broker
+
+    ingress_limit = broker_ingress_limit_mb_per_second(
+        load_config(environment).msk.instance_type,
+        load_config(environment).msk.provisioned_throughput,
+        load_config(environment).msk.broker_configuration['default.replication.factor'],
+        MSKConfig.broker_utilization_target
+    )
+    assert {alarm['Threshold'] for alarm in by_metric['BytesInPerSec']} == {round(ingress_limit * 1000 * 1000)}
+
+    lag_alarms = {(dimension['Name'], dimension['Value']) for alarm in by_metric['EstimatedMaxTimeLag'] for dimension in alarm['Dimensions']}
+    for topic, consumer_groups in MSKMonitoringConfig.consumer_groups.items():
+        assert ('Topic', topic) in lag_alarms
+        assert all(('Consumer Group', consumer_group) in lag_alarms for consumer_group in consumer_groups)
+
+
+@pytest.mark.parametrize('environment', ENVIRONMENTS)
+def test_redshift_node_type_and_count(environment):
+    cluster, = _resources(synthesize('redshift', environment)['template'], 'AWS::Redshift::Cluster')
+
+    assert cluster['ClusterType'] == load_config(environment).redshift.cluster_type
+    assert cluster['NodeType'] == RedshiftConfig.node_type
+    # a single-node cluster has no NumberOfNodes
+    assert cluster.get('NumberOfNodes', 1) == load_config(environment).redshift.number_of_nodes
+
+
+@pytest.mark.parametrize('environment', ENVIRONMENTS)
+def test_redshift_streaming_views_cover_configured_topics(environment):
+    template = synthesize('redshift', environment)['template']
+    streaming_conf = load_config(environment).redshift.streaming_ingestion
+    ingestions = _resources(template, 'Custom::RedshiftStreamingIngestion')
+    cluster, = _resources(template, 'AWS::Redshift::Cluster')
+
+    if not streaming_conf:
+        assert ingestions == []
+        assert 'IamRoles' not in cluster
+        return
+
+    ingestion, = ingestions
+    assert [view['Topic'] for view in ingestion['Views']] == streaming_conf['topics']
+    assert all('AUTO REFRESH YES' in view['Sql'] for view in ingestion['Views'])
+    assert len(cluster['IamRoles']) == 1
+    assert load_config(environment).msk.iam_authentication
+
+
+@pytest.mark.parametrize('environment', ENVIRONMENTS)
+def test_eventbridge_batching(environment):
+    mappings = _resources(synthesize('eventbridge', environment)['template'], 'AWS::Lambda::EventSourceMapping')
+
+    if not load_config(environment).eventbridge.buffered:
+        assert mappings == []
+        return
+
+    mapping, = mappings
+    assert mapping['BatchSize'] == EventBridgeConfig.batch_size
+    assert mapping['MaximumBatchingWindowInSeconds'] == EventBridgeConfig.batching_window_seconds
+    assert mapping['ScalingConfig'] == {'MaximumConcurrency': EventBridgeConfig.maximum_concurrency}
+
+
+@pytest.mark.parametrize('environment', ENVIRONMENTS)
+def test_redash_cache_and_database_classes(environment):
+    template = synthesize('redash', environment)['template']
+    redis_conf = load_config(environment).redash.redis
+
+    caches = _resources(template, 'AWS::ElastiCache::ReplicationGroup' if redis_conf['replication_group'] else 'AWS::ElastiCache::CacheCluster')
+    assert [cache['CacheNodeType'] for cache in caches] == [redis_conf['node_type']]
+
+    primary = [db for db in _resources(template, 'AWS::RDS::DBInstance') if 'SourceDBInstanceIdentifier' not in db]
+    assert [db['DBInstanceClass'] for db in primary] == [load_config(environment).redash.postgres_instance_type]
+    assert primary[0]['StorageType'] == 'gp3'
+
+
+@pytest.mark.parametrize('environment', ENVIRONMENTS)
+@pytest.mark.parametrize('stack_key,conf', [
+    ('kafka-ui', KafkaUIConfig),
+    ('schema-registry', SchemaRegistryConfig),
+    ('redash', RedashConfig)
+])
+def test_service_target_group_attributes(stack_key, conf, environment):
+    target_group, = _resources(synthesize(stack_key, environment)['template'], 'AWS::ElasticLoadBalancingV2::TargetGroup')
+    attributes = _attributes(target_group, 'TargetGroupAttributes')
+
+    assert attributes['load_balancing.algorithm.type'] == conf.target_group_lb
+    assert attributes['deregistration_delay.timeout_seconds'] == str(conf.deregistration_delay_seconds)
+    assert attributes['slow_start.duration_seconds'] == str(conf.slow_start_seconds)
+    assert target_group['HealthCheckIntervalSeconds'] == conf.health_check['interval_seconds']
@@ -0,0 +1,111 @@
+import json
+import os
+import time
+
+from cdks.stack_registry import StackSpec
+from tools.synth_cache import SynthCache
+
+SPEC = StackSpec(
+    module='cdks.msk_stack',
+    class_name='CdkMSKStack',
+    stack_id='cdk-msk-{env}',
+    tag_name='cdk-msk-{env}',
+    inputs=('configs/msk_config.py',)
+)
+
+
+def write_assembly(outdir, stack_id):
+    os.makedirs(outdir, exist_ok=True)
+    with open(os.path.join(outdir, f'{stack_id}.template.json'), 'w') as f:
+        json.dump({'Resources': {}}, f)
+    with open(os.path.join(outdir, f'{stack_id}.assets.json'), 'w') as f:
+        json.dump({'files': {'abc': {'source': {'path': f'{stack_id}.template.json'}}}}, f)
+    with open(os.path.join(outdir, 'manifest.json'), 'w') as f:
+        json.dump({
+            'version': '16.0.0',
+            'artifacts': {
+                f'{stack_id}.assets': {'type': 'cdk:asset-manifest', 'properties': {'file': f'{stack_id}.assets.json'}},
+                stack_id: {'type': 'aws:cloudformation:stack', 'properties': {'templateFile': f'{stack_id}.template.json'}}
+            }
+        }, f)
+
+
+def test_digest_follows_inputs(tmp_path):
+    (tmp_path / 'configs').mkdir()
+    config = tmp_path / 'configs' / 'msk_config.py'
+    config.write_text('number_of_broker = 2\n')
+
+    digest = SynthCache(root_dir=str(tmp_path)).stack_digest(SPEC, 'staging', {'environment': 'staging'})
+
+    assert digest == SynthCache(root_dir=str(tmp_path)).stack_digest(SPEC, 'staging', {'environment': 'staging', 'stacks': 'msk'})
+    assert digest != SynthCache(root_dir=str(tmp_path)).stack_digest(SPEC, 'production', {'environment': 'production'})
+
+    config.write_text('number_of_broker = 4\n')
+    assert digest != SynthCache(root_dir=str(tmp_path)).stack_digest(SPEC, 'staging', {'environment': 'staging'})
+
+    # only the environment's own file counts
+    digest = SynthCache(root_dir=str(tmp_path)).stack_digest(SPEC, 'staging', {'environment': 'staging'})
+    production_digest = SynthCache(root_dir=str(tmp_path)).stack_digest(SPEC, 'production', {'environment': 'production'})
+    (tmp_path / 'configs' / 'environments').mkdir()
+    (tmp_path / 'configs' / 'environments' / 'staging.json').write_text('{"msk": {"number_of_broker": 6}}\n')
+    assert digest != SynthCache(root_dir=str(tmp_path)).stack_digest(SPEC, 'staging', {'environment': 'staging'})
+    assert production_digest == SynthCache(root_dir=str(tmp_path)).stack_digest(SPEC, 'production', {'environment': 'production'})
+
+    # stacks using its attributes add exports to the template
+    assert digest != SynthCache(root_dir=str(tmp_path)).stack_digest(SPEC, 'staging', {'environment': 'staging'}, referenced_by=['kafka-ui'])
+
+
+def test_store_and_restore(tmp_path):
+    cache = SynthCache(cache_dir=str(tmp_path / 'cache'))
+    write_assembly(str(tmp_path / 'first'), 'cdk-msk-staging')
+    cache.store('digest', str(tmp_path / 'first'), 'cdk-msk-staging')
+    assert cache.has('digest')
+
+    # a later synth that skipped the stack only has the tree artifact
+    second = tmp_path / 'second'
+    second.mkdir()
+    (second / 'manifest.json').write_text(json.dumps({'version': '16.0.0', 'artifacts': {'Tree': {}}}))
+
+    assert cache.restore('digest', str(second)) == 'cdk-msk-staging'
+    manifest = json.loads((second / 'manifest.json').read_text())
+    assert set(manifest['artifacts']) == {'Tree', 'cdk-msk-staging', 'cdk-msk-staging.assets'}
+    assert (second / 'cdk-msk-staging.template.json').exists()
+    assert (second / 'cdk-msk-staging.assets.json').exists()
+
+
+def _entry_size(entry_dir):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(entry_dir) for name in names)
+
+
+def test_evict_by_age(tmp_path):
+    cache = SynthCache(cache_dir=str(tmp_path / 'cache'), max_age_days=1, max_size_mb=100)
+    write_assembly(str(tmp_path / 'out'), 'cdk-msk-staging')
+    cache.store('old', str(tmp_path / 'out'), 'cdk-msk-staging')
+    cache.store('new', str(tmp_path / 'out'), 'cdk-msk-staging')
+
+    two_days_ago = time.time() - 2 * 24 * 3600
+    os.utime(tmp_path / 'cache' / 'old', (two_days_ago, two_days_ago))
+
+    cache.evict()
+    assert not cache.has('old')
+    assert cache.has('new')
+
+
+def test_evict_least_recently_used_over_size(tmp_path):
+    write_assembly(str(tmp_path / 'out'), 'cdk-msk-staging')
+    digests = ['first', 'second', 'third', 'fourth']
+    seed = SynthCache(cache_dir=str(tmp_path / 'cache'))
+    for digest in digests:
+        seed.store(digest, str(tmp_path / 'out'), 'cdk-msk-staging')
+
+    # stored in a different order than used: fourth, first, third, second from least to most recent
+    now = time.time()
+    for minutes_ago, digest in [(40, 'fourth'), (30, 'first'), (20, 'third'), (10, 'second')]:
+        os.utime(tmp_path / 'cache' / digest, (now - minutes_ago * 60, now - minutes_ago * 60))
+
+    # room for two and a half entries
+    entry_size = _entry_size(tmp_path / 'cache' / 'first')
+    cache = SynthCache(cache_dir=str(tmp_path / 'cache'), max_age_days=1, max_size_mb=2.5 * entry_size / (1024 * 1024))
+
+    cache.evict()
+    assert [digest for digest in digests if cache.has(digest)] == ['second', 'third']
@@ -0,0 +1,43 @@
+import json
+import os
+
+from tools.synth_environments import load_cdk_context, main, synth_environment
+
+
+def test_synth_environments_writes_summary_per_environment(tmp_path):
+    assert main(['--environments', 'develop,staging', '--outdir', str(tmp_path), '--context', 'stacks=eventbridge']) == 0
+
+    with open(tmp_path / 'summary.json') as f:
+        summary = json.load(f)
+
+    assert summary['seconds'] > 0
+    assert [result['environment'] for result in summary['environments']] == ['develop', 'staging']
+    for result in summary['environments']:
+        assert result['status'] == 'ok'
+        assert result['stacks'] == [f'cdk-etl-eventbridge-{result["environment"]}']
+        assert result['outdir'] == str(tmp_path / result['environment'])
+        assert os.path.exists(os.path.join(result['outdir'], f'cdk-etl-eventbridge-{result["environment"]}.template.json'))
+
+
+def test_synth_environments_fails_when_a_worker_fails(tmp_path):
+    assert main(['--environments', 'develop', '--outdir', str(tmp_path), '--context', 'stacks=nope']) == 1
+
+    with open(tmp_path / 'summary.json') as f:
+        result, = json.load(f)['environments']
+
+    assert result['status'] == 'failed'
+    assert 'RuntimeError' in result['error']
+    assert 'stacks' not in result
+
+
+def test_synth_environment_merges_context_with_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv('CDK_OUTDIR', str(tmp_path))
+    monkeypatch.setenv('CDK_CONTEXT_JSON', '{}')
+    context = dict(load_cdk_context(), stacks='nope')
+
+    result = synth_environment('staging', str(tmp_path / 'staging'), context)
+
+    assert result['status'] == 'failed'
+    # the cdk.json context reaches the app next to the --context values and the environment
+    assert json.loads(os.environ['CDK_CONTEXT_JSON']) == dict(context, environment='staging')
+    assert '@aws-cdk/core:stackRelativeExports' in context
@@ -0,0 +1,54 @@
+import json
+import os
+
+import pytest
+
+from tools.template_budget import REPORT_FILE, TemplateBudget
+
+
+def write_assembly(outdir, stack_id, resources):
+    os.makedirs(outdir, exist_ok=True)
+    with open(os.path.join(outdir, f'{stack_id}.template.json'), 'w') as f:
+        json.dump({'Resources': resources}, f)
+    with open(os.path.join(outdir, 'manifest.json'), 'w') as f:
+        json.dump({
+            'version': '16.0.0',
+            'artifacts': {
+                'Tree': {'type': 'cdk:tree'},
+                stack_id: {'type': 'aws:cloudformation:stack', 'properties': {'templateFile': f'{stack_id}.template.json'}}
+            }
+        }, f)
+
+
+def launch_template(user_data_bytes):
+    return {
+        'Type': 'AWS::EC2::LaunchTemplate',
+        'Properties': {'LaunchTemplateData': {'UserData': 'x' * user_data_bytes}}
+    }
+
+
+def test_within_budget(tmp_path):
+    write_assembly(str(tmp_path), 'cdk-redash-staging', {'LaunchTemplate': launch_template(10)})
+
+    report = TemplateBudget().check(str(tmp_path))
+
+    assert report['cdk-redash-staging']['resources'] == 1
+    assert report['cdk-redash-staging']['over_budget'] == {}
+    assert (tmp_path / REPORT_FILE).exists()
+
+
+def test_over_budget_fails_with_suggestions(tmp_path):
+    write_assembly(str(tmp_path), 'cdk-redash-staging', {
+        'WebLaunchTemplate': launch_template(5000),
+        'WorkerLaunchTemplate': launch_template(10)
+    })
+
+    with pytest.raises(RuntimeError):
+        TemplateBudget(budgets={'resources': 1}).check(str(tmp_path))
+
+    report = TemplateBudget(budgets={'resources': 1}, fail=False).check(str(tmp_path))
+    analysis = report['cdk-redash-staging']
+    assert analysis['over_budget'] == {'resources': {'value': 2, 'budget': 1}}
+    assert analysis['largest_resources'][0]['logical_id'] == 'WebLaunchTemplate'
+    assert any('WebLaunchTemplate: user_data' in hint for hint in analysis['suggestions'])
+    assert any(hint.startswith('split AWS::EC2 (2 resources') for hint in analysis['suggestions'])
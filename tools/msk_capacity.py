@@ -0,0 +1,182 @@
+import argparse
+import json
+import sys
+from typing import List, Optional
+
+from configs.model import ENVIRONMENTS, MSKSettings, build_settings, environment_path, load_config
+from configs.msk_config import MSKConfig
+from tools.msk_sizing import MSK_INSTANCE_LIMITS, ClusterPlan, broker_load, check_cluster, instance_limits, plan_cluster
+
+'''
+MSK capacity planner.
+Sizes the MSK cluster of an environment from throughput targets: the instance type, broker
+count, EBS volume size and provisioned throughput carrying them at the broker utilization
+target, using the instance limits table of tools/msk_sizing.py. The targets default to the
+MSKConfig.topics catalog scaled by the environment's topic_load_factor, each one can be
+overridden. Brokers are planned in multiples of the subnets (availability zones).
+
+    python -m tools.msk_capacity --environment production
+    python -m tools.msk_capacity --environment production --ingress-mb 40 --consumer-fanout 3 --retention-hours 72
+    python -m tools.msk_capacity --environment production --write     # write the cheapest plan to the environment file
+    python -m tools.msk_capacity --environment production --validate  # exit 1 when the msk config does not carry the targets
+'''
+
+# msk values of configs/environments/<environment>.json written by --write
+PLANNED_ATTRIBUTES = ['instance_type', 'number_of_broker', 'broker_volume_size', 'provisioned_throughput']
+
+
+def catalog_targets(msk_conf: MSKSettings, local_retention_hours: Optional[float] = None) -> dict:
+    """
+    Ingress, egress and retention of the topic catalog for one environment, a topic keeps at
+    most local_retention_hours on the broker disk.
+    """
+    ingress = sum(topic['write_mb_per_second'] for topic in msk_conf.topics) * msk_conf.topic_load_factor
+    egress = sum(topic['write_mb_per_second'] * topic.get('consumer_groups', 1) for topic in msk_conf.topics) * msk_conf.topic_load_factor
+    # weighted by write throughput, so ingress * retention_hours gives the retained bytes
+    retained = sum(
+        topic['write_mb_per_second'] * min(topic['retention_hours'], local_retention_hours or topic['retention_hours'])
+        for topic in msk_conf.topics
+    ) * msk_conf.topic_load_factor
+    return {
+        'ingress_mb_per_second': ingress,
+        'egress_mb_per_second': egress,
+        'retention_hours': retained / ingress if ingress else 0
+    }
+
+
+def validate_config(msk_conf: MSKSettings, targets: dict, replication_factor: int, utilization: float) -> List[str]:
+    """
+    Limits the current msk config values of the environment go over with the targets.
+    """
+    load = broker_load(
+        targets['ingress_mb_per_second'],
+        targets['egress_mb_per_second'],
+        targets['retention_hours'],
+        replication_factor,
+        msk_conf.number_of_broker
+    )
+    # the volume grows up to the autoscaling max, the topics may plan for it
+    broker_volume_size = msk_conf.storage_autoscaling['max_volume_size'] if msk_conf.storage_autoscaling else msk_conf.broker_volume_size
+    return check_cluster(msk_conf.instance_type, msk_conf.number_of_broker, broker_volume_size,
+                         msk_conf.provisioned_throughput, load, utilization)
+
+
+def write_config(plan: ClusterPlan, environment: str, path: Optional[str] = None) -> None:
+    """
+    Write the planned msk values to the environment file, leaving the other values as they are.
+    The planned values have to pass the config model first, e.g. against storage_autoscaling.
+    """
+    path = path or environment_path(environment)
+    with open(path) as f:
+        environment_values = json.load(f)
+
+    environment_values['msk'].update({attribute: getattr(plan, attribute) for attribute in PLANNED_ATTRIBUTES})
+    build_settings(MSKSettings, MSKConfig, environment, 'msk', environment_values['msk'])
+
+    with open(path, 'w') as f:
+        f.write(json.dumps(environment_values, indent=4) + '\n')
+
+
+def format_plans(plans: List[ClusterPlan], targets: dict, replication_factor: int) -> str:
+    lines = [
+        f'targets: {targets["ingress_mb_per_second"]:.1f} MB/s in, {targets["egress_mb_per_second"]:.1f} MB/s out, '
+        f'{targets["retention_hours"]:.1f}h retention, replication factor {replication_factor}',
+        f'{"instance_type":<20} {"brokers":>7} {"vcpu":>5} {"volume_gb":>9} {"throughput":>10} '
+        f'{"storage_mb/s":>12} {"network_mb/s":>12} {"disk_gb":>8}'
+    ]
+    for plan in plans:
+        lines.append(
+            f'{plan.instance_type:<20} {plan.number_of_broker:>7} {instance_limits(plan.instance_type)["vcpu"] * plan.number_of_broker:>5} '
+            f'{plan.broker_volume_size:>9} {str(plan.provisioned_throughput or "-"):>10} '
+            f'{plan.storage_mb_per_second:>12} {plan.network_mb_per_second:>12} {plan.disk_gb:>8}'
+        )
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Size the MSK cluster of an environment from throughput targets.')
+    parser.add_argument('--environment', required=True, help='environment whose MSK cluster is planned')
+    parser.add_argument('--ingress-mb', type=float, help='producer MB/s, the topic catalog by default')
+    egress = parser.add_mutually_exclusive_group()
+    egress.add_argument('--egress-mb', type=float, help='consumer MB/s, the topic catalog by default')
+    egress.add_argument('--consumer-fanout', type=float, help='consumer groups reading every MB, egress = ingress * fanout')
+    parser.add_argument('--retention-hours', type=float, help='hours kept, the catalog average by default')
+    parser.add_argument('--local-retention-hours', type=float,
+                        help='hours kept on the broker disk, tiered_local_retention_hours on TIERED storage')
+    parser.add_argument('--replication-factor', type=int, help='default.replication.factor of the environment by default')
+    parser.add_argument('--utilization', type=float, help='broker_utilization_target by default')
+    parser.add_argument('--top', type=int, default=5, help='plans printed, cheapest first')
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--write', action='store_true', help='write the cheapest plan to configs/environments/<environment>.json')
+    action.add_argument('--validate', action='store_true', help='exit 1 when the current msk config values do not carry the targets')
+    args = parser.parse_args(argv)
+
+    if args.environment not in ENVIRONMENTS:
+        parser.error('The environment value does not match allowed values.')
+
+    conf = load_config(args.environment)
+    msk_conf = conf.msk
+
+    local_retention_hours = args.local_retention_hours
+    if local_retention_hours is None and msk_conf.storage_mode == 'TIERED':
+        local_retention_hours = msk_conf.tiered_local_retention_hours
+
+    targets = catalog_targets(msk_conf, local_retention_hours)
+    if args.ingress_mb is not None:
+        # overriding ingress alone keeps the catalog fan-out
+        fanout = targets['egress_mb_per_second'] / targets['ingress_mb_per_second'] if targets['ingress_mb_per_second'] else 1
+        targets['ingress_mb_per_second'] = args.ingress_mb
+        targets['egress_mb_per_second'] = args.ingress_mb * fanout
+    if args.egress_mb is not None:
+        targets['egress_mb_per_second'] = args.egress_mb
+    if args.consumer_fanout is not None:
+        targets['egress_mb_per_second'] = targets['ingress_mb_per_second'] * args.consumer_fanout
+    if args.retention_hours is not None:
+        targets['retention_hours'] = min(args.retention_hours, local_retention_hours or args.retention_hours)
+
+    replication_factor = args.replication_factor or int(msk_conf.broker_configuration['default.replication.factor'])
+    utilization = args.utilization or msk_conf.broker_utilization_target
+    if not 0 < utilization <= 1:
+        parser.error('The utilization value has to be between 0 and 1.')
+
+    # MSK tiered storage is not available on kafka.t3 brokers
+    instance_types = [
+        instance_type for instance_type in MSK_INSTANCE_LIMITS
+        if not (msk_conf.storage_mode == 'TIERED' and instance_type.startswith('kafka.t3.'))
+    ]
+    plans = plan_cluster(
+        targets['ingress_mb_per_second'],
+        targets['egress_mb_per_second'],
+        targets['retention_hours'],
+        replication_factor,
+        len(conf.general.subnet_ids),
+        utilization,
+        msk_conf.provisioned_throughput_instance_types,
+        instance_types
+    )
+
+    if args.validate:
+        errors = validate_config(msk_conf, targets, replication_factor, utilization)
+        current = f'{msk_conf.number_of_broker} x {msk_conf.instance_type}'
+        if errors:
+            print(f'{args.environment} msk config ({current}) does not carry the targets:\n    ' + '\n    '.join(errors), file=sys.stderr)
+            return 1
+        print(f'{args.environment} msk config ({current}) carries the targets.')
+        if plans and instance_limits(plans[0].instance_type)['vcpu'] * plans[0].number_of_broker < instance_limits(msk_conf.instance_type)['vcpu'] * msk_conf.number_of_broker:
+            print(f'{plans[0].number_of_broker} x {plans[0].instance_type} would carry them with fewer broker vCPUs.')
+        return 0
+
+    if not plans:
+        print('No MSK instance type carries the targets within the broker quota.', file=sys.stderr)
+        return 1
+
+    print(format_plans(plans[:args.top], targets, replication_factor))
+
+    if args.write:
+        write_config(plans[0], args.environment)
+        print(f'\nwrote {plans[0].number_of_broker} x {plans[0].instance_type} to {environment_path(args.environment)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+'''
+MSK broker limits, the cluster capacity planner (python -m tools.msk_capacity) and the topic
+partition planner.
+The CdkMSKStack plans the MSKConfig.topics catalog with plan_topics() for the broker count
+and instance type of the environment and provisions the result through a custom resource.
+
+A topic gets enough partitions for its write throughput (partition_write_mb_per_second per
+partition) and for its consumer parallelism, at least one per broker, rounded up to a
+multiple of the broker count so partition leaders spread evenly. The planner fails when the
+catalog does not fit the brokers: partition replicas per broker, broker storage / network
+throughput at the utilization target, or broker disk over the retention.
+'''
+
+# baseline figures per broker: network and EBS bandwidth of the EC2 instance behind the
+# broker (MB/s) and the partition replicas per broker MSK recommends at most
+MSK_INSTANCE_LIMITS = {
+    'kafka.t3.small': {'vcpu': 2, 'memory_gib': 2, 'network_mb_per_second': 16, 'ebs_mb_per_second': 21, 'max_partitions': 300},
+    'kafka.m5.large': {'vcpu': 2, 'memory_gib': 8, 'network_mb_per_second': 93, 'ebs_mb_per_second': 81, 'max_partitions': 1000},
+    'kafka.m5.xlarge': {'vcpu': 4, 'memory_gib': 16, 'network_mb_per_second': 156, 'ebs_mb_per_second': 143, 'max_partitions': 1000},
+    'kafka.m5.2xlarge': {'vcpu': 8, 'memory_gib': 32, 'network_mb_per_second': 312, 'ebs_mb_per_second': 287, 'max_partitions': 2000},
+    'kafka.m5.4xlarge': {'vcpu': 16, 'memory_gib': 64, 'network_mb_per_second': 625, 'ebs_mb_per_second': 593, 'max_partitions': 4000},
+    'kafka.m5.8xlarge': {'vcpu': 32, 'memory_gib': 128, 'network_mb_per_second': 1250, 'ebs_mb_per_second': 850, 'max_partitions': 4000},
+    'kafka.m5.12xlarge': {'vcpu': 48, 'memory_gib': 192, 'network_mb_per_second': 1500, 'ebs_mb_per_second': 1187, 'max_partitions': 4000},
+    'kafka.m5.16xlarge': {'vcpu': 64, 'memory_gib': 256, 'network_mb_per_second': 2500, 'ebs_mb_per_second': 1700, 'max_partitions': 4000},
+    'kafka.m5.24xlarge': {'vcpu': 96, 'memory_gib': 384, 'network_mb_per_second': 3125, 'ebs_mb_per_second': 2375, 'max_partitions': 4000},
+    'kafka.m7g.large': {'vcpu': 2, 'memory_gib': 8, 'network_mb_per_second': 117, 'ebs_mb_per_second': 78, 'max_partitions': 1000},
+    'kafka.m7g.xlarge': {'vcpu': 4, 'memory_gib': 16, 'network_mb_per_second': 234, 'ebs_mb_per_second': 156, 'max_partitions': 1000},
+    'kafka.m7g.2xlarge': {'vcpu': 8, 'memory_gib': 32, 'network_mb_per_second': 468, 'ebs_mb_per_second': 312, 'max_partitions': 2000},
+    'kafka.m7g.4xlarge': {'vcpu': 16, 'memory_gib': 64, 'network_mb_per_second': 937, 'ebs_mb_per_second': 625, 'max_partitions': 4000},
+    'kafka.m7g.8xlarge': {'vcpu': 32, 'memory_gib': 128, 'network_mb_per_second': 1875, 'ebs_mb_per_second': 1250, 'max_partitions': 4000},
+    'kafka.m7g.12xlarge': {'vcpu': 48, 'memory_gib': 192, 'network_mb_per_second': 2812, 'ebs_mb_per_second': 1875, 'max_partitions': 4000},
+    'kafka.m7g.16xlarge': {'vcpu': 64, 'memory_gib': 256, 'network_mb_per_second': 3750, 'ebs_mb_per_second': 2500, 'max_partitions': 4000},
+}
+
+# MB/s of a broker EBS volume without provisioned throughput
+DEFAULT_VOLUME_MB_PER_SECOND = 250
+
+# MSK limits of the broker volume (GiB) and of its provisioned throughput (MB/s)
+MAX_VOLUME_SIZE = 16384
+MAX_PROVISIONED_THROUGHPUT = 1000
+
+# brokers per cluster of the default MSK quota
+MAX_BROKERS = 30
+
+
+@dataclass(frozen=True)
+class TopicPlan:
+    name: str
+    partitions: int
+    replication_factor: int
+    configs: Dict[str, str]
+
+
+@dataclass(frozen=True)
+class ClusterPlan:
+    instance_type: str
+    number_of_broker: int
+    broker_volume_size: int
+    provisioned_throughput: Optional[int]
+    # per broker load of the targets
+    storage_mb_per_second: float
+    network_mb_per_second: float
+    disk_gb: float
+
+
+def instance_limits(instance_type: str) -> dict:
+    if instance_type not in MSK_INSTANCE_LIMITS:
+        raise RuntimeError(f'The MSK instance_type {instance_type} is not in the MSK instance limits table.')
+    return MSK_INSTANCE_LIMITS[instance_type]
+
+
+def broker_storage_mb_per_second(instance_type: str, provisioned_throughput: Optional[int] = None) -> float:
+    """
+    Write throughput a broker volume sustains: the instance EBS bandwidth, capped by the volume throughput.
+    """
+    return min(instance_limits(instance_type)['ebs_mb_per_second'], provisioned_throughput or DEFAULT_VOLUME_MB_PER_SECOND)
+
+
+def broker_ingress_limit_mb_per_second(instance_type: str, provisioned_throughput: Optional[int],
+                                       replication_factor: int, utilization: float) -> float:
+    """
+    Producer MB/s one broker takes before its volume or network goes over the utilization
+    target, every MB being written and sent replication_factor times.
+    """
+    limits = instance_limits(instance_type)
+    return min(broker_storage_mb_per_second(instance_type, provisioned_throughput), limits['network_mb_per_second']) * utilization / replication_factor
+
+
+def _round_up(value: float, multiple: int) -> int:
+    return math.ceil(value / multiple) * multiple
+
+
+def broker_load(ingress_mb_per_second: float, egress_mb_per_second: float, retention_hours: float,
+                replication_factor: int, broker_count: int) -> dict:
+    """
+    Load of one broker: every replica is written to its volume, the network carries the
+    producer writes, the replica fetches of the followers and the consumer reads.
+    """
+    return {
+        'storage_mb_per_second': ingress_mb_per_second * replication_factor / broker_count,
+        'network_mb_per_second': max(
+            ingress_mb_per_second * replication_factor,
+            egress_mb_per_second + ingress_mb_per_second * (replication_factor - 1)
+        ) / broker_count,
+        'disk_gb': ingress_mb_per_second * retention_hours * 3600 / 1000 * replication_factor / broker_count,
+    }
+
+
+def check_cluster(instance_type: str, broker_count: int, broker_volume_size: int, provisioned_throughput: Optional[int],
+                  load: dict, utilization: float) -> List[str]:
+    """
+    Limits of the brokers the per broker load goes over at the utilization target.
+    """
+    limits = instance_limits(instance_type)
+    errors = []
+
+    storage_limit = broker_storage_mb_per_second(instance_type, provisioned_throughput) * utilization
+    if load['storage_mb_per_second'] > storage_limit:
+        errors.append(f"{load['storage_mb_per_second']:.1f} MB/s written per broker, the volume sustains {storage_limit:.1f} MB/s at {utilization:.0%}")
+
+    network_limit = limits['network_mb_per_second'] * utilization
+    if load['network_mb_per_second'] > network_limit:
+        errors.append(f"{load['network_mb_per_second']:.1f} MB/s of network per broker, {instance_type} sustains {network_limit:.1f} MB/s at {utilization:.0%}")
+
+    if load['disk_gb'] > broker_volume_size * utilization:
+        errors.append(f"{load['disk_gb']:.0f} GB retained per broker, {broker_volume_size} GB volumes hold {broker_volume_size * utilization:.0f} GB at {utilization:.0%}")
+
+    return errors
+
+
+def size_broker(instance_type: str, broker_count: int, load: dict, utilization: float,
+                provisioned_throughput_instance_types: List[str]) -> Optional[ClusterPlan]:
+    """
+    Volume size and provisioned throughput carrying the load on broker_count brokers, None when it does not fit.
+    """
+    limits = instance_limits(instance_type)
+
+    broker_volume_size = max(_round_up(load['disk_gb'] / utilization, 100), 100)
+    if broker_volume_size > MAX_VOLUME_SIZE:
+        return None
+
+    provisioned_throughput = None
+    if load['storage_mb_per_second'] > DEFAULT_VOLUME_MB_PER_SECOND * utilization:
+        provisioned_throughput = _round_up(load['storage_mb_per_second'] / utilization, 10)
+        if (instance_type not in provisioned_throughput_instance_types or
+                provisioned_throughput > min(MAX_PROVISIONED_THROUGHPUT, limits['ebs_mb_per_second'])):
+            return None
+
+    if check_cluster(instance_type, broker_count, broker_volume_size, provisioned_throughput, load, utilization):
+        return None
+
+    return ClusterPlan(
+        instance_type=instance_type,
+        number_of_broker=broker_count,
+        broker_volume_size=broker_volume_size,
+        provisioned_throughput=provisioned_throughput,
+        **{key: round(value, 1) for key, value in load.items()}
+    )
+
+
+def plan_cluster(ingress_mb_per_second: float, egress_mb_per_second: float, retention_hours: float,
+                 replication_factor: int, availability_zones: int, utilization: float,
+                 provisioned_throughput_instance_types: List[str],
+                 instance_types: Optional[List[str]] = None) -> List[ClusterPlan]:
+    """
+    The smallest cluster of every instance type carrying the targets, cheapest first
+    (total broker vCPUs, then fewer brokers). Broker counts are multiples of the availability zones.
+    """
+    plans = []
+    for instance_type in instance_types or list(MSK_INSTANCE_LIMITS):
+        first = _round_up(max(replication_factor, availability_zones), availability_zones)
+        for broker_count in range(first, MAX_BROKERS + 1, availability_zones):
+            load = broker_load(ingress_mb_per_second, egress_mb_per_second, retention_hours, replication_factor, broker_count)
+            plan = size_broker(instance_type, broker_count, load, utilization, provisioned_throughput_instance_types)
+            if plan:
+                plans.append(plan)
+                break
+
+    return sorted(plans, key=lambda plan: (instance_limits(plan.instance_type)['vcpu'] * plan.number_of_broker, plan.number_of_broker))
+
+
+def plan_topics(topics: List[dict], broker_count: int, instance_type: str, broker_configuration: dict,
+                load_factor: float, partition_write_mb_per_second: float, utilization: float,
+                broker_volume_size: int, provisioned_throughput: Optional[int] = None,
+                local_retention_hours: Optional[int] = None) -> List[TopicPlan]:
+    """
+    Partitions, replication factor and topic configs of every catalog topic, raising a RuntimeError
+    listing every limit the catalog goes over. write_mb_per_second of the catalog is multiplied by
+    load_factor, local_retention_hours (tiered storage) limits the retention kept on the broker disk.
+    """
+    limits = instance_limits(instance_type)
+    replication_factor = min(int(broker_configuration.get('default.replication.factor', 3)), broker_count)
+    min_insync_replicas = max(1, min(int(broker_configuration.get('min.insync.replicas', 1)), replication_factor - 1))
+
+    plans = []
+    ingress_mb_per_second = 0.0
+    egress_mb_per_second = 0.0
+    retained_mb = 0.0
+
+    for topic in topics:
+        write_mb_per_second = topic['write_mb_per_second'] * load_factor
+        partitions = max(
+            math.ceil(write_mb_per_second / partition_write_mb_per_second),
+            topic['consumer_parallelism'],
+            broker_count
+        )
+
+        retention_hours = topic['retention_hours']
+        configs = {
+            'retention.ms': str(retention_hours * 3600 * 1000),
+            'min.insync.replicas': str(min_insync_replicas)
+        }
+        if local_retention_hours:
+            retention_hours = min(retention_hours, local_retention_hours)
+            configs['remote.storage.enable'] = 'true'
+            configs['local.retention.ms'] = str(retention_hours * 3600 * 1000)
+        configs.update(topic.get('configs', {}))
+
+        plans.append(TopicPlan(
+            name=topic['name'],
+            partitions=_round_up(partitions, broker_count),
+            replication_factor=replication_factor,
+            configs=configs
+        ))
+
+        ingress_mb_per_second += write_mb_per_second
+        egress_mb_per_second += write_mb_per_second * topic.get('consumer_groups', 1)
+        retained_mb += write_mb_per_second * retention_hours
+
+    errors = []
+    partition_replicas = sum(plan.partitions * plan.replication_factor for plan in plans) / broker_count
+    if partition_replicas > limits['max_partitions']:
+        errors.append(f'{partition_replicas:.0f} partition replicas per broker, {instance_type} supports {limits["max_partitions"]}')
+
+    # the retention hours averaged over the write throughput give the same retained bytes
+    load = broker_load(ingress_mb_per_second, egress_mb_per_second,
+                       retained_mb / ingress_mb_per_second if ingress_mb_per_second else 0,
+                       replication_factor, broker_count)
+    errors += check_cluster(instance_type, broker_count, broker_volume_size, provisioned_throughput, load, utilization)
+
+    if errors:
+        raise RuntimeError('The MSK topics do not fit the brokers: ' + '; '.join(errors) + '.')
+
+    return plans
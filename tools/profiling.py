@@ -0,0 +1,201 @@
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import List, Optional
+
+'''
+Opt-in synth profiler.
+app.py wraps every stack construction, its tagging and app.synth() in profiler phases,
+and the profiler wraps the jsii kernel calls (create / invoke / get / set ...) made by
+aws-cdk-lib. The result tells apart time spent in Python, in jsii round trips, in
+aspects (run by node during app.synth()) and in asset staging / bundling (done when the
+asset construct is created).
+
+    cdk synth --context environment=staging --context profile=true
+
+writes to <profile_dir> (default .cdk.profile):
+    synth-profile-<env>.json    per stack / per construct timings and jsii round-trip counts
+    synth-profile-<env>.folded  folded stacks, e.g. for flamegraph.pl or speedscope
+'''
+
+PROFILE_DIR = '.cdk.profile'
+
+# jsii kernel calls aliased on the jsii module, which the generated aws-cdk-lib bindings call
+JSII_CALLS = ('create', 'invoke', 'sinvoke', 'ainvoke', 'get', 'set', 'sget', 'sset', 'delete')
+
+
+def _is_enabled(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def _describe_call(method: str, args: tuple) -> str:
+    if method == 'create':
+        return f'create {args[0].__name__}'
+    if method in ('invoke', 'ainvoke', 'get', 'set'):
+        return f'{method} {type(args[0]).__name__}.{args[1]}'
+    if method in ('sinvoke', 'sget', 'sset'):
+        return f'{method} {args[0].__name__}.{args[1]}'
+    return method
+
+
+class SynthProfiler:
+
+    def __init__(self, enabled: bool = True, profile_dir: str = PROFILE_DIR) -> None:
+        self.enabled = enabled
+        self.profile_dir = profile_dir
+
+        # folded stack -> self seconds
+        self.samples = defaultdict(float)
+        self.jsii_calls = Counter()
+        self.jsii_seconds = defaultdict(float)
+        self.stack_jsii_calls = Counter()
+        self.constructs: List[dict] = []
+
+        # each frame is [name, started, child seconds]
+        self._frames: List[list] = []
+        self._originals = {}
+        self._started = None
+
+    @classmethod
+    def from_context(cls, app) -> 'SynthProfiler':
+        return cls(
+            enabled=_is_enabled(app.node.try_get_context('profile')),
+            profile_dir=app.node.try_get_context('profile_dir') or PROFILE_DIR
+        )
+
+    def _push(self, name: str) -> None:
+        self._frames.append([name, time.perf_counter(), 0.0])
+
+    def _pop(self) -> float:
+        name, started, child_seconds = self._frames[-1]
+        elapsed = time.perf_counter() - started
+        self.samples[';'.join(frame[0] for frame in self._frames)] += elapsed - child_seconds
+        self._frames.pop()
+        if self._frames:
+            self._frames[-1][2] += elapsed
+        return elapsed
+
+    @contextmanager
+    def _phase(self, names):
+        for name in names:
+            self._push(name)
+        try:
+            yield
+        finally:
+            for _ in names:
+                self._pop()
+
+    def phase(self, *names: str):
+        """
+        Time a block as nested frames, e.g. phase('cdk-msk-staging', 'construct').
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._phase(names)
+
+    def _wrap(self, method: str, original):
+        def wrapped(*args, **kwargs):
+            self._push(f'jsii:{_describe_call(method, args)}')
+            try:
+                return original(*args, **kwargs)
+            finally:
+                elapsed = self._pop()
+                self.jsii_calls[method] += 1
+                self.jsii_seconds[method] += elapsed
+                stack_name = self._frames[0][0] if self._frames else '(none)'
+                self.stack_jsii_calls[stack_name] += 1
+                if method == 'create':
+                    self.constructs.append({
+                        'stack': stack_name,
+                        'type': args[0].__name__,
+                        'id': args[2][1] if len(args) > 2 and args[2] and len(args[2]) > 1 and isinstance(args[2][1], str) else None,
+                        'seconds': round(elapsed, 6),
+                    })
+        return wrapped
+
+    def install(self) -> None:
+        """
+        Start counting jsii round trips. No-op when profiling is disabled.
+        """
+        if not self.enabled or self._originals:
+            return
+
+        import jsii
+
+        for method in JSII_CALLS:
+            self._originals[method] = getattr(jsii, method)
+            setattr(jsii, method, self._wrap(method, self._originals[method]))
+        self._started = time.perf_counter()
+
+    def uninstall(self) -> None:
+        if not self._originals:
+            return
+
+        import jsii
+
+        for method, original in self._originals.items():
+            setattr(jsii, method, original)
+        self._originals = {}
+
+    def report(self) -> dict:
+        total_seconds = time.perf_counter() - self._started if self._started else 0.0
+
+        stacks = defaultdict(lambda: defaultdict(float))
+        for folded, seconds in self.samples.items():
+            frames = folded.split(';')
+            stacks[frames[0]][frames[1] if len(frames) > 1 else 'self'] += seconds
+
+        construct_types = defaultdict(lambda: {'count': 0, 'seconds': 0.0})
+        for construct in self.constructs:
+            construct_types[construct['type']]['count'] += 1
+            construct_types[construct['type']]['seconds'] += construct['seconds']
+
+        return {
+            'total_seconds': round(total_seconds, 6),
+            'jsii': {
+                'calls': dict(self.jsii_calls),
+                'seconds': {method: round(seconds, 6) for method, seconds in self.jsii_seconds.items()},
+                'total_calls': sum(self.jsii_calls.values()),
+                'total_seconds': round(sum(self.jsii_seconds.values()), 6),
+            },
+            'stacks': {
+                name: dict(
+                    {phase: round(seconds, 6) for phase, seconds in phases.items()},
+                    jsii_calls=self.stack_jsii_calls[name]
+                )
+                for name, phases in stacks.items()
+            },
+            'construct_types': dict(sorted(
+                ((name, {'count': value['count'], 'seconds': round(value['seconds'], 6)}) for name, value in construct_types.items()),
+                key=lambda item: -item[1]['seconds']
+            )),
+            'constructs': sorted(self.constructs, key=lambda construct: -construct['seconds']),
+        }
+
+    def folded(self) -> str:
+        # flamegraph.pl expects integer sample counts, use microseconds
+        return '\n'.join(
+            f'{folded} {int(seconds * 1_000_000)}'
+            for folded, seconds in sorted(self.samples.items())
+            if int(seconds * 1_000_000) > 0
+        ) + '\n'
+
+    def write(self, name: str) -> Optional[str]:
+        """
+        Write synth-profile-<name>.json and .folded, returns the json path.
+        """
+        if not self.enabled:
+            return None
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        report_path = os.path.join(self.profile_dir, f'synth-profile-{name}.json')
+        with open(report_path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        with open(os.path.join(self.profile_dir, f'synth-profile-{name}.folded'), 'w') as f:
+            f.write(self.folded())
+
+        return report_path
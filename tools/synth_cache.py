@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from importlib import metadata
+from typing import Dict, Iterable, Optional
+
+'''
+Content-addressed cache of synthesized stacks.
+A stack is keyed on a hash of everything that can change its template: the stack
+module, the config modules, environment file and user_data scripts it reads, app.py and
+the stack registry, the environment, the app context (cdk.json + --context) and the aws-cdk-lib
+version. On a hit app.py skips building the stack and copies the cached template,
+asset manifest and asset files back into cdk.out after app.synth().
+
+    enable: cdk synth --context environment=staging --context synth_cache=true
+'''
+
+CACHE_DIR = '.cdk.cache'
+MAX_AGE_DAYS = 7
+MAX_SIZE_MB = 512
+
+# files every stack template depends on
+GLOBAL_INPUTS = ('app.py', 'cdks/stack_registry.py', 'cdk.json', 'configs/model.py', 'configs/environments/{env}.json')
+
+# context keys that select or tune the synth run without changing any template
+IGNORED_CONTEXT = (
+    'stacks', 'synth_cache', 'synth_cache_dir', 'synth_cache_max_age_days', 'synth_cache_max_size_mb',
+    'template_budget', 'template_budget_max_bytes', 'template_budget_max_resources',
+    'template_budget_max_parameters', 'template_budget_max_outputs'
+)
+
+MANIFEST_FILE = 'manifest.json'
+ENTRY_FILE = 'entry.json'
+
+
+def _is_enabled(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def app_context() -> dict:
+    """
+    The context handed to the app by the CDK CLI (cdk.json context merged with --context).
+    """
+    return json.loads(os.environ.get('CDK_CONTEXT_JSON') or '{}')
+
+
+def _module_path(module: str) -> str:
+    return module.replace('.', '/') + '.py'
+
+
+def _dir_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            size += os.path.getsize(os.path.join(root, name))
+    return size
+
+
+class SynthCache:
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_age_days: float = MAX_AGE_DAYS,
+                 max_size_mb: float = MAX_SIZE_MB, root_dir: str = '.') -> None:
+        self.cache_dir = cache_dir
+        self.max_age_seconds = float(max_age_days) * 24 * 3600
+        self.max_size_bytes = float(max_size_mb) * 1024 * 1024
+        self.root_dir = root_dir
+        self._file_digests: Dict[str, str] = {}
+
+    @classmethod
+    def from_context(cls, app) -> Optional['SynthCache']:
+        """
+        Build the cache from the app context, None when `synth_cache` is not enabled.
+        """
+        if not _is_enabled(app.node.try_get_context('synth_cache')):
+            return None
+
+        return cls(
+            cache_dir=app.node.try_get_context('synth_cache_dir') or CACHE_DIR,
+            max_age_days=app.node.try_get_context('synth_cache_max_age_days') or MAX_AGE_DAYS,
+            max_size_mb=app.node.try_get_context('synth_cache_max_size_mb') or MAX_SIZE_MB
+        )
+
+    def _file_digest(self, path: str) -> str:
+        if path not in self._file_digests:
+            full_path = os.path.join(self.root_dir, path)
+            if os.path.exists(full_path):
+                with open(full_path, 'rb') as f:
+                    self._file_digests[path] = hashlib.sha256(f.read()).hexdigest()
+            else:
+                self._file_digests[path] = 'missing'
+        return self._file_digests[path]
+
+    def stack_digest(self, spec, environment: str, context: Optional[dict] = None,
+                     dependency_digests: Iterable[str] = (), referenced_by: Iterable[str] = ()) -> str:
+        """
+        Hash the inputs of one registered stack, including the digests of the stacks it depends on.
+        referenced_by lists the synthesized stacks using its attributes, they add exports to its template.
+        """
+        context = {
+            key: value for key, value in (context or {}).items()
+            if key not in IGNORED_CONTEXT
+        }
+        inputs = sorted({path.format(env=environment) for path in GLOBAL_INPUTS} | {_module_path(spec.module)} | set(spec.inputs))
+
+        digest = hashlib.sha256()
+        digest.update(metadata.version('aws-cdk-lib').encode())
+        digest.update(spec.stack_id_for(environment).encode())
+        digest.update(environment.encode())
+        digest.update(json.dumps(context, sort_keys=True, default=str).encode())
+        for path in inputs:
+            digest.update(f'{path}:{self._file_digest(path)}'.encode())
+        for dependency_digest in dependency_digests:
+            digest.update(dependency_digest.encode())
+        for reference in sorted(referenced_by):
+            digest.update(f'referenced-by:{reference}'.encode())
+
+        return digest.hexdigest()
+
+    def _entry_dir(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest)
+
+    def has(self, digest: str) -> bool:
+        return os.path.exists(os.path.join(self._entry_dir(digest), ENTRY_FILE))
+
+    def store(self, digest: str, outdir: str, stack_id: str) -> None:
+        """
+        Copy a freshly synthesized stack (template, asset manifest and asset files) out of cdk.out.
+        """
+        with open(os.path.join(outdir, MANIFEST_FILE)) as f:
+            artifacts = json.load(f)['artifacts']
+
+        stack_artifacts = {
+            artifact_id: artifact for artifact_id, artifact in artifacts.items()
+            if artifact_id in (stack_id, f'{stack_id}.assets')
+        }
+        if stack_id not in stack_artifacts:
+            return
+
+        files = [stack_artifacts[stack_id]['properties']['templateFile']]
+        if f'{stack_id}.assets' in stack_artifacts:
+            assets_file = stack_artifacts[f'{stack_id}.assets']['properties']['file']
+            files.append(assets_file)
+            with open(os.path.join(outdir, assets_file)) as f:
+                asset_manifest = json.load(f)
+            for asset in list(asset_manifest.get('files', {}).values()) + list(asset_manifest.get('dockerImages', {}).values()):
+                source = asset['source'].get('path') or asset['source'].get('directory')
+                if source and source not in files:
+                    files.append(source)
+
+        entry_dir = self._entry_dir(digest)
+        staging_dir = f'{entry_dir}.tmp-{os.getpid()}'
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+
+        for name in files:
+            source = os.path.join(outdir, name)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(staging_dir, name))
+            elif os.path.exists(source):
+                shutil.copy2(source, os.path.join(staging_dir, name))
+
+        with open(os.path.join(staging_dir, ENTRY_FILE), 'w') as f:
+            json.dump({'stack_id': stack_id, 'files': files, 'artifacts': stack_artifacts}, f, indent=2)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(staging_dir, entry_dir)
+
+    def restore(self, digest: str, outdir: str) -> str:
+        """
+        Copy a cached stack into cdk.out and register its artifacts in manifest.json.
+        Returns the restored stack id.
+        """
+        entry_dir = self._entry_dir(digest)
+        with open(os.path.join(entry_dir, ENTRY_FILE)) as f:
+            entry = json.load(f)
+
+        for name in entry['files']:
+            source = os.path.join(entry_dir, name)
+            target = os.path.join(outdir, name)
+            if os.path.exists(target):
+                continue
+            if os.path.isdir(source):
+                shutil.copytree(source, target)
+            elif os.path.exists(source):
+                shutil.copy2(source, target)
+
+        manifest_path = os.path.join(outdir, MANIFEST_FILE)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        manifest.setdefault('artifacts', {}).update(entry['artifacts'])
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        # entries are evicted by last use
+        os.utime(entry_dir)
+
+        return entry['stack_id']
+
+    def evict(self) -> None:
+        """
+        Drop entries not used within max_age_days, then the least recently used ones
+        until the cache fits in max_size_mb.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            # skip missing entries and entries another synth is still writing
+            if not os.path.isdir(entry_dir) or '.tmp-' in name:
+                continue
+            last_used = os.path.getmtime(entry_dir)
+            if now - last_used > self.max_age_seconds:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            entries.append((last_used, _dir_size(entry_dir), entry_dir))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_dir in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
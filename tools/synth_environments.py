@@ -0,0 +1,145 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from cdks.stack_registry import ENVIRONMENTS
+
+'''
+Synthesize several environments at once.
+Each environment runs app.py's synth_app in its own worker process (its own jsii
+runtime) and writes to <outdir>/<environment>, so develop, staging and production
+templates are produced in the time of the slowest one instead of one after another.
+
+    python -m tools.synth_environments
+    python -m tools.synth_environments --environments staging,production --context stacks=msk
+'''
+
+DEFAULT_OUTDIR = 'cdk.out'
+CDK_JSON = 'cdk.json'
+
+
+def load_cdk_context(path: str = CDK_JSON) -> dict:
+    """
+    The cdk.json context, which the CDK CLI would normally hand to the app.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('context', {})
+
+
+def _parse_context(values: List[str]) -> dict:
+    context = {}
+    for value in values:
+        key, sep, item = value.partition('=')
+        if not sep:
+            raise ValueError(f'Context value {value} must be key=value.')
+        context[key] = item
+    return context
+
+
+def synth_environment(environment: str, outdir: str, context: dict) -> dict:
+    """
+    Synthesize one environment in the current process, the same way `cdk synth` runs app.py.
+    """
+    started = time.perf_counter()
+    result = {'environment': environment, 'outdir': outdir}
+
+    try:
+        os.environ['CDK_OUTDIR'] = outdir
+        os.environ['CDK_CONTEXT_JSON'] = json.dumps(dict(context, environment=environment))
+
+        import aws_cdk as cdk
+        from app import synth_app
+
+        synth_app(cdk.App())
+
+        with open(os.path.join(outdir, 'manifest.json')) as f:
+            artifacts = json.load(f)['artifacts']
+        result['stacks'] = sorted(
+            artifact_id for artifact_id, artifact in artifacts.items()
+            if artifact.get('type') == 'aws:cloudformation:stack'
+        )
+        result['status'] = 'ok'
+    except Exception:
+        result['status'] = 'failed'
+        result['error'] = traceback.format_exc()
+
+    result['seconds'] = round(time.perf_counter() - started, 2)
+    return result
+
+
+def synth_environments(environments: List[str], outdir: str = DEFAULT_OUTDIR,
+                       context: Optional[dict] = None, workers: Optional[int] = None) -> List[dict]:
+    """
+    Synthesize the environments in a process pool, one worker per environment by default.
+    """
+    context = dict(load_cdk_context(), **(context or {}))
+
+    # spawn so every worker starts its own jsii runtime instead of sharing a forked one
+    pool_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers or len(environments), mp_context=pool_context) as executor:
+        futures = {
+            environment: executor.submit(synth_environment, environment, os.path.join(outdir, environment), context)
+            for environment in environments
+        }
+        return [futures[environment].result() for environment in environments]
+
+
+def format_summary(results: List[dict], seconds: float) -> str:
+    lines = [f'{"environment":<12} {"status":<8} {"seconds":>8}  stacks']
+    for result in results:
+        lines.append(
+            f'{result["environment"]:<12} {result["status"]:<8} {result["seconds"]:>8.2f}  '
+            f'{", ".join(result.get("stacks", []))}'
+        )
+    lines.append(f'total wall time: {seconds:.2f}s')
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Synthesize several environments in parallel.')
+    parser.add_argument('--environments', default=','.join(ENVIRONMENTS),
+                        help='comma separated environments to synthesize')
+    parser.add_argument('--outdir', default=DEFAULT_OUTDIR,
+                        help='each environment is written to <outdir>/<environment>')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='process pool size, one per environment by default')
+    parser.add_argument('--context', action='append', default=[],
+                        help='extra context as key=value, may be repeated')
+    args = parser.parse_args(argv)
+
+    environments = [environment.strip() for environment in args.environments.split(',') if environment.strip()]
+    unknown = [environment for environment in environments if environment not in ENVIRONMENTS]
+    if unknown:
+        parser.error(f'The environment value {", ".join(unknown)} does not match allowed values.')
+
+    try:
+        context = _parse_context(args.context)
+    except ValueError as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    results = synth_environments(environments, args.outdir, context, args.workers)
+    seconds = time.perf_counter() - started
+
+    os.makedirs(args.outdir, exist_ok=True)
+    with open(os.path.join(args.outdir, 'summary.json'), 'w') as f:
+        json.dump({'seconds': round(seconds, 2), 'environments': results}, f, indent=2)
+
+    print(format_summary(results, seconds))
+    for result in results:
+        if result['status'] != 'ok':
+            print(f'\n{result["environment"]} failed:\n{result["error"]}', file=sys.stderr)
+
+    return 0 if all(result['status'] == 'ok' for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
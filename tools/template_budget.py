@@ -0,0 +1,192 @@
+import json
+import os
+import sys
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+'''
+Post-synth template budget check.
+After app.synth() (and the synth cache restore) app.py reads every stack template in
+cdk.out and measures its size, resources, parameters and outputs against budgets set
+below the CloudFormation limits (1 MB template through S3, 500 resources, 200 parameters,
+200 outputs). Large templates make change set creation slow long before the hard limits.
+
+    cdk synth --context environment=staging
+    cdk synth --context environment=staging --context template_budget_max_resources=300
+    cdk synth --context environment=staging --context template_budget=report
+
+writes <outdir>/template-budget.json, prints over budget stacks with their largest
+resources and split suggestions and fails the synth. With template_budget=report it
+only reports, with template_budget=false it is skipped.
+'''
+
+REPORT_FILE = 'template-budget.json'
+
+# budget name -> (context key, default), defaults are ~80% of the CloudFormation limits
+BUDGETS = {
+    'template_bytes': ('template_budget_max_bytes', 800_000),
+    'resources': ('template_budget_max_resources', 400),
+    'parameters': ('template_budget_max_parameters', 160),
+    'outputs': ('template_budget_max_outputs', 160),
+}
+
+LARGEST_RESOURCES = 5
+
+# user_data bigger than this is worth compressing or moving to an S3 asset
+LARGE_USER_DATA_BYTES = 4096
+
+
+def _resource_bytes(resource: dict) -> int:
+    return len(json.dumps(resource, separators=(',', ':')))
+
+
+def _construct_name(resource: dict) -> str:
+    # top level construct of the stack from the path metadata the CLI adds,
+    # the service of the resource type (e.g. AWS::RDS) otherwise
+    path = resource.get('Metadata', {}).get('aws:cdk:path')
+    if path and '/' in path:
+        return path.split('/')[1]
+    return '::'.join(str(resource.get('Type')).split('::')[:2])
+
+
+def analyze_template(template: dict, template_bytes: int) -> dict:
+    """
+    Sizes of one template: totals, largest resources and bytes / resources per construct group.
+    """
+    resources = template.get('Resources', {})
+
+    largest = sorted(
+        ({'logical_id': logical_id, 'type': resource.get('Type'), 'bytes': _resource_bytes(resource)}
+         for logical_id, resource in resources.items()),
+        key=lambda resource: -resource['bytes']
+    )
+
+    constructs = defaultdict(lambda: {'resources': 0, 'bytes': 0})
+    for resource in resources.values():
+        construct = constructs[_construct_name(resource)]
+        construct['resources'] += 1
+        construct['bytes'] += _resource_bytes(resource)
+
+    return {
+        'template_bytes': template_bytes,
+        'resources': len(resources),
+        'parameters': len(template.get('Parameters', {})),
+        'outputs': len(template.get('Outputs', {})),
+        'largest_resources': largest[:LARGEST_RESOURCES],
+        'constructs': dict(sorted(constructs.items(), key=lambda item: -item[1]['bytes'])),
+    }
+
+
+def suggestions(template: dict, analysis: dict) -> List[str]:
+    """
+    Ways to shrink a template: inline user_data, repeated inline policies, resources to split out.
+    """
+    hints = []
+    resources = template.get('Resources', {})
+
+    for logical_id, resource in resources.items():
+        properties = resource.get('Properties', {})
+        user_data = properties.get('UserData') or properties.get('LaunchTemplateData', {}).get('UserData')
+        if user_data is not None and len(json.dumps(user_data)) > LARGE_USER_DATA_BYTES:
+            hints.append(f'{logical_id}: user_data is {len(json.dumps(user_data))} bytes, compress it or deliver it as an S3 asset')
+
+    policies = Counter(
+        json.dumps(policy.get('PolicyDocument'), sort_keys=True)
+        for resource in resources.values()
+        for policy in resource.get('Properties', {}).get('Policies', []) or []
+        if isinstance(policy, dict)
+    )
+    for document, count in policies.items():
+        if count > 1:
+            hints.append(f'the same inline policy is repeated {count} times ({len(document)} bytes), use one managed policy')
+
+    # the largest groups of resources are the candidates for a stack of their own
+    groups = [(name, construct) for name, construct in analysis['constructs'].items() if construct['resources'] > 1]
+    for name, construct in groups[:2]:
+        hints.append(f"split {name} ({construct['resources']} resources, {construct['bytes']} bytes) into its own stack")
+
+    return hints
+
+
+class TemplateBudget:
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None, fail: bool = True) -> None:
+        self.budgets = {name: default for name, (_, default) in BUDGETS.items()}
+        self.budgets.update(budgets or {})
+        self.fail = fail
+
+    @classmethod
+    def from_context(cls, app) -> Optional['TemplateBudget']:
+        """
+        Build the check from the app context, None when `template_budget` is false.
+        """
+        mode = str(app.node.try_get_context('template_budget') or 'true').lower()
+        if mode in ('0', 'false', 'no'):
+            return None
+
+        budgets = {}
+        for name, (context_key, _) in BUDGETS.items():
+            value = app.node.try_get_context(context_key)
+            if value is not None:
+                budgets[name] = int(value)
+
+        return cls(budgets=budgets, fail=mode != 'report')
+
+    def analyze(self, outdir: str) -> Dict[str, dict]:
+        """
+        Analyze every stack template of the cloud assembly in outdir.
+        """
+        with open(os.path.join(outdir, 'manifest.json')) as f:
+            artifacts = json.load(f)['artifacts']
+
+        report = {}
+        for stack_id, artifact in sorted(artifacts.items()):
+            if artifact.get('type') != 'aws:cloudformation:stack':
+                continue
+
+            template_path = os.path.join(outdir, artifact['properties']['templateFile'])
+            with open(template_path) as f:
+                template = json.load(f)
+
+            analysis = analyze_template(template, os.path.getsize(template_path))
+            analysis['over_budget'] = {
+                name: {'value': analysis[name], 'budget': budget}
+                for name, budget in self.budgets.items()
+                if analysis[name] > budget
+            }
+            analysis['suggestions'] = suggestions(template, analysis) if analysis['over_budget'] else []
+            report[stack_id] = analysis
+
+        return report
+
+    def check(self, outdir: str) -> Dict[str, dict]:
+        """
+        Write the report next to the templates and fail when a stack is over budget.
+        """
+        report = self.analyze(outdir)
+        with open(os.path.join(outdir, REPORT_FILE), 'w') as f:
+            json.dump({'budgets': self.budgets, 'stacks': report}, f, indent=2)
+
+        over_budget = {stack_id: analysis for stack_id, analysis in report.items() if analysis['over_budget']}
+        if not over_budget:
+            return report
+
+        print(self.format(over_budget), file=sys.stderr)
+        if self.fail:
+            raise RuntimeError(f'The template budget is exceeded by {", ".join(over_budget)}, see {os.path.join(outdir, REPORT_FILE)}.')
+
+        return report
+
+    @staticmethod
+    def format(report: Dict[str, dict]) -> str:
+        lines = []
+        for stack_id, analysis in report.items():
+            exceeded = ', '.join(
+                f"{name} {value['value']} > {value['budget']}" for name, value in analysis['over_budget'].items()
+            )
+            lines.append(f'{stack_id}: {exceeded}')
+            for resource in analysis['largest_resources']:
+                lines.append(f"    {resource['logical_id']} ({resource['type']}) {resource['bytes']} bytes")
+            for hint in analysis['suggestions']:
+                lines.append(f'    suggestion: {hint}')
+        return '\n'.join(lines)
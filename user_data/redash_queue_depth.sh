@@ -0,0 +1,30 @@
+#!/bin/bash
+# Publishes the Redash RQ query backlog per worker instance to CloudWatch every minute:
+# the queue depth divided by the InService instances of this worker's Auto Scaling group.
+# The redash worker Auto Scaling group target-tracks this metric.
+cat > /usr/local/bin/redash-queue-depth <<'SCRIPT'
+#!/bin/bash
+set -a; . /opt/redash/env; set +a
+depth=0
+for queue in $REDASH_QUEUE_NAMES; do
+  depth=$((depth + $(redis-cli -u "$REDASH_REDIS_URL" llen "rq:queue:$queue")))
+done
+token=$(curl -s -X PUT http://169.254.169.254/latest/api/token -H 'X-aws-ec2-metadata-token-ttl-seconds: 60')
+instance_id=$(curl -s -H "X-aws-ec2-metadata-token: $token" http://169.254.169.254/latest/meta-data/instance-id)
+group=$(aws autoscaling describe-auto-scaling-instances --instance-ids "$instance_id" \
+  --query 'AutoScalingInstances[0].AutoScalingGroupName' --output text)
+in_service=$(aws autoscaling describe-auto-scaling-groups --auto-scaling-group-names "$group" \
+  --query "length(AutoScalingGroups[0].Instances[?LifecycleState=='InService'])" --output text)
+# a worker that is still launching counts itself, so the metric never divides by zero
+if ! [ "$in_service" -gt 0 ] 2>/dev/null; then
+  in_service=1
+fi
+aws cloudwatch put-metric-data \
+  --namespace "$REDASH_QUEUE_METRIC_NAMESPACE" \
+  --metric-name "$REDASH_QUEUE_METRIC_NAME" \
+  --dimensions "Environment=$REDASH_ENVIRONMENT" \
+  --unit Count \
+  --value "$(awk -v depth="$depth" -v workers="$in_service" 'BEGIN { printf "%.2f", depth / workers }')"
+SCRIPT
+chmod +x /usr/local/bin/redash-queue-depth
+echo '* * * * * root /usr/local/bin/redash-queue-depth' > /etc/cron.d/redash-queue-depth